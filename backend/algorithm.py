@@ -3,13 +3,107 @@
 from feature_extraction import *
 from graph_embedding import *
 from parser import *
+from trajectory import TrajectoryProjector
+from budgets import (DEFAULT_BUDGET, EMBED_CHUNK_TIMEOUT, SCORING_RESERVE_MS, Deadline, EmbeddingUnavailable,
+                     estimate_graph_bytes)
+from model_registry import ModelRegistry, parse_model_specs
 import os
+import time
+import threading
 from dotenv import load_dotenv 
 
 load_dotenv
 API_KEY = os.getenv("COHERE_API_KEY")
+MODEL_PATH = os.getenv("APEX_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mini_predator_model.pt"))
+MODEL_VERSION = os.getenv("APEX_MODEL_VERSION", "v1")
+# Extra versions scored in shadow mode: "v2=/path/a.pt,v3=/path/b.pt"
+SHADOW_MODELS = os.getenv("APEX_SHADOW_MODELS", "")
+# "cohere", or "stub" for the local embed_stub client (load tests)
+EMBEDDER = os.getenv("APEX_EMBEDDER", "cohere")
+# Attach Conversation.memory_report() (columnar vs. dict layout bytes) to each result
+MEMORY_REPORT = os.getenv("APEX_MEMORY_REPORT", "0") == "1"
 
-def runInference(chat_data):
+_registry = None
+_projectors = {}
+_model_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide ModelRegistry: MODEL_PATH as primary plus any SHADOW_MODELS."""
+    global _registry
+    with _model_lock:
+        if _registry is None:
+            registry = ModelRegistry(dtype=FLOAT_DTYPE)
+            registry.register(MODEL_VERSION, MODEL_PATH, primary=True)
+            for version, path in parse_model_specs(SHADOW_MODELS).items():
+                registry.register(version, path, shadow=True)
+            _registry = registry
+        return _registry
+
+
+def get_embedder():
+    """A MessageEmbedder backed by Cohere, or by the local stub when APEX_EMBEDDER=stub."""
+    if EMBEDDER == 'stub':
+        from embed_stub import StubEmbedClient
+        return MessageEmbedder(None, client=StubEmbedClient())
+    return MessageEmbedder(API_KEY)
+
+
+def get_model():
+    """
+    The primary detector and its trajectory projection, loaded once per process.
+
+    Returns:
+        (PredatorDetector, TrajectoryProjector)
+    """
+    version, detector = get_registry().primary()
+    with _model_lock:
+        if version not in _projectors:
+            _projectors[version] = TrajectoryProjector(detector)
+        return detector, _projectors[version]
+
+
+def _as_conversation_dict(chat_data):
+    # Accept either a raw list of messages or a conversation dict with a 'messages' key.
+    if isinstance(chat_data, dict):
+        return chat_data
+    # assume chat_data is a list of message dicts
+    return {
+        'conversation_id': 'MANUAL_TEST',
+        'user_ids': list(set(m.get('author') for m in chat_data if isinstance(m, dict))),
+        'messages': chat_data
+    }
+
+def _apply_budget(conversation_dict, budget):
+    """Reduce the conversation to what the budget allows; returns (dict, execution)."""
+    messages, execution = budget.plan(conversation_dict.get('messages', []), itemsize=FLOAT_DTYPE.itemsize)
+    if execution['messages_scored'] != execution['messages_received']:
+        conversation_dict = dict(conversation_dict, messages=messages,
+                                 user_ids=list(set(m.get('author') for m in messages)))
+    return conversation_dict, execution
+
+
+def _embed_or_drop(embedder, conversation_dict, execution):
+    """
+    Embed a conversation for the online paths that have no keyword fallback.
+
+    Messages whose chunk failed are dropped and execution['path'] becomes
+    'partial_embeddings'; if none could be embedded EmbeddingUnavailable is
+    raised. Returns (conversation_dict, embeddings).
+    """
+    messages = conversation_dict.get('messages', [])
+    embeddings, embedded = embedder.embed_within(messages, chunk_timeout=EMBED_CHUNK_TIMEOUT)
+    execution.update(path='full', messages_embedded=int(embedded.sum()))
+    if messages and not embedded.any():
+        raise EmbeddingUnavailable(f"None of the {len(messages)} messages could be embedded")
+    if not embedded.all():
+        kept = [msg for msg, ok in zip(messages, embedded.tolist()) if ok]
+        conversation_dict = dict(conversation_dict, messages=kept, user_ids=list(set(m.get('author') for m in kept)))
+        execution['path'] = 'partial_embeddings'
+    return conversation_dict, embeddings
+
+
+def runInference(chat_data, profile_store=None, scope=None, budget=None, vector_store=None, deadline=None):
     """
     Runs the algorithm
 
@@ -41,36 +135,198 @@ def runInference(chat_data):
         risk_keywords: int
         dist_pred: float
         dist_norm float
+        profiles: list of updated author profiles (only when profile_store is given;
+                  authors named by app._normalize_messages placeholders are skipped)
+        execution: which strategy scored the conversation (see budgets.InferenceBudget),
+                   plus 'path' ('full', 'partial_embeddings' or 'keywords_only'),
+                   'graph' ('full', 'windowed', 'partial' or 'skipped'), stage timings
+                   and 'deadline_exceeded' (True if the call still ran past the deadline)
+        model_version: the primary model version that produced the score
+
+        vector_id: id of the stored conversation vector (only when vector_store is given)
+
+    `scope` is the API key the request belongs to. If a RiskProfileStore is
+    passed, the authors of the conversation get their running profiles
+    updated under it; if a VectorStore is passed, the weighted conversation
+    vector is appended to it for similar-case search.
+
+    `deadline` (a budgets.Deadline, APEX_DEADLINE_MS by default) bounds the
+    whole call. Embedding stops early enough to leave SCORING_RESERVE_MS (at
+    most half the deadline) for the graph and scoring; messages that could
+    not be embedded in time (or whose chunk failed) are dropped, and the
+    graph is built in row blocks that stop, keeping the edges found so far,
+    once the deadline passes. With no embeddings at all the result is
+    undetermined (is_predator None, see PredatorDetector.score_keywords),
+    profiles and the vector store are not updated, and execution['skipped']
+    lists them.
     """
-    model_path = r"C:\Users\sammy\apex-demo\backend\mini_predator_model.pt"
-    detector = PredatorDetector("dummy.txt")
-    detector.load_model(model_path)
-    embedder = MessageEmbedder(API_KEY)
+    registry = get_registry()
+    version, detector = registry.primary()
+    embedder = get_embedder()
     graph_builder = GraphBuilder()
+    deadline = deadline or Deadline.from_ms(None)
     
-    # Accept either a raw list of messages or a conversation dict with a 'messages' key.
-    if isinstance(chat_data, dict):
-        conversation_dict = chat_data
-        messages = conversation_dict.get('messages', [])
-    else:
-        # assume chat_data is a list of message dicts
-        messages = chat_data
-        conversation_dict = {
-            'conversation_id': 'MANUAL_TEST',
-            'user_ids': list(set(m.get('author') for m in messages if isinstance(m, dict))),
-            'messages': messages
-        }
+    budget = budget or DEFAULT_BUDGET
+    conversation_dict, execution = _apply_budget(_as_conversation_dict(chat_data), budget)
+    messages = conversation_dict.get('messages', [])
+    stage_ms = {}
 
-    embeddings = embedder.embed_messages(messages)
+    start = time.perf_counter()
+    # Short deadlines keep half for embedding instead of always reserving it all
+    reserve = SCORING_RESERVE_MS / 1000.0
+    if deadline.seconds is not None:
+        reserve = min(reserve, deadline.seconds / 2)
+    embeddings, embedded = embedder.embed_within(messages, deadline.reserving(reserve),
+                                                 chunk_timeout=EMBED_CHUNK_TIMEOUT, newest_first=True)
+    stage_ms['embed'] = round((time.perf_counter() - start) * 1000, 1)
+    execution.update(deadline_ms=None if deadline.seconds is None else int(deadline.seconds * 1000),
+                     messages_embedded=int(embedded.sum()), stage_ms=stage_ms)
+
+    if messages and not embedded.any():
+        result = detector.score_keywords(detector.count_risk_keywords(messages))
+        result['model_version'] = version
+        execution.update(path='keywords_only', graph='skipped', elapsed_ms=deadline.elapsed_ms())
+        execution['skipped'] = [name for name, store in (('profiles', profile_store), ('vector_store', vector_store))
+                                if store is not None]
+        execution['deadline_exceeded'] = deadline.expired()
+        result['execution'] = execution
+        print("Inference Result:", result)
+        return result
+
+    execution['path'] = 'full'
+    if not embedded.all():
+        kept = [msg for msg, ok in zip(messages, embedded.tolist()) if ok]
+        conversation_dict = dict(conversation_dict, messages=kept, user_ids=list(set(m.get('author') for m in kept)))
+        execution['path'] = 'partial_embeddings'
+
+    start = time.perf_counter()
     conversation = Conversation(conversation_dict, embeddings)
-    graph_builder.build_graph(conversation)
+    if execution['window']:
+        complete = graph_builder.build_graph_windowed(conversation, execution['window'], deadline)
+        execution['graph'] = 'windowed' if complete else 'partial'
+    elif deadline.expired():
+        # Edgeless graph: PageRank weights every message equally
+        execution['graph'] = 'skipped'
+    elif deadline.seconds is not None:
+        # build_graph's edges, in row blocks that each check the deadline
+        complete = graph_builder.build_graph_windowed(conversation, conversation.n_messages, deadline,
+                                                      block_rows=budget.window)
+        execution['graph'] = 'full' if complete else 'partial'
+    else:
+        graph_builder.build_graph(conversation)
+        execution['graph'] = 'full'
+    stage_ms['graph'] = round((time.perf_counter() - start) * 1000, 1)
+    if MEMORY_REPORT:
+        execution['memory'] = conversation.memory_report()
     
-    result = detector.predict_new(conversation)
+    # Primary result now; shadow versions score the same vector in the background
+    start = time.perf_counter()
+    result = registry.score(conversation)
+    stage_ms['score'] = round((time.perf_counter() - start) * 1000, 1)
+    execution['elapsed_ms'] = deadline.elapsed_ms()
+    # Every stage stops at the deadline, but one already running can still overrun it
+    execution['deadline_exceeded'] = deadline.expired()
+    result['execution'] = execution
+    if profile_store is not None:
+        placeholders = {m['author'] for m in conversation_dict['messages'] if m.get('author_synthesized')}
+        try:
+            result['profiles'] = profile_store.update(scope, conversation, result, detector,
+                                                      skip_authors=placeholders)
+        except Exception as e:
+            # Profiles are a side effect: the score itself still goes back to the caller
+            print(f"Profile update failed: {e}")
+            result['profiles'] = []
+            result['profiles_error'] = str(e)
+    if vector_store is not None and 'reason' not in result:
+        result['vector_id'] = vector_store.add(
+            conversation.get_weighted_embedding(), scope, int(time.time()), result['confidence'],
+            metadata={
+                'conversation_id': conversation.conversation_id,
+                'is_predator': bool(result['is_predator']),
+                'model_version': result.get('model_version'),
+                'n_messages': conversation.n_messages,
+            })
 
     print("Inference Result:", result)
     
     return result
-    
 
 
+def runTrajectory(chat_data, budget=None):
+    """
+    Semantic trajectory of a conversation for the frontend.
+
+    Args:
+        chat_data: Same formats as runInference.
+
+    Returns:
+        Dict
+        Keys:
+        archetypes: {'predator': [[x, y], ...], 'normal': [[x, y], ...]}
+        steps: one entry per message prefix with x, y, confidence,
+               is_predator, risk_keywords and nearest_archetype
+        execution: how the conversation was reduced to fit the budget, and
+                   'path' ('full' or 'partial_embeddings' when some messages
+                   could not be embedded and were left out)
+
+    Raises EmbeddingUnavailable if no message could be embedded.
+    Prefix trajectories need the full edge-weight matrix and score every
+    prefix, so conversations over the matrix budget or
+    budget.max_trajectory_messages are truncated (most recent messages)
+    rather than windowed.
+    """
+    detector, projector = get_model()
+    embedder = get_embedder()
+    graph_builder = GraphBuilder()
 
+    budget = budget or DEFAULT_BUDGET
+    conversation_dict, execution = _apply_budget(_as_conversation_dict(chat_data), budget)
+    keep = min(execution['window'] or execution['messages_scored'], budget.max_trajectory_messages)
+    if keep < execution['messages_scored']:
+        # Keep the most recent messages whose full matrices and prefixes fit the budget
+        messages = conversation_dict['messages'][-keep:]
+        conversation_dict = dict(conversation_dict, messages=messages,
+                                 user_ids=list(set(m.get('author') for m in messages)))
+        strategies = [st for st in execution['strategy'].split('+') if st not in ('windowed', 'truncated')]
+        execution = dict(execution, strategy='+'.join(strategies + ['truncated']),
+                         messages_scored=len(messages), window=None,
+                         estimated_matrix_bytes=estimate_graph_bytes(len(messages), FLOAT_DTYPE.itemsize))
+    conversation_dict, embeddings = _embed_or_drop(embedder, conversation_dict, execution)
+    conversation = Conversation(conversation_dict, embeddings)
+
+    return {
+        'archetypes': projector.archetypes(),
+        'steps': projector.trajectory(conversation, graph_builder),
+        'execution': execution,
+    }
+
+
+def runSessionUpdate(session, messages):
+    """
+    Append new messages to a LiveSession and return its updated risk score.
+
+    Only `messages` (the delta) are embedded; see sessions.LiveSession.
+    The caller must hold the session (SessionStore.acquire).
+    """
+    detector, _ = get_model()
+    embedder = get_embedder()
+    return session.append(messages, embedder, detector)
+
+
+def runSimilar(chat_data, vector_store, scope, k=10, budget=None):
+    """
+    Past conversations (under `scope`) most similar to `chat_data`.
+    The conversation is embedded and weighted like runInference but not stored;
+    messages that could not be embedded are left out, and EmbeddingUnavailable
+    is raised if none could be.
+    """
+    embedder = get_embedder()
+    graph_builder = GraphBuilder()
+    conversation_dict, execution = _apply_budget(_as_conversation_dict(chat_data), budget or DEFAULT_BUDGET)
+    conversation_dict, embeddings = _embed_or_drop(embedder, conversation_dict, execution)
+    conversation = Conversation(conversation_dict, embeddings)
+    if execution['window']:
+        graph_builder.build_graph_windowed(conversation, execution['window'])
+    else:
+        graph_builder.build_graph(conversation)
+    return vector_store.search(conversation.get_weighted_embedding(), k=k, scope=scope)
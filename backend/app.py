@@ -1,10 +1,12 @@
-from flask import Flask, jsonify, request, session
+from flask import Flask, Response, jsonify, request, session
 from flask_cors import CORS
 import secrets
 import os
 import json
 import threading
 import time
+import bisect
+from budgets import DEFAULT_BUDGET, Deadline, EmbeddingUnavailable
 
 # Helper: make objects JSON serializable (convert numpy/torch types, arrays, etc.)
 def _make_json_serializable(obj):
@@ -72,9 +74,11 @@ app = Flask(__name__)
 app.secret_key = secrets.token_urlsafe(16)
 # Enable CORS for development (restrict origins in production)
 CORS(app)
+# Reject oversized request bodies before they are parsed
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('APEX_MAX_CONTENT_LENGTH', str(32 * 1024 * 1024)))
 
 DATA_STORE = {}
-STORE_PATH = os.path.join(os.path.dirname(__file__), 'data_store.json')
+STORE_PATH = os.getenv('APEX_STORE_PATH', os.path.join(os.path.dirname(__file__), 'data_store.json'))
 _store_lock = threading.Lock()
 
 
@@ -88,6 +92,12 @@ def load_store():
         return {}
 
 
+def _ts_sorted(entries):
+  """Whether result `ts` values (missing counts as 0) never decrease in list order."""
+  ts = [e.get('ts', 0) for e in entries]
+  return all(a <= b for a, b in zip(ts, ts[1:]))
+
+
 def save_store(store):
     tmp = STORE_PATH + '.tmp'
     with open(tmp, 'w', encoding='utf-8') as f:
@@ -97,6 +107,50 @@ def save_store(store):
 
 with _store_lock:
     DATA_STORE = load_store()
+    # Keys whose stored results are out of `ts` order (older files); these
+    # are filtered with a full scan instead of a bisect
+    UNSORTED_KEYS = {k for k, entries in DATA_STORE.items() if not _ts_sorted(entries)}
+
+_profile_store = None
+_profile_store_lock = threading.Lock()
+
+
+def get_profile_store():
+  """Lazily open the per-author risk profile store (keeps numpy out of module import)."""
+  global _profile_store
+  with _profile_store_lock:
+    if _profile_store is None:
+      from profile_store import RiskProfileStore
+      _profile_store = RiskProfileStore()
+    return _profile_store
+
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store():
+  """Lazily open the memory-mapped store of scored conversation vectors."""
+  global _vector_store
+  with _vector_store_lock:
+    if _vector_store is None:
+      from vector_store import VectorStore
+      _vector_store = VectorStore()
+    return _vector_store
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+  """Lazily create the live-session store (TTL/LRU, optional spill to disk)."""
+  global _session_store
+  with _session_store_lock:
+    if _session_store is None:
+      from sessions import SessionStore
+      _session_store = SessionStore()
+    return _session_store
 # DATA_STORE = {}
 
 
@@ -171,11 +225,64 @@ def get_sentences():
   return jsonify({'error': 'sentences endpoint deprecated, use /api/results'}), 410
 
 
+def _extract_chat_data(body):
+  """Accept { messages: [...] } or { chat_data: [...] } or raw array; None if invalid."""
+  if isinstance(body, list):
+    chat_data = body
+  else:
+    chat_data = body.get('messages') or body.get('chat_data') or body.get('conversation')
+  if not chat_data or not isinstance(chat_data, list):
+    return None
+  return chat_data
+
+
+# Normalize incoming messages to the format expected by algorithm.runInference
+def _normalize_messages(msgs, start_index=0):
+  norm = []
+  for i, m in enumerate(msgs, start_index):
+    # m may be a dict with various keys: prefer 'text', then 'content'
+    text = None
+    if isinstance(m, dict):
+      text = m.get('text') or m.get('content') or m.get('message') or m.get('body')
+      author = m.get('author') or m.get('user') or m.get('sender') or m.get('role')
+      time_str = m.get('time')
+    else:
+      # not a dict, coerce to string
+      text = str(m)
+      author = None
+      time_str = None
+
+    synthesized = False
+    if not author:
+      # map common roles to simple author labels
+      if isinstance(m, dict) and m.get('role'):
+        author = m.get('role')
+      else:
+        author = f'user_{i%4}'
+        synthesized = True
+
+    if not time_str:
+      # synthesize an increasing time string (HH:MM) starting at 00:00
+      mins = i
+      hh = mins // 60
+      mm = mins % 60
+      time_str = f"{hh:02d}:{mm:02d}"
+
+    msg = {'author': author, 'time': time_str, 'text': text or ''}
+    if synthesized:
+      # Placeholder name shared by unrelated requests: never give it a risk profile
+      msg['author_synthesized'] = True
+    norm.append(msg)
+  return norm
+
+
 @app.route('/api/run_inference', methods=['POST'])
 def run_inference():
   """Run the predator detection algorithm on submitted chat data and store the result under the API key.
 
   Body should include either a `messages` array or be the messages array itself.
+  An optional `deadline_ms` (body) or X-Deadline-Ms header bounds the time spent;
+  the result's `execution.path` says whether it degraded to a cheaper path.
   Header: Authorization: Bearer <api_key>
   """
   key = _get_key_from_auth()
@@ -189,53 +296,27 @@ def run_inference():
   if body is None:
     return jsonify({'error': 'JSON body required'}), 400
 
-  # Accept { messages: [...] } or { chat_data: [...] } or raw array
-  chat_data = None
-  if isinstance(body, list):
-    chat_data = body
-  else:
-    chat_data = body.get('messages') or body.get('chat_data') or body.get('conversation')
-
-  if not chat_data or not isinstance(chat_data, list):
+  chat_data = _extract_chat_data(body)
+  if chat_data is None:
     return jsonify({'error': 'Invalid chat data. Expecting a list of message objects under `messages` or raw array.'}), 400
 
-  # Normalize incoming messages to the format expected by algorithm.runInference
-  def _normalize_messages(msgs):
-    norm = []
-    for i, m in enumerate(msgs):
-      # m may be a dict with various keys: prefer 'text', then 'content'
-      text = None
-      if isinstance(m, dict):
-        text = m.get('text') or m.get('content') or m.get('message') or m.get('body')
-        author = m.get('author') or m.get('user') or m.get('sender') or m.get('role')
-        time_str = m.get('time')
-      else:
-        # not a dict, coerce to string
-        text = str(m)
-        author = None
-        time_str = None
-
-      if not author:
-        # map common roles to simple author labels
-        if isinstance(m, dict) and m.get('role'):
-          author = m.get('role')
-        else:
-          author = f'user_{i%4}'
-
-      if not time_str:
-        # synthesize an increasing time string (HH:MM) starting at 00:00
-        mins = i
-        hh = mins // 60
-        mm = mins % 60
-        time_str = f"{hh:02d}:{mm:02d}"
-
-      norm.append({'author': author, 'time': time_str, 'text': text or ''})
-    return norm
+  deadline_ms = request.headers.get('X-Deadline-Ms')
+  if isinstance(body, dict) and body.get('deadline_ms') is not None:
+    deadline_ms = body.get('deadline_ms')
+  try:
+    deadline = Deadline.from_ms(float(deadline_ms) if deadline_ms is not None else None)
+  except (TypeError, ValueError):
+    return jsonify({'error': '`deadline_ms` must be a number of milliseconds'}), 400
+
+  normalized = _normalize_messages(chat_data)
+  too_large = DEFAULT_BUDGET.check_hard_limits(normalized)
+  if too_large:
+    return jsonify({'error': 'payload_too_large', 'detail': too_large}), 413
 
   try:
     from algorithm import runInference
-    normalized = _normalize_messages(chat_data)
-    result = runInference(normalized)
+    result = runInference(normalized, profile_store=get_profile_store(), scope=key,
+                          vector_store=get_vector_store(), deadline=deadline)
   except Exception as e:
     app.logger.exception('Inference failed')
     return jsonify({'error': 'inference_failed', 'detail': str(e)}), 500
@@ -247,9 +328,15 @@ def run_inference():
     app.logger.exception('Failed to sanitize inference result')
     sanitized = str(result)
 
-  entry = {'result': sanitized, 'ts': int(time.time())}
   with _store_lock:
-    DATA_STORE.setdefault(key, []).append(entry)
+    # Stamped under the lock and never below the previous result, so `ts`
+    # follows append order even when requests finish out of order
+    entries = DATA_STORE.setdefault(key, [])
+    ts = int(time.time())
+    if entries and key not in UNSORTED_KEYS:
+      ts = max(ts, entries[-1].get('ts', 0))
+    entry = {'result': sanitized, 'ts': ts}
+    entries.append(entry)
     try:
       save_store(DATA_STORE)
     except Exception:
@@ -258,16 +345,314 @@ def run_inference():
   return jsonify({'ok': True, 'entry': entry}), 201
 
 
+RESULTS_DEFAULT_LIMIT = 100
+RESULTS_MAX_LIMIT = 1000
+
+
+def _int_arg(name, default=None, minimum=None, maximum=None):
+  """Parse an integer query parameter; raises ValueError with a readable message."""
+  raw = request.args.get(name)
+  if raw is None or raw == '':
+    return default
+  try:
+    value = int(raw)
+  except ValueError:
+    raise ValueError(f'`{name}` must be an integer')
+  if minimum is not None and value < minimum:
+    raise ValueError(f'`{name}` must be >= {minimum}')
+  if maximum is not None:
+    value = min(value, maximum)
+  return value
+
+
+def _select_results(entries, end, cursor, since, until, limit, ts_sorted=True):
+  """Pick result indices in [cursor, end) matching the ts filters.
+
+  Results are append-only, so `end` (the length read once) is a consistent
+  snapshot and the list can be scanned without _store_lock. When `ts` is
+  non-decreasing in append order (`ts_sorted`), `since` starts with a
+  bisect and `until` stops the scan; otherwise every entry is checked.
+  Returns (indices, next_cursor, has_more).
+  """
+  start = cursor or 0
+  if since is not None and cursor is None and ts_sorted:
+    start = bisect.bisect_left(entries, since, 0, end, key=lambda e: e.get('ts', 0))
+  indices = []
+  i = start
+  while i < end and (limit is None or len(indices) < limit):
+    ts = entries[i].get('ts', 0)
+    if until is not None and ts > until:
+      if ts_sorted:
+        i = end
+        break
+      i += 1
+      continue
+    if since is None or ts >= since:
+      indices.append(i)
+    i += 1
+  return indices, i, i < end
+
+
 @app.route('/api/results', methods=['GET'])
 def get_results():
-  """Return stored inference results for the provided API key."""
+  """Return stored inference results for the provided API key, one page at a time.
+
+  Header: Authorization: Bearer <api_key>
+  Query:
+    cursor: opaque position from a previous `next_cursor` (resume / poll for new results)
+    since, until: unix-second bounds on the result `ts` (inclusive)
+    limit: page size (default 100, max 1000; unbounded for NDJSON unless given)
+    format: `ndjson` streams one result per line for exports
+  Response: { results, next_cursor, has_more } or an NDJSON stream with
+  the cursor in the X-Next-Cursor header. Never takes _store_lock.
+  """
   key = _get_key_from_auth()
   if not key:
     return jsonify({'error': 'Missing Authorization Bearer token'}), 401
   if key not in DATA_STORE:
     return jsonify({'error': 'Invalid API key'}), 403
-  with _store_lock:
-    return jsonify({'results': DATA_STORE.get(key, [])})
+
+  streaming = request.args.get('format') == 'ndjson'
+  try:
+    cursor = _int_arg('cursor', minimum=0)
+    since = _int_arg('since')
+    until = _int_arg('until')
+    limit = _int_arg('limit', default=None if streaming else RESULTS_DEFAULT_LIMIT,
+                     minimum=1, maximum=None if streaming else RESULTS_MAX_LIMIT)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), 400
+
+  entries = DATA_STORE.get(key, [])
+  end = len(entries)
+  indices, next_cursor, has_more = _select_results(entries, end, cursor, since, until, limit,
+                                                   ts_sorted=key not in UNSORTED_KEYS)
+
+  if streaming:
+    def generate():
+      for i in indices:
+        yield json.dumps(_make_json_serializable(entries[i]), ensure_ascii=False) + '\n'
+    headers = {'X-Next-Cursor': str(next_cursor), 'X-Has-More': 'true' if has_more else 'false'}
+    return Response(generate(), mimetype='application/x-ndjson', headers=headers)
+
+  return jsonify({
+    'results': [entries[i] for i in indices],
+    'next_cursor': str(next_cursor),
+    'has_more': has_more,
+  })
+
+
+@app.route('/api/trajectory', methods=['POST'])
+def trajectory():
+  """Return the semantic trajectory of a conversation for client-side rendering.
+
+  Body: same formats as /api/run_inference.
+  Header: Authorization: Bearer <api_key>
+  Response: { archetypes: {predator, normal}, steps: [{x, y, confidence, nearest_archetype, ...}] }
+  Nothing is stored; the projection is fitted once when the model loads.
+  """
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+
+  body = request.get_json(silent=True)
+  if body is None:
+    return jsonify({'error': 'JSON body required'}), 400
+  chat_data = _extract_chat_data(body)
+  if chat_data is None:
+    return jsonify({'error': 'Invalid chat data. Expecting a list of message objects under `messages` or raw array.'}), 400
+
+  normalized = _normalize_messages(chat_data)
+  too_large = DEFAULT_BUDGET.check_hard_limits(normalized)
+  if too_large:
+    return jsonify({'error': 'payload_too_large', 'detail': too_large}), 413
+
+  try:
+    from algorithm import runTrajectory
+    result = runTrajectory(normalized)
+  except EmbeddingUnavailable as e:
+    return jsonify({'error': 'embedding_unavailable', 'detail': str(e)}), 503
+  except Exception as e:
+    app.logger.exception('Trajectory failed')
+    return jsonify({'error': 'trajectory_failed', 'detail': str(e)}), 500
+
+  return jsonify(_make_json_serializable(result))
+
+
+def _get_owned_session(key, session_id):
+  session_obj = get_session_store().get(session_id)
+  if session_obj is None or session_obj.owner != key:
+    return None
+  return session_obj
+
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+  """Create a live conversation session for the provided API key.
+
+  Header: Authorization: Bearer <api_key>
+  Response: { session_id, ttl_seconds }
+  """
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+  store = get_session_store()
+  session_obj = store.create(key)
+  return jsonify({'session_id': session_obj.session_id, 'ttl_seconds': store.ttl_seconds}), 201
+
+
+@app.route('/api/sessions/<session_id>/messages', methods=['POST'])
+def append_session_messages(session_id):
+  """Append only the new messages of a live conversation and return the updated score.
+
+  Body: same formats as /api/run_inference, containing just the delta.
+  Header: Authorization: Bearer <api_key>
+  """
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+  body = request.get_json(silent=True)
+  if body is None:
+    return jsonify({'error': 'JSON body required'}), 400
+  chat_data = _extract_chat_data(body)
+  if chat_data is None:
+    return jsonify({'error': 'Invalid chat data. Expecting a list of message objects under `messages` or raw array.'}), 400
+
+  # Pinned and locked from lookup through the update, so the session can
+  # neither be spilled mid-update nor read for start_index by two appends
+  with get_session_store().acquire(session_id) as session_obj:
+    if session_obj is None or session_obj.owner != key:
+      return jsonify({'error': 'Unknown or expired session'}), 404
+
+    normalized = _normalize_messages(chat_data, start_index=session_obj.n)
+    too_large = DEFAULT_BUDGET.check_session(session_obj.n, session_obj.text_bytes, normalized)
+    if too_large:
+      return jsonify({'error': 'payload_too_large', 'detail': too_large}), 413
+
+    try:
+      from algorithm import runSessionUpdate
+      result = runSessionUpdate(session_obj, normalized)
+    except EmbeddingUnavailable as e:
+      return jsonify({'error': 'embedding_unavailable', 'detail': str(e)}), 503
+    except Exception as e:
+      app.logger.exception('Session update failed')
+      return jsonify({'error': 'inference_failed', 'detail': str(e)}), 500
+
+  return jsonify({'ok': True, 'result': _make_json_serializable(result)})
+
+
+@app.route('/api/sessions/<session_id>', methods=['GET', 'DELETE'])
+def session_detail(session_id):
+  """Return the latest state of a live session, or close it (DELETE)."""
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+  session_obj = _get_owned_session(key, session_id)
+  if session_obj is None:
+    return jsonify({'error': 'Unknown or expired session'}), 404
+  if request.method == 'DELETE':
+    get_session_store().delete(session_id)
+    return jsonify({'ok': True})
+  return jsonify(_make_json_serializable(session_obj.summary()))
+
+
+@app.route('/api/similar', methods=['GET', 'POST'])
+def similar():
+  """Return the past conversations most similar to a stored or submitted one.
+
+  Header: Authorization: Bearer <api_key>
+  GET  ?id=<vector_id>&k=10   (vector_id as returned by /api/run_inference)
+  POST { messages: [...] }    (same body formats as /api/run_inference; ?k=10)
+  Only conversations stored under the same API key are searched.
+  """
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+  try:
+    k = _int_arg('k', default=10, minimum=1, maximum=100)
+    vector_id = _int_arg('id', minimum=0)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), 400
+
+  store = get_vector_store()
+  if request.method == 'GET':
+    if vector_id is None:
+      return jsonify({'error': '`id` is required'}), 400
+    try:
+      if store.scope_of(vector_id) != key:
+        raise KeyError(vector_id)
+      query = store.get_vector(vector_id)
+    except (KeyError, IndexError):
+      return jsonify({'error': 'Unknown vector id'}), 404
+    return jsonify({'results': _make_json_serializable(store.search(query, k=k, scope=key, exclude=vector_id))})
+
+  body = request.get_json(silent=True)
+  if body is None:
+    return jsonify({'error': 'JSON body required'}), 400
+  chat_data = _extract_chat_data(body)
+  if chat_data is None:
+    return jsonify({'error': 'Invalid chat data. Expecting a list of message objects under `messages` or raw array.'}), 400
+  normalized = _normalize_messages(chat_data)
+  too_large = DEFAULT_BUDGET.check_hard_limits(normalized)
+  if too_large:
+    return jsonify({'error': 'payload_too_large', 'detail': too_large}), 413
+  try:
+    from algorithm import runSimilar
+    results = runSimilar(normalized, store, key, k=k)
+  except EmbeddingUnavailable as e:
+    return jsonify({'error': 'embedding_unavailable', 'detail': str(e)}), 503
+  except Exception as e:
+    app.logger.exception('Similar search failed')
+    return jsonify({'error': 'similar_failed', 'detail': str(e)}), 500
+  return jsonify({'results': _make_json_serializable(results)})
+
+
+@app.route('/api/models', methods=['GET'])
+def get_models():
+  """Return the loaded model versions and shadow-scoring disagreement statistics.
+
+  Header: Authorization: Bearer <api_key>
+  Query: recent (number of latest shadow records to include, default 20)
+  """
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+  try:
+    recent = _int_arg('recent', default=20, minimum=0, maximum=1000)
+  except ValueError as e:
+    return jsonify({'error': str(e)}), 400
+  from algorithm import get_registry
+  return jsonify(_make_json_serializable(get_registry().report(recent=recent)))
+
+
+@app.route('/api/profiles/<path:user_id>', methods=['GET'])
+def get_profile(user_id):
+  """Return the running risk profile of one author for the provided API key.
+
+  Header: Authorization: Bearer <api_key>
+  Profiles are updated every time /api/run_inference scores a conversation
+  containing that author, so this is a lookup with no recomputation.
+  """
+  key = _get_key_from_auth()
+  if not key:
+    return jsonify({'error': 'Missing Authorization Bearer token'}), 401
+  if key not in DATA_STORE:
+    return jsonify({'error': 'Invalid API key'}), 403
+  profile = get_profile_store().get(key, user_id)
+  if profile is None:
+    return jsonify({'error': 'Unknown user'}), 404
+  return jsonify({'profile': _make_json_serializable(profile)})
 
 
 if __name__ == '__main__':
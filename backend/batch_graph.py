@@ -0,0 +1,172 @@
+import numpy as np
+import scipy.sparse as sp
+from typing import Iterable, List
+
+
+class BatchGraphEngine:
+    """
+    Block-diagonal PageRank over many conversations at once.
+
+    The CSR graphs of a batch of Conversation objects are packed into one
+    sparse matrix and solved with a single power iteration (same update,
+    tolerance and dangling-node handling as nx.pagerank), with convergence
+    tracked per block. Every weighted conversation vector of the batch is
+    then produced by one segmented reduction over the stacked embeddings.
+    """
+
+    def __init__(self, alpha: float = 0.85, tol: float = 1e-6, max_iter: int = 100,
+                 batch_size: int = 1024):
+        self.alpha = alpha
+        self.tol = tol
+        self.max_iter = max_iter
+        self.batch_size = batch_size
+
+    def weighted_embeddings(self, conversations: List, use_cache: bool = True) -> np.ndarray:
+        """
+        Return one weighted vector per conversation (rows in input order) and
+        store each in the conversation's get_weighted_embedding cache.
+        """
+        if not conversations:
+            return np.zeros((0, 0))
+        vectors = [None] * len(conversations)
+        todo = []
+        for idx, conv in enumerate(conversations):
+            cached = conv.cached_weighted_embedding() if use_cache else None
+            if cached is not None:
+                vectors[idx] = cached
+            else:
+                todo.append(idx)
+
+        for start in range(0, len(todo), self.batch_size):
+            batch_idx = todo[start:start + self.batch_size]
+            batch = [conversations[i] for i in batch_idx]
+            for i, conv, vec in zip(batch_idx, batch, self._solve_batch(batch)):
+                conv.cache_weighted_embedding(vec)
+                vectors[i] = vec
+        return np.vstack(vectors)
+
+    def prefix_weighted_embeddings(self, prefixes: Iterable, embeddings: np.ndarray,
+                                   max_nodes: int = 1 << 18) -> np.ndarray:
+        """
+        Weighted vectors of prefixes of one conversation (rows in input order),
+        given each prefix's graph and the full conversation's (n, d) embeddings.
+
+        Prefix PageRanks are solved in block-diagonal chunks of at most
+        `max_nodes` messages. Each chunk's scores form a sparse (chunk x n)
+        prefix-weight matrix that multiplies `embeddings` directly, so no
+        prefix's embeddings are ever copied or stacked.
+        """
+        embeddings = np.asarray(embeddings)
+        vectors, chunk, chunk_nodes = [], [], 0
+        for prefix in prefixes:
+            if chunk and chunk_nodes + prefix.n_messages > max_nodes:
+                vectors.append(self._prefix_chunk_vectors(chunk, embeddings))
+                chunk, chunk_nodes = [], 0
+            chunk.append(prefix)
+            chunk_nodes += prefix.n_messages
+        if chunk:
+            vectors.append(self._prefix_chunk_vectors(chunk, embeddings))
+        if not vectors:
+            return np.zeros((0, embeddings.shape[1] if embeddings.ndim == 2 else 0), dtype=embeddings.dtype)
+        return np.vstack(vectors)
+
+    def _prefix_chunk_vectors(self, prefixes: List, embeddings: np.ndarray) -> np.ndarray:
+        sizes = np.array([c.n_messages for c in prefixes], dtype=np.int64)
+        scores = self._pagerank_blocks(prefixes, sizes)
+        # Scores are normalised per block, so row b of the weight matrix already
+        # sums to 1; prefix b's scores sit on columns 0 .. sizes[b] - 1
+        indptr = np.concatenate([[0], np.cumsum(sizes)])
+        columns = np.arange(len(scores)) - np.repeat(indptr[:-1], sizes)
+        weights = sp.csr_matrix((scores.astype(embeddings.dtype), columns, indptr),
+                                shape=(len(prefixes), len(embeddings)))
+        return np.asarray(weights @ embeddings)
+
+    def pagerank(self, conversations: List) -> List[np.ndarray]:
+        """PageRank scores of every message, one array per conversation."""
+        sizes = np.array([c.n_messages for c in conversations], dtype=np.int64)
+        scores = self._pagerank_blocks(conversations, sizes)
+        return np.split(scores, np.cumsum(sizes)[:-1])
+
+    def pagerank_csr(self, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+                     start: np.ndarray = None) -> np.ndarray:
+        """
+        PageRank of a single graph given as CSR arrays.
+
+        `start` warm-starts the iteration (e.g. the previous scores of a growing
+        conversation); it only changes how fast the fixed point is reached.
+        """
+        n = len(indptr) - 1
+        A = sp.csr_matrix((np.asarray(weights, dtype=np.float64), indices, indptr), shape=(n, n))
+        return self._power_iteration(A, np.array([n], dtype=np.int64), start)
+
+    def _pagerank_blocks(self, conversations: List, sizes: np.ndarray) -> np.ndarray:
+        n_total = int(sizes.sum())
+        node_offsets = np.concatenate([[0], np.cumsum(sizes)])
+        edge_counts = np.array([len(c.indices) for c in conversations], dtype=np.int64)
+        edge_offsets = np.concatenate([[0], np.cumsum(edge_counts)])
+
+        # Block-diagonal adjacency built straight from each conversation's CSR arrays
+        indptr = np.concatenate([[0]] + [c.indptr[1:] + edge_offsets[b] for b, c in enumerate(conversations)])
+        indices = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                 [c.indices.astype(np.int64) + node_offsets[b] for b, c in enumerate(conversations)])
+        data = np.concatenate([np.zeros(0)] + [c.edge_weights.astype(np.float64) for c in conversations])
+        A = sp.csr_matrix((data, indices, indptr), shape=(n_total, n_total))
+        return self._power_iteration(A, sizes)
+
+    def _power_iteration(self, A, sizes: np.ndarray, start: np.ndarray = None) -> np.ndarray:
+        n_blocks = len(sizes)
+
+        # Row-stochastic transition matrix; rows without edges are dangling
+        out_weight = np.asarray(A.sum(axis=1)).ravel()
+        dangling = out_weight == 0
+        inv = np.zeros_like(out_weight)
+        inv[~dangling] = 1.0 / out_weight[~dangling]
+        transition_t = (sp.diags(inv) @ A).T.tocsr()
+
+        block = np.repeat(np.arange(n_blocks), sizes)
+        p = 1.0 / sizes[block]
+        x = p.copy() if start is None else np.asarray(start, dtype=np.float64).copy()
+        active = sizes > 0
+
+        for _ in range(self.max_iter):
+            dangling_sum = np.bincount(block, weights=x * dangling, minlength=n_blocks)
+            x_new = self.alpha * (transition_t @ x + dangling_sum[block] * p) + (1 - self.alpha) * p
+            err = np.bincount(block, weights=np.abs(x_new - x), minlength=n_blocks)
+            x = np.where(active[block], x_new, x)
+            active &= ~(err < sizes * self.tol)
+            if not active.any():
+                break
+
+        # Blocks that never converged fall back to uniform scores, like the
+        # except branch of Conversation.get_weighted_embedding
+        x = np.where(active[block], p, x)
+        return x / np.bincount(block, weights=x, minlength=n_blocks)[block]
+
+    def _solve_batch(self, conversations: List) -> List[np.ndarray]:
+        sizes = np.array([c.n_messages for c in conversations], dtype=np.int64)
+        embeddings = [np.asarray(c.get_embeddings()) for c in conversations]
+        dtype = np.result_type(*[e.dtype for e in embeddings])
+        n_blocks = len(conversations)
+        scores = self._pagerank_blocks(conversations, sizes)
+
+        # Segmented reduction: row b of `segments` holds block b's scores
+        block = np.repeat(np.arange(n_blocks), sizes)
+        segments = sp.csr_matrix((scores.astype(dtype), (block, np.arange(len(block)))),
+                                 shape=(n_blocks, len(block)))
+        non_empty = [e for e in embeddings if len(e)]
+        stacked = np.vstack(non_empty).astype(dtype, copy=False) if non_empty else np.zeros((0, 0), dtype=dtype)
+        weighted = segments @ stacked if len(stacked) else None
+        totals = np.bincount(block, weights=scores, minlength=n_blocks)
+
+        vectors = []
+        for b, emb in enumerate(embeddings):
+            if sizes[b] == 0 or totals[b] <= 0:
+                vectors.append(np.mean(emb, axis=0))
+            else:
+                vectors.append(np.asarray(weighted[b]).ravel() / dtype.type(totals[b]))
+        return vectors
+
+
+def batch_weighted_embeddings(conversations: List, **kwargs) -> np.ndarray:
+    """Weighted vectors for many conversations using one BatchGraphEngine pass."""
+    return BatchGraphEngine(**kwargs).weighted_embeddings(conversations)
@@ -0,0 +1,207 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+MAX_MESSAGES = int(os.getenv("APEX_MAX_MESSAGES", "2000"))
+MAX_TEXT_BYTES = int(os.getenv("APEX_MAX_TEXT_BYTES", str(1024 * 1024)))
+MAX_MATRIX_BYTES = int(os.getenv("APEX_MAX_MATRIX_BYTES", str(256 * 1024 * 1024)))
+REDUCE_STRATEGY = os.getenv("APEX_REDUCE_STRATEGY", "truncate")
+GRAPH_WINDOW = int(os.getenv("APEX_GRAPH_WINDOW", "256"))
+HARD_MAX_MESSAGES = int(os.getenv("APEX_HARD_MAX_MESSAGES", "100000"))
+HARD_MAX_TEXT_BYTES = int(os.getenv("APEX_HARD_MAX_TEXT_BYTES", str(16 * 1024 * 1024)))
+# Trajectories score every prefix, so their work grows with the square of this
+MAX_TRAJECTORY_MESSAGES = int(os.getenv("APEX_MAX_TRAJECTORY_MESSAGES", "500"))
+# Deadline applied when the caller gives none (0 = no deadline)
+DEFAULT_DEADLINE_MS = int(os.getenv("APEX_DEADLINE_MS", "0"))
+EMBED_CHUNK_TIMEOUT = float(os.getenv("APEX_EMBED_CHUNK_TIMEOUT", "10"))
+# Part of the deadline kept back from embedding for the graph and scoring stages
+SCORING_RESERVE_MS = int(os.getenv("APEX_SCORING_RESERVE_MS", "100"))
+
+
+class EmbeddingUnavailable(RuntimeError):
+    """
+    An online request could not be embedded (every chunk failed or timed
+    out, or a live session got only some of its new messages embedded).
+    The API answers 503 so the client can retry the same messages.
+    """
+
+
+def estimate_graph_bytes(n_messages: int, itemsize: int = 8) -> int:
+    """
+    Peak n x n memory of the full GraphBuilder.build_graph path: similarity,
+    cast decay and weight matrices in the float dtype, the float64 decay
+    matrix and three boolean masks. Candidates are masked in place and the
+    top-k selection runs in row blocks, so neither adds an n x n term.
+    """
+    per_pair = 3 * itemsize + 8 + 3
+    return n_messages * n_messages * per_pair
+
+
+def _text_bytes(message: Dict) -> int:
+    return len((message.get('text') or '').encode('utf-8'))
+
+
+class InferenceBudget:
+    """
+    Per-request limits for inference.
+
+    Requests above the hard caps are rejected. Below them, conversations
+    over the message / text budgets are reduced ('truncate' keeps the most
+    recent messages, 'sample' keeps evenly spaced ones), and conversations
+    whose n x n graph matrices would exceed max_matrix_bytes are scored
+    with GraphBuilder.build_graph_windowed instead of the full path.
+    Trajectories, which score all n prefixes (O(n^2) PageRank nodes and
+    prefix weights), keep at most max_trajectory_messages.
+    """
+
+    def __init__(self, max_messages: int = MAX_MESSAGES, max_text_bytes: int = MAX_TEXT_BYTES,
+                 max_matrix_bytes: int = MAX_MATRIX_BYTES, reduce_strategy: str = REDUCE_STRATEGY,
+                 window: int = GRAPH_WINDOW, hard_max_messages: int = HARD_MAX_MESSAGES,
+                 hard_max_text_bytes: int = HARD_MAX_TEXT_BYTES,
+                 max_trajectory_messages: int = MAX_TRAJECTORY_MESSAGES):
+        if reduce_strategy not in ('truncate', 'sample'):
+            raise ValueError(f"Unknown reduce strategy: {reduce_strategy}")
+        self.max_messages = max_messages
+        self.max_text_bytes = max_text_bytes
+        self.max_matrix_bytes = max_matrix_bytes
+        self.reduce_strategy = reduce_strategy
+        self.window = window
+        self.hard_max_messages = hard_max_messages
+        self.hard_max_text_bytes = hard_max_text_bytes
+        self.max_trajectory_messages = max_trajectory_messages
+
+    def check_hard_limits(self, messages: List[Dict]) -> Optional[str]:
+        """Error message if the request is too large to consider at all, else None."""
+        if len(messages) > self.hard_max_messages:
+            return f"Too many messages: {len(messages)} > {self.hard_max_messages}"
+        total = sum(_text_bytes(m) for m in messages)
+        if total > self.hard_max_text_bytes:
+            return f"Message text too large: {total} bytes > {self.hard_max_text_bytes}"
+        return None
+
+    def check_session(self, session_messages: int, session_text_bytes: int,
+                      messages: List[Dict]) -> Optional[str]:
+        """
+        Error message if appending `messages` would take a live session over
+        the message / text budgets, else None. Sessions are scored
+        incrementally and cannot be truncated, so their total is capped.
+        """
+        error = self.check_hard_limits(messages)
+        if error:
+            return error
+        total = session_messages + len(messages)
+        if total > self.max_messages:
+            return f"Session too long: {total} messages > {self.max_messages}"
+        total_bytes = session_text_bytes + sum(_text_bytes(m) for m in messages)
+        if total_bytes > self.max_text_bytes:
+            return f"Session text too large: {total_bytes} bytes > {self.max_text_bytes}"
+        return None
+
+    def _truncate(self, messages: List[Dict]) -> List[Dict]:
+        kept, total = 0, 0
+        for msg in reversed(messages):
+            size = _text_bytes(msg)
+            # The latest message is always kept
+            if kept and (kept >= self.max_messages or total + size > self.max_text_bytes):
+                break
+            kept += 1
+            total += size
+        return messages[len(messages) - kept:]
+
+    def _sample(self, messages: List[Dict], total_bytes: int) -> List[Dict]:
+        n = len(messages)
+        target = min(self.max_messages, n)
+        if total_bytes > self.max_text_bytes:
+            target = min(target, max(1, n * self.max_text_bytes // total_bytes))
+        if target >= n:
+            return list(messages)
+        # Evenly spaced, always keeping the latest message
+        step = (n - 1) / max(target - 1, 1)
+        indices = sorted(set(n - 1 - round(i * step) for i in range(target)))
+        sampled = [messages[i] for i in indices]
+        if sum(_text_bytes(m) for m in sampled) > self.max_text_bytes:
+            return self._truncate(sampled)
+        return sampled
+
+    def plan(self, messages: List[Dict], itemsize: int = 8) -> Tuple[List[Dict], Dict]:
+        """
+        Decide how to score a conversation within budget.
+
+        Returns:
+            (messages to score, execution) where execution reports the
+            strategy ('full', 'truncated', 'sampled', 'windowed' or a
+            '+'-joined combination), message counts, bytes and the window.
+        """
+        total_bytes = sum(_text_bytes(m) for m in messages)
+        strategies = []
+        kept = messages
+        if len(messages) > self.max_messages or total_bytes > self.max_text_bytes:
+            if self.reduce_strategy == 'sample':
+                kept = self._sample(messages, total_bytes)
+                strategies.append('sampled')
+            else:
+                kept = self._truncate(messages)
+                strategies.append('truncated')
+
+        window = None
+        matrix_bytes = estimate_graph_bytes(len(kept), itemsize)
+        if matrix_bytes > self.max_matrix_bytes:
+            # Each windowed block is (window x 2 * window) pairs
+            per_pair = estimate_graph_bytes(1, itemsize)
+            window = max(1, min(self.window, int((self.max_matrix_bytes / (2 * per_pair)) ** 0.5)))
+            matrix_bytes = 2 * window * window * per_pair
+            strategies.append('windowed')
+
+        execution = {
+            'strategy': '+'.join(strategies) or 'full',
+            'messages_received': len(messages),
+            'messages_scored': len(kept),
+            'text_bytes_received': total_bytes,
+            'estimated_matrix_bytes': matrix_bytes,
+            'window': window,
+        }
+        return kept, execution
+
+
+class Deadline:
+    """
+    Wall-clock budget of one request, passed down through the embedding,
+    graph and scoring stages. `seconds=None` never expires. A stage can be
+    handed a view (reserving) that keeps time back for the stages after it.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.started_at = time.monotonic()
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else self.started_at + seconds
+
+    @classmethod
+    def from_ms(cls, ms) -> 'Deadline':
+        """Deadline of `ms` milliseconds; None or <= 0 falls back to APEX_DEADLINE_MS."""
+        ms = ms if ms and ms > 0 else DEFAULT_DEADLINE_MS
+        return cls(ms / 1000.0 if ms > 0 else None)
+
+    def reserving(self, seconds: float) -> 'Deadline':
+        """The same deadline, `seconds` earlier."""
+        if self.expires_at is None:
+            return self
+        view = Deadline.__new__(Deadline)
+        view.started_at = self.started_at
+        view.seconds = self.seconds
+        view.expires_at = self.expires_at - seconds
+        return view
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a deadline."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def elapsed_ms(self) -> float:
+        return round((time.monotonic() - self.started_at) * 1000, 1)
+
+
+DEFAULT_BUDGET = InferenceBudget()
@@ -0,0 +1,281 @@
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+from batch_graph import BatchGraphEngine
+from feature_extraction import PredatorDetector
+from graph_embedding import FLOAT_DTYPE, MessageEmbedder, Conversation, GraphBuilder
+
+load_dotenv()
+API_KEY = os.getenv("COHERE_API_KEY")
+
+SNAPSHOT_VERSION = 1
+# Flat .npy columns, loadable with mmap_mode='r' (members of an .npz archive are not)
+_COLUMNS = ('texts', 'text_offsets', 'time_strings', 'times', 'author_codes',
+            'conv_offsets', 'labels')
+
+
+def _iter_xml_conversations(xml_path: str) -> Iterator[tuple]:
+    """Stream (conversation_id, authors, times, texts) from a PAN12 XML file without building the tree."""
+    for _, elem in ET.iterparse(xml_path, events=('end',)):
+        if elem.tag != 'conversation':
+            continue
+        authors, times, texts = [], [], []
+        for msg in elem.findall('message'):
+            authors.append(msg.find('author').text.strip())
+            times.append(msg.find('time').text.strip())
+            texts.append(msg.find('text').text or "")
+        yield elem.get('id'), authors, times, texts
+        elem.clear()
+
+
+def _decode_texts(blob: np.ndarray, text_offsets: np.ndarray, start: int, end: int) -> List[str]:
+    """Messages start..end of a UTF-8 blob, decoded with one copy out of the (mapped) blob."""
+    offsets = text_offsets[start:end + 1]
+    raw = blob[offsets[0]:offsets[-1]].tobytes()
+    bounds = (offsets - offsets[0]).tolist()
+    return [raw[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _save(path: str, name: str, array: np.ndarray):
+    tmp = os.path.join(path, f'{name}.tmp.npy')
+    np.save(tmp, array, allow_pickle=False)
+    os.replace(tmp, os.path.join(path, f'{name}.npy'))
+
+
+def build_snapshot(xml_path: str, ground_truth_path: str, output: str,
+                   embeddings_cache: Optional[str] = None, embedder: MessageEmbedder = None) -> Dict:
+    """
+    Convert a PAN12 XML corpus into a columnar snapshot directory.
+
+    Texts are one UTF-8 byte blob with offsets, authors are int codes into a
+    corpus-wide table, times are parsed once, conversations are offset ranges
+    and labels come from the ground truth. Embeddings (optional) are taken
+    from a sweep .npz cache, with `embedder` filling in what the cache lacks.
+
+    The snapshot is written to a temporary directory next to `output` and
+    swapped into place only once complete, so a failed build (e.g. a
+    conversation the cache lacks and no embedder) leaves any previous
+    snapshot untouched.
+
+    Returns:
+        The snapshot header (also written to header.json).
+    """
+    parent = os.path.dirname(os.path.abspath(output))
+    os.makedirs(parent, exist_ok=True)
+    work = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    try:
+        header = _build_into(xml_path, ground_truth_path, work, embeddings_cache, embedder)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    # Directories can't be replaced atomically: move the old one aside first
+    old = work + '-old'
+    if os.path.exists(output):
+        os.replace(output, old)
+    os.replace(work, output)
+    shutil.rmtree(old, ignore_errors=True)
+    return header
+
+
+def _build_into(xml_path: str, ground_truth_path: str, output: str,
+                embeddings_cache: Optional[str], embedder: Optional[MessageEmbedder]) -> Dict:
+    """build_snapshot's work, into an empty directory."""
+    detector = PredatorDetector(ground_truth_path)
+
+    author_table: Dict[str, int] = {}
+    blob = bytearray()
+    text_offsets, time_strings, author_codes = [0], [], []
+    conv_ids, conv_offsets, labels = [], [0], []
+    for conv_id, authors, times, texts in _iter_xml_conversations(xml_path):
+        if not texts:
+            continue
+        for text in texts:
+            blob += text.encode('utf-8')
+            text_offsets.append(len(blob))
+        author_codes.extend(author_table.setdefault(a, len(author_table)) for a in authors)
+        time_strings.extend(times)
+        conv_ids.append(conv_id)
+        conv_offsets.append(conv_offsets[-1] + len(texts))
+        labels.append(detector.is_predatory_conversation(set(authors)))
+
+    columns = {
+        'texts': np.frombuffer(bytes(blob), dtype=np.uint8),
+        'text_offsets': np.asarray(text_offsets, dtype=np.int64),
+        'time_strings': np.asarray(time_strings, dtype=str),
+        'times': Conversation.parse_times(time_strings),
+        'author_codes': np.asarray(author_codes, dtype=np.int32),
+        'conv_offsets': np.asarray(conv_offsets, dtype=np.int64),
+        'labels': np.asarray(labels, dtype=bool),
+    }
+    for name, array in columns.items():
+        _save(output, name, array)
+    _save(output, 'authors', np.asarray(list(author_table), dtype=str))
+    _save(output, 'conv_ids', np.asarray(conv_ids, dtype=str))
+
+    emb_path = os.path.join(output, 'embeddings.npy')
+    if embeddings_cache is not None or embedder is not None:
+        _write_embeddings(output, conv_ids, columns, embeddings_cache, embedder)
+    has_embeddings = os.path.exists(emb_path)
+
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'source': os.path.abspath(xml_path),
+        'ground_truth': os.path.abspath(ground_truth_path),
+        'n_conversations': len(conv_ids),
+        'n_messages': len(time_strings),
+        'n_authors': len(author_table),
+        'n_predatory': int(np.sum(labels)),
+        'has_embeddings': has_embeddings,
+    }
+    with open(os.path.join(output, 'header.json'), 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2)
+    return header
+
+
+def _write_embeddings(output: str, conv_ids: List[str], columns: Dict[str, np.ndarray],
+                      embeddings_cache: Optional[str], embedder: Optional[MessageEmbedder]):
+    """Write embeddings.npy row-aligned with the messages, filling from the cache first."""
+    cached: Dict[str, np.ndarray] = {}
+    if embeddings_cache and os.path.exists(embeddings_cache):
+        with np.load(embeddings_cache, allow_pickle=False) as data:
+            offsets = data['offsets']
+            all_embeddings = data['embeddings']
+            for i, conv_id in enumerate(data['ids'].tolist()):
+                cached[conv_id] = all_embeddings[offsets[i]:offsets[i + 1]]
+
+    conv_offsets = columns['conv_offsets']
+    if embedder is None:
+        for c, conv_id in enumerate(conv_ids):
+            vectors = cached.get(conv_id)
+            if vectors is None or len(vectors) != conv_offsets[c + 1] - conv_offsets[c]:
+                raise ValueError(f"No embeddings for conversation {conv_id} and no embedder given")
+    dim = next((a.shape[1] for a in cached.values() if a.ndim == 2 and len(a)), None)
+    out = None
+    for c, conv_id in enumerate(conv_ids):
+        start, end = int(conv_offsets[c]), int(conv_offsets[c + 1])
+        vectors = cached.get(conv_id)
+        if vectors is None or len(vectors) != end - start:
+            if embedder is None:
+                raise ValueError(f"No embeddings for conversation {conv_id} and no embedder given")
+            texts = _decode_texts(columns['texts'], columns['text_offsets'], start, end)
+            vectors = embedder.embed_messages([{'text': t} for t in texts])
+        if out is None:
+            dim = dim or vectors.shape[1]
+            tmp = os.path.join(output, 'embeddings.tmp.npy')
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=FLOAT_DTYPE,
+                                            shape=(int(conv_offsets[-1]), dim))
+        out[start:end] = vectors
+    if out is None:
+        return
+    out.flush()
+    del out
+    os.replace(os.path.join(output, 'embeddings.tmp.npy'), os.path.join(output, 'embeddings.npy'))
+
+
+class CorpusSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot written by build_snapshot.
+
+    Conversations are materialized one at a time as columnar Conversation
+    objects straight from the arrays, so repeat training and evaluation runs
+    skip XML parsing, per-message dicts and re-embedding.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'header.json'), 'r', encoding='utf-8') as f:
+            self.header = json.load(f)
+        if self.header.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.header.get('version')}")
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                        for name in _COLUMNS}
+        # Small lookup tables are read fully; names must be python strings for user_ids
+        self.author_names = np.load(os.path.join(path, 'authors.npy')).tolist()
+        self.conversation_ids = np.load(os.path.join(path, 'conv_ids.npy')).tolist()
+        emb_path = os.path.join(path, 'embeddings.npy')
+        self.embeddings = np.load(emb_path, mmap_mode='r') if os.path.exists(emb_path) else None
+
+    def __len__(self) -> int:
+        return len(self.conversation_ids)
+
+    @property
+    def labels(self) -> np.ndarray:
+        return np.asarray(self.columns['labels'])
+
+    def _texts(self, start: int, end: int) -> List[str]:
+        return _decode_texts(self.columns['texts'], self.columns['text_offsets'], start, end)
+
+    def conversation(self, index: int, dtype=FLOAT_DTYPE) -> Conversation:
+        if self.embeddings is None:
+            raise ValueError(f"Snapshot {self.path} has no embeddings")
+        start, end = (int(x) for x in self.columns['conv_offsets'][index:index + 2])
+        return Conversation.from_columns(
+            self.conversation_ids[index],
+            self._texts(start, end),
+            self.columns['time_strings'][start:end].tolist(),
+            self.columns['author_codes'][start:end],
+            self.author_names,
+            self.columns['times'][start:end],
+            np.asarray(self.embeddings[start:end], dtype=dtype),
+        )
+
+    def iter_conversations(self, indices=None, dtype=FLOAT_DTYPE) -> Iterator[Conversation]:
+        for i in (range(len(self)) if indices is None else indices):
+            yield self.conversation(int(i), dtype=dtype)
+
+    def keyword_counts(self, detector: PredatorDetector) -> np.ndarray:
+        """Risk keyword counts per conversation, decoding one conversation's texts at a time."""
+        offsets = self.columns['conv_offsets']
+        return np.array([
+            detector.count_risk_keyword_texts(self._texts(int(offsets[i]), int(offsets[i + 1])))
+            for i in range(len(self))
+        ], dtype=np.int64)
+
+
+def train_from_snapshot(snapshot: CorpusSnapshot, output: str, n_clusters: int = 5,
+                        graph_builder: GraphBuilder = None) -> PredatorDetector:
+    """Build graphs for every snapshot conversation, fit the archetypes and save the model."""
+    graph_builder = graph_builder or GraphBuilder()
+    conversations = []
+    for conv in snapshot.iter_conversations():
+        graph_builder.build_graph(conv)
+        conversations.append(conv)
+    vectors = BatchGraphEngine().weighted_embeddings(conversations)
+
+    detector = PredatorDetector(snapshot.header['ground_truth'], n_clusters=n_clusters, dtype=FLOAT_DTYPE)
+    detector.fit_vectors(vectors, snapshot.labels)
+    detector.save_model(output)
+    return detector
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Columnar corpus snapshots for repeat training runs")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Convert a PAN12 XML corpus into a snapshot directory")
+    build.add_argument('--xml', required=True, help="PAN12 conversation XML")
+    build.add_argument('--ground-truth', required=True, help="Predator user id list")
+    build.add_argument('--output', required=True, help="Snapshot directory")
+    build.add_argument('--embeddings-cache', help="Reuse embeddings from a sweep .npz cache")
+    build.add_argument('--embed', action='store_true', help="Embed messages missing from the cache with Cohere")
+
+    train = commands.add_parser('train', help="Train and save a detector from a snapshot")
+    train.add_argument('snapshot')
+    train.add_argument('--output', required=True, help="Model path (.pt)")
+    train.add_argument('--n-clusters', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    if args.command == 'build':
+        header = build_snapshot(args.xml, args.ground_truth, args.output,
+                                embeddings_cache=args.embeddings_cache,
+                                embedder=MessageEmbedder(API_KEY) if args.embed else None)
+        print(json.dumps(header, indent=2))
+    else:
+        train_from_snapshot(CorpusSnapshot(args.snapshot), args.output, n_clusters=args.n_clusters)
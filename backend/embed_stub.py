@@ -0,0 +1,52 @@
+import os
+import re
+import time
+import zlib
+import random
+from functools import lru_cache
+from types import SimpleNamespace
+import numpy as np
+
+STUB_LATENCY_MS = float(os.getenv("APEX_STUB_LATENCY_MS", "50"))
+STUB_JITTER_MS = float(os.getenv("APEX_STUB_JITTER_MS", "10"))
+STUB_ERROR_RATE = float(os.getenv("APEX_STUB_ERROR_RATE", "0"))
+
+
+@lru_cache(maxsize=50_000)
+def _word_vector(word: str, dim: int) -> np.ndarray:
+    return np.random.default_rng(zlib.crc32(word.encode('utf-8'))).standard_normal(dim)
+
+
+class StubEmbedClient:
+    """
+    Local stand-in for cohere.ClientV2.embed, for load tests without the API.
+
+    Each text embeds to the sum of fixed random word vectors, so messages
+    sharing words stay similar and the graphs look like real ones. Every
+    call sleeps for latency_ms (+/- jitter_ms), honours the request's
+    timeout_in_seconds and fails with probability error_rate.
+    """
+
+    def __init__(self, latency_ms: float = STUB_LATENCY_MS, jitter_ms: float = STUB_JITTER_MS,
+                 error_rate: float = STUB_ERROR_RATE, dim: int = 1536, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.dim = dim
+        self._random = random.Random(seed)
+
+    def _embed_text(self, text: str) -> list:
+        words = re.findall(r'\w+', text.lower()) or [text]
+        return np.sum([_word_vector(w, self.dim) for w in words], axis=0).tolist()
+
+    def embed(self, inputs, model=None, input_type=None, embedding_types=None, request_options=None):
+        delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+        timeout = (request_options or {}).get('timeout_in_seconds')
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub embed timed out after {timeout}s")
+        time.sleep(delay)
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("Stub embed error")
+        texts = [item['content'][0]['text'] for item in inputs]
+        return SimpleNamespace(embeddings=SimpleNamespace(float=[self._embed_text(t) for t in texts]))
@@ -4,15 +4,24 @@ import re
 from typing import List, Dict, Set
 from sklearn.cluster import KMeans
 from sklearn.metrics.pairwise import cosine_distances
+from batch_graph import BatchGraphEngine
+from graph_embedding import unit_rows
 
 class PredatorDetector:
-    def __init__(self, ground_truth_path: str, n_clusters: int = 5):
+    def __init__(self, ground_truth_path: str, n_clusters: int = 5, dtype=np.float64,
+                 keyword_weight: float = 0.15):
         self.predator_ids = self._load_ground_truth(ground_truth_path)
         self.n_clusters = n_clusters
+        self.dtype = np.dtype(dtype)
+        # Fraction of the predator distance removed per risky message
+        self.keyword_weight = keyword_weight
         
         # We will store centroids (archetypes)
         self.predator_centroids = None
         self.normal_centroids = None
+        # Unit-norm copies used by the float32 scoring path
+        self._unit_pred_centroids = None
+        self._unit_norm_centroids = None
         
         self.risk_keywords = {
             'cam', 'camera', 'pic', 'picture', 'age', 'old', 'meet', 'live', 
@@ -34,9 +43,12 @@ class PredatorDetector:
         return False
 
     def count_risk_keywords(self, messages: List[Dict]) -> int:
+        return self.count_risk_keyword_texts(msg['text'] for msg in messages)
+
+    def count_risk_keyword_texts(self, texts) -> int:
         count = 0
-        for msg in messages:
-            text = msg['text'].lower()
+        for text in texts:
+            text = text.lower()
             # Basic boundary check to avoid matching 'age' in 'page'
             words = set(re.findall(r'\b\w+\b', text))
             if words.intersection(self.risk_keywords):
@@ -46,20 +58,17 @@ class PredatorDetector:
     def train(self, conversations: List):
         print("Vectorizing conversations using Graph-Weighted Embeddings...")
         
-        X_pred = []
-        X_normal = []
-        
-        for conv in conversations:
-            # This gets the 1536-d vector
-            vec = conv.get_weighted_embedding()
-            
-            if self.is_predatory_conversation(conv.data['user_ids']):
-                X_pred.append(vec)
-            else:
-                X_normal.append(vec)
-        
-        X_pred = np.array(X_pred)
-        X_normal = np.array(X_normal)
+        # 1536-d vectors from block-diagonal PageRank solves over batches of conversations
+        vectors = BatchGraphEngine().weighted_embeddings(conversations)
+        labels = [self.is_predatory_conversation(conv.user_ids) for conv in conversations]
+        self.fit_vectors(vectors, labels)
+
+    def fit_vectors(self, vectors: np.ndarray, is_predator: List[bool]):
+        """Learn the archetypes from already weighted conversation vectors."""
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        is_predator = np.asarray(is_predator, dtype=bool)
+        X_pred = vectors[is_predator]
+        X_normal = vectors[~is_predator]
         
         print(f"Training Data: {len(X_pred)} Predator Vectors / {len(X_normal)} Normal Vectors")
         
@@ -78,31 +87,68 @@ class PredatorDetector:
             self.kmeans_norm.fit(X_normal)
             self.normal_centroids = self.kmeans_norm.cluster_centers_
             
+        self._prepare_centroids()
         print("Clustering Complete. Archetypes learned.")
 
+    def _prepare_centroids(self):
+        """Cast centroids to the configured dtype and cache their unit-norm rows."""
+        if self.predator_centroids is None or self.normal_centroids is None:
+            return
+        self.predator_centroids = np.asarray(self.predator_centroids, dtype=self.dtype)
+        self.normal_centroids = np.asarray(self.normal_centroids, dtype=self.dtype)
+        if self.dtype == np.float32:
+            self._unit_pred_centroids = unit_rows(self.predator_centroids)
+            self._unit_norm_centroids = unit_rows(self.normal_centroids)
+
+    def _archetype_distances(self, vec: np.ndarray):
+        """Cosine distances from one conversation vector to each archetype set."""
+        if self.dtype == np.float32:
+            unit_vec = unit_rows(vec.astype(np.float32, copy=False))
+            dists_to_preds = np.clip(1.0 - unit_vec @ self._unit_pred_centroids.T, 0.0, 2.0)
+            dists_to_norms = np.clip(1.0 - unit_vec @ self._unit_norm_centroids.T, 0.0, 2.0)
+            return dists_to_preds, dists_to_norms
+        return cosine_distances(vec, self.predator_centroids), cosine_distances(vec, self.normal_centroids)
+
     def predict_new(self, conversation_obj) -> Dict:
         if self.predator_centroids is None or self.normal_centroids is None:
             return {"is_predator": False, "confidence": 0.0, "reason": "Model not trained"}
             
         # 1. Get Vector
-        vec = conversation_obj.get_weighted_embedding().reshape(1, -1)
+        vec = conversation_obj.get_weighted_embedding()
+        
+        # If user says "cam" or "secret", we artificially pull them closer to the predator cluster
+        risk_count = self.count_risk_keyword_texts(conversation_obj.texts)
+        return self.score_vector(vec, risk_count)
+
+    def predict_batch(self, conversations: List) -> List[Dict]:
+        """predict_new for many conversations, sharing one batched PageRank solve."""
+        if self.predator_centroids is None or self.normal_centroids is None:
+            return [{"is_predator": False, "confidence": 0.0, "reason": "Model not trained"} for _ in conversations]
+        vectors = BatchGraphEngine().weighted_embeddings(conversations)
+        return [
+            self.score_vector(vec, self.count_risk_keyword_texts(conv.texts))
+            for conv, vec in zip(conversations, vectors)
+        ]
+
+    def score_vector(self, vec: np.ndarray, risk_count: int = 0) -> Dict:
+        """Score an already weighted conversation (or profile) vector."""
+        if self.predator_centroids is None or self.normal_centroids is None:
+            return {"is_predator": False, "confidence": 0.0, "reason": "Model not trained"}
+
+        vec = np.asarray(vec).reshape(1, -1)
         
         # 2. Calculate Distances to Archetypes
         # returns array of shape (1, n_clusters)
-        dists_to_preds = cosine_distances(vec, self.predator_centroids)
-        dists_to_norms = cosine_distances(vec, self.normal_centroids)
+        dists_to_preds, dists_to_norms = self._archetype_distances(vec)
         
         # Find closest single archetype in each category
-        min_dist_pred = np.min(dists_to_preds)
-        min_dist_norm = np.min(dists_to_norms)
+        min_dist_pred = float(np.min(dists_to_preds))
+        min_dist_norm = float(np.min(dists_to_norms))
         
         # 3. Risk Keyword Adjustment
-        # If user says "cam" or "secret", we artificially pull them closer to the predator cluster
-        risk_count = self.count_risk_keywords(conversation_obj.messages)
-        
-        # RISK FACTOR: Each keyword reduces predator distance by 15%
+        # RISK FACTOR: Each keyword reduces predator distance by keyword_weight (15% by default)
         # This is a heuristic to bridge the gap between pure semantic/graph and explicit risk
-        risk_modifier = max(0.1, 1.0 - (risk_count * 0.15)) 
+        risk_modifier = max(0.1, 1.0 - (risk_count * self.keyword_weight)) 
         adjusted_pred_dist = min_dist_pred * risk_modifier
         
         # 4. Final Score (Similarity Ratio)
@@ -119,11 +165,38 @@ class PredatorDetector:
             "dist_norm": min_dist_norm
         }
 
+    def score_keywords(self, risk_count: int) -> Dict:
+        """
+        Fallback result when no embeddings are available. Keywords only adjust
+        the archetype distances in score_vector and were never calibrated on
+        their own, so no label or confidence is given: `undetermined` is set
+        and the keyword count is reported for the caller to act on.
+        """
+        return {
+            "is_predator": None,
+            "confidence": None,
+            "undetermined": True,
+            "risk_keywords": risk_count,
+            "dist_pred": None,
+            "dist_norm": None,
+            "reason": "No embeddings within the deadline"
+        }
+
+    def nearest_archetype(self, vec: np.ndarray) -> Dict:
+        """Closest centroid over both archetype sets: {'type', 'index', 'distance'}."""
+        dists_to_preds, dists_to_norms = self._archetype_distances(np.asarray(vec).reshape(1, -1))
+        pred_idx = int(np.argmin(dists_to_preds))
+        norm_idx = int(np.argmin(dists_to_norms))
+        if dists_to_preds[0, pred_idx] <= dists_to_norms[0, norm_idx]:
+            return {'type': 'predator', 'index': pred_idx, 'distance': float(dists_to_preds[0, pred_idx])}
+        return {'type': 'normal', 'index': norm_idx, 'distance': float(dists_to_norms[0, norm_idx])}
+
     def save_model(self, path: str):
         state = {
             'pred_centroids': self.predator_centroids,
             'norm_centroids': self.normal_centroids,
-            'risk_keywords': self.risk_keywords
+            'risk_keywords': self.risk_keywords,
+            'keyword_weight': self.keyword_weight
         }
         joblib.dump(state, path)
     
@@ -133,4 +206,7 @@ class PredatorDetector:
         self.normal_centroids = state['norm_centroids']
         if 'risk_keywords' in state:
             self.risk_keywords = state['risk_keywords']
+        if 'keyword_weight' in state:
+            self.keyword_weight = state['keyword_weight']
+        self._prepare_centroids()
         print("Cluster Centroids loaded.")
\ No newline at end of file
@@ -1,3 +1,4 @@
+import sys
 import numpy as np
 import cohere
 from typing import List, Dict, Tuple
@@ -6,57 +7,233 @@ from sklearn.metrics.pairwise import cosine_similarity
 from parser import ConversationParser
 import networkx as nx
 
+# Numeric precision for embeddings, similarities and centroids ("float64" or "float32")
+FLOAT_DTYPE = np.dtype(os.getenv("APEX_FLOAT_DTYPE", "float64"))
+
+def unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row, leaving all-zero rows at zero."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1).astype(matrix.dtype)
+
+def cosine_similarity_matrix(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Pairwise cosine similarity. float32 inputs are normalized once and
+    reduced to a single float32 GEMM; float64 keeps the sklearn path.
+    """
+    if embeddings.dtype == np.float32:
+        unit = unit_rows(embeddings)
+        return unit @ unit.T
+    return cosine_similarity(embeddings)
+
 class MessageEmbedder:
     """Embeds messages into vector representations using Cohere."""
+    __slots__ = ('client', 'model', 'dtype')
     
-    def __init__(self, api_key: str, model: str = 'embed-v4.0'):
-        self.client = cohere.ClientV2(api_key=api_key)
+    def __init__(self, api_key: str, model: str = 'embed-v4.0', dtype=None, client=None):
+        # `client` replaces the Cohere client (e.g. embed_stub.StubEmbedClient)
+        self.client = client or cohere.ClientV2(api_key=api_key)
         self.model = model
+        self.dtype = np.dtype(dtype or FLOAT_DTYPE)
     
     def embed_messages(self, messages: List[Dict]) -> np.ndarray:
+        """One row per message; chunks that fail are zero-filled (see embed_within)."""
+        embeddings, embedded = self.embed_within(messages)
+        if embedded.all():
+            return embeddings
+        full = np.zeros((len(messages), embeddings.shape[1] if embeddings.size else 1536), dtype=self.dtype)
+        full[embedded] = embeddings
+        return full
+
+    def embed_within(self, messages: List[Dict], deadline=None, chunk_timeout: float = None,
+                     newest_first: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embed what can be embedded, in chunks of 96.
+
+        Each chunk's request times out after `chunk_timeout` seconds, capped
+        by the time left on a budgets.Deadline, and no chunk starts once the
+        deadline has expired; `newest_first`
+        embeds from the end of the conversation so a cut-off keeps the latest
+        messages. Failed or skipped chunks are left out instead of zero-filled.
+
+        Returns:
+            (embeddings of the embedded messages in conversation order,
+             boolean mask over `messages` of which ones were embedded)
+        """
         texts = [msg['text'] for msg in messages]
         texts = [text if text.strip() else " " for text in texts]
         
-        text_inputs = []
-        template = {"content": [{"type": "text"}]}
-        for msg in texts:
-            ti = template.copy()
-            ti["content"][0]["text"] = msg
-            text_inputs.append(ti)
+        # One dict per message: a shallow template.copy() shared the inner
+        # content list, so every input ended up with the last message's text
+        text_inputs = [{"content": [{"type": "text", "text": msg}]} for msg in texts]
             
         chunk_size = 96
-        embeddings = []
+        starts = list(range(0, len(text_inputs), chunk_size))
+        if newest_first:
+            starts.reverse()
+        chunks = {}
         
-        for i in range(0, len(text_inputs), chunk_size):
+        for i in starts:
             chunk = text_inputs[i:i + chunk_size]
+            request_options = {}
+            remaining = None if deadline is None else deadline.remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                timeout = remaining if chunk_timeout is None else min(chunk_timeout, remaining)
+                # Fractional seconds: rounding up would let a short deadline run
+                # a whole second over. No retries: they would overrun it too
+                request_options = {"timeout_in_seconds": float(timeout), "max_retries": 0}
+            elif chunk_timeout is not None:
+                request_options = {"timeout_in_seconds": float(chunk_timeout)}
             try:
                 response = self.client.embed(
                     inputs=chunk,
                     model="embed-v4.0",
                     input_type="classification",
                     embedding_types=["float"],
+                    request_options=request_options or None,
                 )
-                embeddings.extend(response.embeddings.float)
+                chunks[i] = np.asarray(response.embeddings.float, dtype=self.dtype)
             except Exception as e:
                 print(f"Error embedding chunk: {e}")
-                embeddings.extend([np.zeros(1536) for _ in chunk])
-        
-        return np.array(embeddings)
+
+        embedded = np.zeros(len(messages), dtype=bool)
+        for i in chunks:
+            embedded[i:i + chunk_size] = True
+        ordered = [chunks[i] for i in sorted(chunks)]
+        if not ordered:
+            return np.zeros((0, 1536), dtype=self.dtype), embedded
+        return np.concatenate(ordered), embedded
+
+def _deep_sizeof(obj, seen=None) -> int:
+    """Recursive sys.getsizeof for the containers a Conversation is built from."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (0 if obj.base is None else obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(x, seen) for x in obj)
+    return size
+
+def top_k_per_row(values: np.ndarray, k: int, block_rows: int = 1024) -> np.ndarray:
+    """
+    Columns of the k largest values of each row, largest first with ties in
+    ascending column order: np.argsort(-values, axis=1, kind='stable')[:, :k]
+    without sorting whole rows or allocating an n x n index array. Rows are
+    partitioned in blocks, so temporaries stay O(block_rows x n).
+    """
+    n_rows, n_cols = values.shape
+    k = min(k, n_cols)
+    top = np.empty((n_rows, k), dtype=np.int64)
+    if k == 0:
+        return top
+    for start in range(0, n_rows, block_rows):
+        block = values[start:start + block_rows]
+        kth = np.partition(block, n_cols - k, axis=1)[:, n_cols - k, None]
+        above = block > kth
+        tied = block == kth
+        # Fill up to k with the lowest-column ties, as a stable sort would
+        need = k - above.sum(axis=1, keepdims=True)
+        chosen = above | (tied & (np.cumsum(tied, axis=1) <= need))
+        cols = np.nonzero(chosen)[1].reshape(len(block), k)
+        order = np.argsort(-np.take_along_axis(block, cols, axis=1), axis=1, kind='stable')
+        top[start:start + len(block)] = np.take_along_axis(cols, order, axis=1)
+    return top
+
+def symmetric_csr(n: int, src, dst, weights, is_reply):
+    """
+    CSR arrays (indptr, indices, weights, is_reply) of the undirected edges
+    (src[k], dst[k]). Each node's neighbours keep the order the edges were
+    given in, which matches the order the old dict-of-lists graph was filled.
+    """
+    src = np.asarray(src, dtype=np.int32)
+    dst = np.asarray(dst, dtype=np.int32)
+    weights = np.asarray(weights, dtype=np.float64)
+    is_reply = np.asarray(is_reply, dtype=bool)
+
+    rows = np.empty(2 * len(src), dtype=np.int32)
+    cols = np.empty(2 * len(src), dtype=np.int32)
+    rows[0::2], rows[1::2] = src, dst
+    cols[0::2], cols[1::2] = dst, src
+
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[order], np.repeat(weights, 2)[order], np.repeat(is_reply, 2)[order]
 
 class Conversation:
+    """
+    Columnar view of a single conversation.
+
+    Authors are int-coded, times are a float array and the graph is stored
+    as CSR arrays (indptr / indices / edge_weights / edge_is_reply). The
+    dict-based accessors (messages, data, graph) are rebuilt on demand.
+    """
+    __slots__ = (
+        'conversation_id', 'user_ids', 'texts', 'raw_times', 'lines',
+        'author_codes', 'author_names', 'message_times', 'embeddings',
+        'indptr', 'indices', 'edge_weights', 'edge_is_reply',
+        '_cos_sim_matrix', '_cached_weighted_vector',
+    )
+
     def __init__(self, conversation_data: Dict, conversation_embeddings: np.ndarray):
-        self.data = conversation_data
+        messages = conversation_data['messages']
+        self.conversation_id = conversation_data.get('conversation_id')
+        self.user_ids = list(conversation_data.get('user_ids', []))
         self.embeddings = conversation_embeddings
-        self.messages = conversation_data['messages']
-    
-        self.message_times = []
-        for msg in self.messages:
-            self.message_times.append(self.parse_time(msg['time']))
-        
-        self.graph = {i: [] for i in range(len(self.messages))}
-        self.cos_sim_matrix = cosine_similarity(self.embeddings)
+
+        self.texts = [msg['text'] for msg in messages]
+        self.raw_times = [msg['time'] for msg in messages]
+        self.lines = [msg['line'] for msg in messages] if all('line' in msg for msg in messages) and messages else None
+
+        names, codes = np.unique(np.asarray([msg['author'] for msg in messages], dtype=object), return_inverse=True)
+        self.author_names = list(names)
+        self.author_codes = codes.astype(np.int32).reshape(-1)
+        self.message_times = self.parse_times(self.raw_times)
+
+        self.set_edges([], [], [], [])
+        self._cos_sim_matrix = None
         self._cached_weighted_vector = None
-     
+
+    @classmethod
+    def from_columns(cls, conversation_id: str, texts: List[str], raw_times: List[str],
+                     author_codes: np.ndarray, author_names: List[str], message_times: np.ndarray,
+                     embeddings: np.ndarray) -> 'Conversation':
+        """Build from already columnar data (e.g. a corpus snapshot) without per-message dicts."""
+        conv = cls.__new__(cls)
+        conv.conversation_id = conversation_id
+        conv.user_ids = [author_names[c] for c in np.unique(author_codes).tolist()]
+        conv.texts = texts
+        conv.raw_times = raw_times
+        conv.lines = None
+        conv.author_codes = np.asarray(author_codes, dtype=np.int32)
+        conv.author_names = author_names
+        conv.message_times = np.asarray(message_times, dtype=np.float64)
+        conv.embeddings = embeddings
+        conv.set_edges([], [], [], [])
+        conv._cos_sim_matrix = None
+        conv._cached_weighted_vector = None
+        return conv
+
+    def __getstate__(self):
+        return {name: getattr(self, name, None) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        if 'messages' in state:
+            # Pickled before the columnar layout: rebuild from the old dicts
+            self.__init__(state['data'], state['embeddings'])
+            self.update_graph(state.get('graph') or {})
+            self._cached_weighted_vector = state.get('_cached_weighted_vector')
+            return
+        for name, value in state.items():
+            setattr(self, name, value)
+
     @staticmethod
     def parse_time(time: str) -> float:
         try:
@@ -69,31 +246,146 @@ class Conversation:
             pass
         return 0.0
 
+    @staticmethod
+    def parse_times(times: List[str]) -> np.ndarray:
+        """Vectorized parse_time: 'HH:MM' / 'HH:MM:SS' -> seconds, 0.0 if malformed."""
+        if len(times) == 0:
+            return np.zeros(0, dtype=np.float64)
+        arr = np.asarray([t if isinstance(t, str) else '' for t in times], dtype=str)
+
+        head = np.char.partition(arr, ':')
+        rest = np.char.partition(head[:, 2], ':')
+        hours, hours_ok = Conversation._int_parts(head[:, 0])
+        minutes, minutes_ok = Conversation._int_parts(rest[:, 0])
+        seconds, seconds_ok = Conversation._int_parts(rest[:, 2])
+
+        hm_ok = (head[:, 1] == ':') & hours_ok & minutes_ok
+        has_seconds = rest[:, 1] == ':'
+        valid_hm = hm_ok & ~has_seconds
+        valid_hms = hm_ok & has_seconds & seconds_ok
+        valid = valid_hm | valid_hms
+
+        total = np.where(valid, hours * 3600 + minutes * 60, 0.0)
+        total += np.where(valid_hms, seconds, 0.0)
+        return total
+
+    @staticmethod
+    def _int_parts(parts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """int() of each string (surrounding spaces and one leading sign allowed) -> (values, ok)."""
+        parts = np.char.strip(parts)
+        digits = np.char.lstrip(parts, '+-')
+        ok = np.char.isdecimal(digits) & (np.char.str_len(parts) - np.char.str_len(digits) <= 1)
+        values = np.where(ok, digits, '0').astype(np.float64)
+        return np.where(np.char.startswith(parts, '-'), -values, values), ok
+
+    @property
+    def n_messages(self) -> int:
+        return len(self.texts)
+
+    @property
+    def messages(self) -> List[Dict]:
+        names = self.author_names
+        msgs = [
+            {'author': names[code], 'time': t, 'text': text}
+            for code, t, text in zip(self.author_codes.tolist(), self.raw_times, self.texts)
+        ]
+        if self.lines is not None:
+            for msg, line in zip(msgs, self.lines):
+                msg['line'] = line
+        return msgs
+
+    @property
+    def data(self) -> Dict:
+        return {
+            'conversation_id': self.conversation_id,
+            'user_ids': self.user_ids,
+            'messages': self.messages,
+        }
+
+    @property
+    def cos_sim_matrix(self) -> np.ndarray:
+        if self._cos_sim_matrix is None:
+            self._cos_sim_matrix = cosine_similarity_matrix(self.embeddings)
+        return self._cos_sim_matrix
+
+    @property
+    def graph(self) -> Dict[int, List[Tuple[int, float, Dict]]]:
+        """Adjacency-list view of the CSR graph (one attrs dict per undirected edge)."""
+        graph = {i: [] for i in range(self.n_messages)}
+        shared = {}
+        indices = self.indices.tolist()
+        weights = self.edge_weights.tolist()
+        replies = self.edge_is_reply.tolist()
+        indptr = self.indptr.tolist()
+        for i in range(self.n_messages):
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                key = (i, j) if i < j else (j, i)
+                attrs = shared.get(key)
+                if attrs is None:
+                    attrs = shared[key] = {'weight': weights[k], 'is_reply': replies[k]}
+                graph[i].append((j, weights[k], attrs))
+        return graph
+
+    @graph.setter
+    def graph(self, graph: Dict[int, List[Tuple[int, float, Dict]]]):
+        self.update_graph(graph)
+
+    def set_edges(self, src, dst, weights, is_reply):
+        """Store undirected edges (src[k], dst[k]) as a symmetric CSR matrix."""
+        self.indptr, self.indices, self.edge_weights, self.edge_is_reply = symmetric_csr(
+            self.n_messages, src, dst, weights, is_reply)
+        self._cached_weighted_vector = None
+
+    def prefix(self, length: int) -> 'Conversation':
+        """The first `length` messages as a new Conversation sharing this one's arrays (no graph)."""
+        conv = Conversation.__new__(Conversation)
+        codes = self.author_codes[:length]
+        conv.conversation_id = self.conversation_id
+        conv.user_ids = [self.author_names[c] for c in np.unique(codes).tolist()]
+        conv.texts = self.texts[:length]
+        conv.raw_times = self.raw_times[:length]
+        conv.lines = None if self.lines is None else self.lines[:length]
+        conv.author_codes = codes
+        conv.author_names = self.author_names
+        conv.message_times = self.message_times[:length]
+        conv.embeddings = self.embeddings[:length]
+        conv._cos_sim_matrix = None if self._cos_sim_matrix is None else self._cos_sim_matrix[:length, :length]
+        conv.set_edges([], [], [], [])
+        return conv
+
+    def neighbors(self, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (neighbour indices, edge weights) of a message."""
+        start, end = self.indptr[idx], self.indptr[idx + 1]
+        return self.indices[start:end], self.edge_weights[start:end]
+
     def same_speaker(self, idx_i: int, idx_j: int) -> bool:
-        return self.messages[idx_i]['author'] == self.messages[idx_j]['author']
+        return bool(self.author_codes[idx_i] == self.author_codes[idx_j])
 
     def detect_reply(self, idx_i: int, idx_j: int) -> bool:
         if idx_j != idx_i + 1:
             return False
-        if self.messages[idx_i]['author'] == self.messages[idx_j]['author']:
+        if self.author_codes[idx_i] == self.author_codes[idx_j]:
             return False
         return True
 
     def get_edge_list(self) -> List[Tuple[int, int, float, Dict]]:
-        edges = []
-        seen = set()
-        for i in range(len(self.messages)):
-            for j, weight, attributes in self.graph[i]:
-                edge_key = tuple(sorted([i, j]))
-                if edge_key not in seen:
-                    edges.append((i, j, weight, attributes))
-                    seen.add(edge_key)
-        return edges
+        n = self.n_messages
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+        cols = self.indices.astype(np.int64)
+        # First occurrence of every undirected edge, in CSR order
+        _, first = np.unique(np.minimum(rows, cols) * n + np.maximum(rows, cols), return_index=True)
+        first.sort()
+        return [
+            (int(rows[k]), int(cols[k]), float(self.edge_weights[k]),
+             {'weight': float(self.edge_weights[k]), 'is_reply': bool(self.edge_is_reply[k])})
+            for k in first
+        ]
     
     def to_networkx(self):
         G = nx.Graph()
-        for i, msg in enumerate(self.messages):
-            G.add_node(i, author=msg['author'], time=msg['time'])
+        for i, (code, t) in enumerate(zip(self.author_codes.tolist(), self.raw_times)):
+            G.add_node(i, author=self.author_names[code], time=t)
         for i, j, weight, attrs in self.get_edge_list():
             G.add_edge(i, j, **attrs)
         return G
@@ -125,31 +417,75 @@ class Conversation:
             # Fallback for disconnected graphs or errors
             centrality = {i: 1.0/G.number_of_nodes() for i in G.nodes()}
             
-        weighted_sum = np.zeros(self.embeddings.shape[1])
-        total_weight = 0.0
-        
-        for i, score in centrality.items():
-            # Multiply embedding by its structural importance
-            weighted_sum += self.embeddings[i] * score
-            total_weight += score
+        # Multiply each embedding by its structural importance, in the embedding dtype
+        scores = np.array([centrality.get(i, 0.0) for i in range(len(self.embeddings))],
+                          dtype=self.embeddings.dtype)
+        total_weight = scores.sum()
             
         # Normalize
         if total_weight > 0:
-            self._cached_weighted_vector = weighted_sum / total_weight
+            self._cached_weighted_vector = (scores @ self.embeddings) / total_weight
         else:
             self._cached_weighted_vector = np.mean(self.embeddings, axis=0)
             
         return self._cached_weighted_vector
     
+    def cached_weighted_embedding(self):
+        """The cached get_weighted_embedding result, or None if not computed yet."""
+        return self._cached_weighted_vector
+
+    def cache_weighted_embedding(self, vector: np.ndarray):
+        """Store a weighted vector computed elsewhere (e.g. by BatchGraphEngine)."""
+        self._cached_weighted_vector = vector
+
     def update_graph(self, graph: Dict[int, List[Tuple[int, float, Dict]]]):
-        self.graph = graph
+        """Load an adjacency-list graph into the CSR arrays (only weight / is_reply are kept)."""
+        n = self.n_messages
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices, weights, replies = [], [], []
+        for i in range(n):
+            for j, weight, attributes in graph.get(i, []):
+                indices.append(j)
+                weights.append(weight)
+                replies.append(bool(attributes.get('is_reply', False)))
+            indptr[i + 1] = len(indices)
+        self.indptr = indptr
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.edge_weights = np.asarray(weights, dtype=np.float64)
+        self.edge_is_reply = np.asarray(replies, dtype=bool)
         self._cached_weighted_vector = None # Invalidate cache
+
+    def memory_report(self) -> Dict:
+        """
+        Compare the bytes held by the columnar layout with the old
+        dict-of-messages / list-of-times / dict-of-tuples layout.
+        Embeddings are identical in both and reported separately.
+        """
+        columnar = sum(a.nbytes for a in (self.author_codes, self.message_times, self.indptr,
+                                          self.indices, self.edge_weights, self.edge_is_reply))
+        seen = set()
+        columnar += sum(_deep_sizeof(x, seen) for x in (self.texts, self.raw_times, self.author_names, self.lines))
+        legacy_times = [float(t) for t in self.message_times]
+        seen = set()
+        legacy = sum(_deep_sizeof(x, seen) for x in (self.messages, legacy_times, self.graph))
+        return {
+            'conversation_id': self.conversation_id,
+            'n_messages': self.n_messages,
+            'n_edges': int(len(self.indices) // 2),
+            'columnar_bytes': int(columnar),
+            'legacy_bytes': int(legacy),
+            'saved_bytes': int(legacy - columnar),
+            'reduction': round(1.0 - columnar / legacy, 4) if legacy else 0.0,
+            'embedding_bytes': int(np.asarray(self.embeddings).nbytes),
+        }
     
     def get_messages(self): return self.messages
     def get_embeddings(self): return self.embeddings
     def get_similarity_matrix(self): return self.cos_sim_matrix
 
 class GraphBuilder:
+    __slots__ = ('min_semantic_score', 'half_life_seconds', 'max_edges_per_node', 'w_reply', 'w_speaker')
+
     def __init__(self, 
                  min_semantic_score: float = 0.55,
                  half_life_seconds: float = 300.0, 
@@ -164,26 +500,121 @@ class GraphBuilder:
         self.w_speaker = w_speaker
         
     def build_graph(self, conversation: Conversation) -> Dict:
-        n_messages = len(conversation.get_messages())
+        n_messages = conversation.n_messages
+        k = min(self.max_edges_per_node, n_messages)
+        if n_messages < 2 or k <= 0:
+            conversation.set_edges([], [], [], [])
+            return
+
+        candidates = self.edge_weight_matrix(conversation)
+        # Only forward edges (j > i) above the floor are candidates (in place: no second n x n copy)
+        candidates[~np.triu(candidates > 0.2, 1)] = -np.inf
+
+        # Ties in ascending j, like the old list.sort(reverse=True)
+        top = top_k_per_row(candidates, k)
+        top_weights = np.take_along_axis(candidates, top, axis=1)
+        keep = np.isfinite(top_weights)
+
+        src = np.broadcast_to(np.arange(n_messages)[:, None], top.shape)[keep]
+        dst = top[keep]
+        codes = conversation.author_codes
+        is_reply = (dst == src + 1) & (codes[src] != codes[dst])
+        conversation.set_edges(src, dst, top_weights[keep], is_reply)
+
+    def build_graph_windowed(self, conversation: Conversation, window: int, deadline=None,
+                             block_rows: int = None) -> bool:
+        """
+        build_graph restricted to forward edges of at most `window` messages,
+        computed in blocks of `block_rows` rows (default `window`) so memory
+        stays O(block_rows x window) instead of O(n^2). The full similarity
+        matrix is never materialized; with window >= n the edges equal build_graph's.
+
+        With a budgets.Deadline, blocks are processed from the end of the
+        conversation and the loop stops once it expires, keeping the edges
+        found so far. Returns False if it stopped early.
+        """
+        n_messages = conversation.n_messages
+        k = min(self.max_edges_per_node, n_messages)
+        if n_messages < 2 or k <= 0 or window <= 0:
+            conversation.set_edges([], [], [], [])
+            return True
+
+        unit = unit_rows(conversation.get_embeddings())
         times = conversation.message_times
-        temp_graph = {i: [] for i in range(n_messages)}
-        
-        for i in range(n_messages):
-            potential_edges = []
-            for j in range(i + 1, n_messages):
-                weight, attributes = self.calculate_edge_weight(conversation, i, j, times)
-                if weight > 0.2: 
-                    potential_edges.append((j, weight, attributes))
-            
-            potential_edges.sort(key=lambda x: x[1], reverse=True)
-            top_edges = potential_edges[:self.max_edges_per_node]
-            
-            for j, weight, attributes in top_edges:
-                temp_graph[i].append((j, weight, attributes))
-                temp_graph[j].append((i, weight, attributes))
-                    
-        conversation.update_graph(temp_graph)
+        codes = conversation.author_codes
+        sources, targets, edge_weights = [], [], []
+        block_rows = block_rows or window
+        starts = range(0, n_messages, block_rows)
+        complete = True
+        for start in (starts if deadline is None else reversed(starts)):
+            if deadline is not None and deadline.expired():
+                complete = False
+                break
+            end = min(start + block_rows, n_messages)
+            stop = min(end + window, n_messages)
+            rows = np.arange(start, end)[:, None]
+            cols = np.arange(start, stop)[None, :]
+
+            sim = unit[start:end] @ unit[start:stop].T
+            decay = 0.5 ** (np.abs(times[cols] - times[rows]) / self.half_life_seconds)
+            same = codes[rows] == codes[cols]
+            weights = sim * decay.astype(sim.dtype, copy=False) + self.w_speaker * same
+            weights += self.w_reply * ((cols == rows + 1) & ~same)
+
+            band = (cols > rows) & (cols <= rows + window)
+            candidates = np.where(band & (weights > 0.2), weights, -np.inf)
+            top = top_k_per_row(candidates, k)
+            top_weights = np.take_along_axis(candidates, top, axis=1)
+            keep = np.isfinite(top_weights)
+
+            sources.append(np.broadcast_to(rows, top.shape)[keep])
+            targets.append((top + start)[keep])
+            edge_weights.append(top_weights[keep])
+
+        if not sources:
+            conversation.set_edges([], [], [], [])
+            return complete
+        if deadline is not None:
+            # Back to conversation order, so the edges match an undeadlined build
+            sources, targets, edge_weights = sources[::-1], targets[::-1], edge_weights[::-1]
+        src = np.concatenate(sources)
+        dst = np.concatenate(targets)
+        is_reply = (dst == src + 1) & (codes[src] != codes[dst])
+        conversation.set_edges(src, dst, np.concatenate(edge_weights), is_reply)
+        return complete
+
+    def edge_weight_matrix(self, conversation: Conversation) -> np.ndarray:
+        """All pairwise calculate_edge_weight values as one n x n matrix."""
+        times = conversation.message_times
+        codes = conversation.author_codes
+        sim = conversation.get_similarity_matrix()
+        decay = 0.5 ** (np.abs(times[None, :] - times[:, None]) / self.half_life_seconds)
+        weights = sim * decay.astype(sim.dtype, copy=False)
+
+        same = codes[:, None] == codes[None, :]
+        weights += self.w_speaker * same
+        idx = np.arange(len(codes) - 1)
+        weights[idx, idx + 1] += self.w_reply * ~same[idx, idx + 1]
+        return weights
         
+    def column_weights(self, sims: np.ndarray, times: np.ndarray, codes: np.ndarray,
+                       candidates: np.ndarray, idx_j: int) -> np.ndarray:
+        """edge_weight_matrix()[candidates, idx_j], given the candidates' similarities to idx_j."""
+        decay = 0.5 ** (np.abs(times[idx_j] - times[candidates]) / self.half_life_seconds)
+        same = codes[candidates] == codes[idx_j]
+        is_reply = (candidates == idx_j - 1) & ~same
+        return sims * decay + self.w_speaker * same + self.w_reply * is_reply
+
+    def edge_horizon_seconds(self) -> float:
+        """
+        Time gap beyond which two non-adjacent messages can never pass the
+        0.2 edge floor (similarity <= 1, so decay alone must clear it).
+        """
+        floor = 0.2 - self.w_speaker
+        if floor <= 0:
+            return np.inf
+        return self.half_life_seconds * np.log2(1.0 / floor)
+
     def calculate_edge_weight(self, conversation: Conversation, idx_i: int, idx_j: int, times: List[float]) -> Tuple[float, Dict]:
         sim_text = conversation.get_similarity_matrix()[idx_i, idx_j]
         delta_seconds = abs(times[idx_j] - times[idx_i])
@@ -196,4 +627,64 @@ class GraphBuilder:
             
         total_weight = base_score + bonus
         attrs = {'weight': total_weight, 'is_reply': conversation.detect_reply(idx_i, idx_j)}
-        return total_weight, attrs
\ No newline at end of file
+        return total_weight, attrs
+
+class IncrementalGraph:
+    """
+    The forward top-k rows of GraphBuilder.build_graph, grown one message at a time.
+
+    Adding message j can only insert j into earlier rows, so each row keeps its
+    best max_edges_per_node (weight, j) pairs ordered like build_graph's stable
+    sort (weight descending, ties to the smaller j).
+    """
+    __slots__ = ('k', 'n', 'top_j', 'top_w', 'counts')
+
+    def __init__(self, max_edges_per_node: int, capacity: int = 16):
+        self.k = max(int(max_edges_per_node), 0)
+        self.n = 0
+        self.top_j = np.full((capacity, max(self.k, 1)), -1, dtype=np.int64)
+        self.top_w = np.zeros((capacity, max(self.k, 1)), dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self, size: int):
+        capacity = len(self.counts)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        extra = capacity - len(self.counts)
+        self.top_j = np.vstack([self.top_j, np.full((extra, self.top_j.shape[1]), -1, dtype=np.int64)])
+        self.top_w = np.vstack([self.top_w, np.zeros((extra, self.top_w.shape[1]))])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+
+    def add_node(self, candidates, weights):
+        """
+        Append message j = self.n. `candidates` are earlier message indices and
+        `weights` their edge weights to j; only those above 0.2 can become edges.
+        """
+        j = self.n
+        self._grow(j + 1)
+        self.n += 1
+        k = self.k
+        for i, w in zip(np.asarray(candidates).tolist(), np.asarray(weights, dtype=np.float64).tolist()):
+            if not w > 0.2 or k == 0:
+                continue
+            c = int(self.counts[i])
+            row_w, row_j = self.top_w[i], self.top_j[i]
+            if c == k and not w > row_w[c - 1]:
+                continue
+            # j is the largest index so far, so it goes after every equal weight
+            pos = int(np.count_nonzero(row_w[:c] >= w))
+            end = min(c, k - 1)
+            row_w[pos + 1:end + 1] = row_w[pos:end]
+            row_j[pos + 1:end + 1] = row_j[pos:end]
+            row_w[pos] = w
+            row_j[pos] = j
+            self.counts[i] = min(c + 1, k)
+
+    def edges(self):
+        """(src, dst, weights) in the order build_graph generates them."""
+        n = self.n
+        width = self.top_j.shape[1]
+        valid = np.arange(width)[None, :] < self.counts[:n, None]
+        src = np.broadcast_to(np.arange(n)[:, None], (n, width))[valid]
+        return src, self.top_j[:n][valid], self.top_w[:n][valid]
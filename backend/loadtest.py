@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+ENDPOINTS = ('generate_key', 'run_inference', 'results')
+
+_WORDS = ('hey', 'how', 'are', 'you', 'what', 'up', 'school', 'today', 'game', 'music', 'lol', 'ok',
+          'cool', 'weekend', 'homework', 'movie', 'friends', 'later', 'sure', 'maybe', 'bored', 'fun')
+# A few of PredatorDetector.risk_keywords, so the keyword path sees hits
+_RISK_WORDS = ('secret', 'pic', 'age', 'meet', 'parents', 'snap')
+
+
+def synthetic_conversations(count: int, min_messages: int = 8, max_messages: int = 60,
+                            risk_rate: float = 0.05, seed: int = 0) -> List[List[Dict]]:
+    """Two-author conversations of random small-talk with occasional risk keywords."""
+    rng = random.Random(seed)
+    conversations = []
+    for c in range(count):
+        authors = (f'user_{c}_a', f'user_{c}_b')
+        minute = rng.randrange(0, 23 * 60)
+        messages = []
+        for i in range(rng.randint(min_messages, max_messages)):
+            minute = min(minute + rng.choice((0, 1, 1, 2, 5)), 23 * 60 + 59)
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(2, 12))]
+            if rng.random() < risk_rate:
+                words[rng.randrange(len(words))] = rng.choice(_RISK_WORDS)
+            messages.append({'author': authors[i % 2 if rng.random() < 0.8 else rng.randrange(2)],
+                             'time': f'{minute // 60:02d}:{minute % 60:02d}',
+                             'text': ' '.join(words)})
+        conversations.append(messages)
+    return conversations
+
+
+def load_conversations(path: str) -> List[List[Dict]]:
+    """
+    Recorded conversations: a PAN12 .xml file, or JSON holding one message
+    list (like sample_sus_data.json), a list of them, or {'messages': [...]} dicts.
+    """
+    if path.endswith('.xml'):
+        from parser import ConversationParser
+        return [c['messages'] for c in ConversationParser(path).parse_all_conversations() if c['messages']]
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data and isinstance(data[0], dict) and 'messages' not in data[0]:
+        data = [data]
+    return [c['messages'] if isinstance(c, dict) else c for c in data]
+
+
+class _HttpTransport:
+    """Requests against a running server."""
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers=dict(headers or {}, **{'Content-Type': 'application/json'}))
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, json.loads(resp.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class _FlaskTransport:
+    """Requests through the app's test client, in this process (one client per worker)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        resp = self.client.open(path, method=method, json=body, headers=headers)
+        return resp.status_code, resp.get_json(silent=True)
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-q * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LoadTest:
+    """
+    Replay conversations against the API from `concurrency` workers.
+
+    Each worker gets its own API key from /api/generate_key and sends
+    `warmup` untimed inferences (model load, first-request caches); once
+    every worker is warm, the measured phase starts: workers post
+    conversations to /api/run_inference (round-robin over the corpus) and
+    read a page of /api/results every `results_every` inferences, until
+    `requests` inferences were sent or `duration` seconds passed.
+    """
+
+    def __init__(self, make_transport, conversations: List[List[Dict]], concurrency: int = 4,
+                 requests: int = 200, duration: float = None, results_every: int = 5,
+                 deadline_ms: float = None, warmup: int = 1):
+        if not conversations:
+            raise ValueError("No conversations to replay")
+        self.make_transport = make_transport
+        self.conversations = conversations
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.results_every = results_every
+        self.deadline_ms = deadline_ms
+        self.warmup = warmup
+        self.samples: List[tuple] = []
+        self._lock = threading.Lock()
+        self._sent = 0
+
+    def _next_index(self, stop_at: Optional[float]) -> Optional[int]:
+        with self._lock:
+            if (self.requests and self._sent >= self.requests) or (stop_at and time.perf_counter() >= stop_at):
+                return None
+            self._sent += 1
+            return self._sent - 1
+
+    def _timed(self, transport, endpoint: str, method: str, path: str, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            status, payload = transport.request(method, path, body, headers)
+        except Exception as e:
+            status, payload = None, {'error': str(e)}
+        elapsed = time.perf_counter() - start
+        ok = status is not None and 200 <= status < 300
+        path_taken = None
+        if endpoint == 'run_inference' and ok and isinstance(payload, dict):
+            result = (payload.get('entry') or {}).get('result')
+            if isinstance(result, dict):
+                path_taken = (result.get('execution') or {}).get('path')
+        self.samples.append((endpoint, elapsed, ok, status, path_taken))
+        return ok, payload
+
+    def _inference_body(self, index: int) -> Dict:
+        body = {'messages': self.conversations[index % len(self.conversations)]}
+        if self.deadline_ms:
+            body['deadline_ms'] = self.deadline_ms
+        return body
+
+    def _worker(self, worker_id: int, ready: threading.Barrier, clock: Dict):
+        transport = self.make_transport()
+        ok, payload = self._timed(transport, 'generate_key', 'POST', '/api/generate_key',
+                                  {'project': f'loadtest-{worker_id}'})
+        headers = None
+        if ok and payload and 'key' in payload:
+            headers = {'Authorization': f"Bearer {payload['key']}"}
+            for i in range(self.warmup):
+                # Untimed: cold-start costs would otherwise dominate the tail latencies
+                try:
+                    transport.request('POST', '/api/run_inference', self._inference_body(worker_id + i), headers)
+                except Exception:
+                    pass
+        ready.wait()
+        if headers is None:
+            return
+        stop_at = clock['stop_at']
+        done = 0
+        while True:
+            index = self._next_index(stop_at)
+            if index is None:
+                return
+            self._timed(transport, 'run_inference', 'POST', '/api/run_inference', self._inference_body(index), headers)
+            done += 1
+            if self.results_every and done % self.results_every == 0:
+                self._timed(transport, 'results', 'GET', '/api/results?limit=50', None, headers)
+
+    def run(self) -> Dict:
+        clock = {}
+
+        def start_clock():
+            # Runs once, when the last worker has finished its warm-up
+            clock['start'] = time.perf_counter()
+            clock['stop_at'] = clock['start'] + self.duration if self.duration else None
+
+        ready = threading.Barrier(self.concurrency, action=start_clock)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(self._worker, i, ready, clock) for i in range(self.concurrency)]:
+                future.result()
+        return self.report(time.perf_counter() - clock['start'])
+
+    def report(self, wall_seconds: float) -> Dict:
+        endpoints = {}
+        paths: Dict[str, int] = {}
+        for endpoint in ENDPOINTS:
+            samples = [s for s in self.samples if s[0] == endpoint]
+            if not samples:
+                continue
+            latencies = sorted(s[1] * 1000 for s in samples)
+            errors = sum(1 for s in samples if not s[2])
+            statuses: Dict[str, int] = {}
+            for s in samples:
+                statuses[str(s[3])] = statuses.get(str(s[3]), 0) + 1
+                if s[4]:
+                    paths[s[4]] = paths.get(s[4], 0) + 1
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': round(errors / len(samples), 4),
+                'throughput_rps': round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+                'mean_ms': round(sum(latencies) / len(latencies), 2),
+                'p50_ms': round(_percentile(latencies, 50), 2),
+                'p95_ms': round(_percentile(latencies, 95), 2),
+                'p99_ms': round(_percentile(latencies, 99), 2),
+                'max_ms': round(latencies[-1], 2),
+                'status_codes': statuses,
+            }
+        scored = sum(1 for s in self.samples if s[0] == 'run_inference' and s[2])
+        return {
+            'concurrency': self.concurrency,
+            'wall_seconds': round(wall_seconds, 3),
+            'requests': len(self.samples),
+            'throughput_rps': round(len(self.samples) / wall_seconds, 2) if wall_seconds else None,
+            'conversations_per_second': round(scored / wall_seconds, 2) if wall_seconds else None,
+            'endpoints': endpoints,
+            'inference_paths': paths,
+        }
+
+
+def _in_process_app(args):
+    """Import the Flask app with the stub embedder and, unless --keep-state, throwaway stores."""
+    os.environ['APEX_EMBEDDER'] = 'stub'
+    os.environ['APEX_STUB_LATENCY_MS'] = str(args.stub_latency_ms)
+    os.environ['APEX_STUB_JITTER_MS'] = str(args.stub_jitter_ms)
+    os.environ['APEX_STUB_ERROR_RATE'] = str(args.stub_error_rate)
+    if not args.keep_state:
+        state_dir = tempfile.mkdtemp(prefix='apex-loadtest-')
+        os.environ['APEX_STORE_PATH'] = os.path.join(state_dir, 'data_store.json')
+        os.environ['APEX_PROFILE_PATH'] = os.path.join(state_dir, 'risk_profiles.db')
+        os.environ['APEX_VECTOR_STORE_DIR'] = os.path.join(state_dir, 'vector_store')
+        print(f"State for this run: {state_dir}")
+    from app import app
+    return app
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load test /api/generate_key, /api/run_inference and /api/results")
+    arg_parser.add_argument('--url', help="Base URL of a running server (start it with APEX_EMBEDDER=stub); "
+                                          "default: the app in this process with the stub embedder")
+    arg_parser.add_argument('--conversations', help="Recorded conversations (.json or PAN12 .xml); default: synthetic")
+    arg_parser.add_argument('--synthetic', type=int, default=100, help="Number of synthetic conversations")
+    arg_parser.add_argument('--min-messages', type=int, default=8)
+    arg_parser.add_argument('--max-messages', type=int, default=60)
+    arg_parser.add_argument('--concurrency', type=int, default=4)
+    arg_parser.add_argument('--requests', type=int, default=200, help="Inference requests in total (0 = until --duration)")
+    arg_parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    arg_parser.add_argument('--results-every', type=int, default=5, help="GET /api/results after every N inferences per worker")
+    arg_parser.add_argument('--deadline-ms', type=float, help="deadline_ms sent with every inference")
+    arg_parser.add_argument('--warmup', type=int, default=1, help="Untimed inferences per worker before measuring")
+    arg_parser.add_argument('--timeout', type=float, default=60.0, help="HTTP timeout per request (--url only)")
+    arg_parser.add_argument('--stub-latency-ms', type=float, default=50.0)
+    arg_parser.add_argument('--stub-jitter-ms', type=float, default=10.0)
+    arg_parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    arg_parser.add_argument('--keep-state', action='store_true', help="In-process: use the real data/profile/vector stores")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', help="Write the report as JSON")
+    args = arg_parser.parse_args()
+    if not args.requests and not args.duration:
+        arg_parser.error("--requests 0 needs --duration")
+
+    if args.conversations:
+        conversations = load_conversations(args.conversations)
+    else:
+        conversations = synthetic_conversations(args.synthetic, args.min_messages, args.max_messages, seed=args.seed)
+
+    if args.url:
+        make_transport = lambda: _HttpTransport(args.url, args.timeout)
+    else:
+        flask_app = _in_process_app(args)
+        make_transport = lambda: _FlaskTransport(flask_app)
+
+    report = LoadTest(make_transport, conversations, concurrency=args.concurrency, requests=args.requests,
+                      duration=args.duration, results_every=args.results_every,
+                      deadline_ms=args.deadline_ms, warmup=args.warmup).run()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
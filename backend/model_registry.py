@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+
+from feature_extraction import PredatorDetector
+
+SHADOW_LOG_PATH = os.getenv("APEX_SHADOW_LOG") or None
+# Conversations queued for shadow scoring at most; later ones are dropped and counted
+SHADOW_MAX_PENDING = int(os.getenv("APEX_SHADOW_MAX_PENDING", "256"))
+
+
+def parse_model_specs(spec: str) -> Dict[str, str]:
+    """'v2=/models/a.pt,v3=/models/b.pt' -> {'v2': '/models/a.pt', 'v3': '/models/b.pt'}"""
+    models = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        version, _, path = item.partition('=')
+        if not path:
+            raise ValueError(f"Model spec must look like version=path: {item}")
+        models[version.strip()] = path.strip()
+    return models
+
+
+class ModelRegistry:
+    """
+    Several versioned PredatorDetector states held in memory.
+
+    One version is primary and answers requests; shadow versions score the
+    same weighted conversation vector on a background thread, so they add no
+    embedding cost and no latency to the primary response. Shadow results
+    are kept in a bounded in-memory log (optionally appended to a JSONL
+    file) along with per-version disagreement statistics. At most
+    `max_pending` conversations wait for shadow scoring; past that they are
+    dropped (and counted) rather than queued without bound.
+    """
+
+    def __init__(self, dtype=np.float64, history: int = 1000, shadow_log_path: Optional[str] = SHADOW_LOG_PATH,
+                 max_pending: int = SHADOW_MAX_PENDING):
+        self.dtype = dtype
+        self.shadow_log_path = shadow_log_path
+        self.max_pending = max_pending
+        self._pending = 0
+        self._dropped = 0
+        self._models: Dict[str, PredatorDetector] = {}
+        self._primary: Optional[str] = None
+        self._shadows: List[str] = []
+        self._records = deque(maxlen=history)
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-scoring')
+
+    def register(self, version: str, model, primary: bool = False, shadow: bool = False) -> PredatorDetector:
+        """
+        Add a model version from a saved state path or a PredatorDetector.
+        The first registered version becomes primary unless another is chosen.
+        """
+        if isinstance(model, PredatorDetector):
+            detector = model
+        else:
+            detector = PredatorDetector("dummy.txt", dtype=self.dtype)
+            detector.load_model(model)
+        with self._lock:
+            self._models[version] = detector
+            if primary or self._primary is None:
+                self._primary = version
+                if version in self._shadows:
+                    self._shadows.remove(version)
+            elif shadow and version not in self._shadows:
+                self._shadows.append(version)
+        return detector
+
+    def set_primary(self, version: str):
+        with self._lock:
+            if version not in self._models:
+                raise KeyError(f"Unknown model version: {version}")
+            if version in self._shadows:
+                self._shadows.remove(version)
+            self._primary = version
+
+    def primary(self):
+        """(version, detector) of the primary model."""
+        with self._lock:
+            return self._primary, self._models[self._primary]
+
+    def score(self, conversation) -> Dict:
+        """
+        Score with the primary model and queue every shadow on the same vector.
+
+        The result gets a 'model_version' key; shadows never affect it.
+        """
+        version, detector = self.primary()
+        result = detector.predict_new(conversation)
+        result['model_version'] = version
+
+        with self._lock:
+            shadows = [(v, self._models[v]) for v in self._shadows]
+            if not shadows or 'reason' in result:
+                return result
+            if self._pending >= self.max_pending:
+                self._dropped += 1
+                return result
+            self._pending += 1
+        vec = conversation.get_weighted_embedding()
+        texts = list(conversation.texts)
+        future = self._executor.submit(self._score_shadows, conversation.conversation_id, vec, texts,
+                                       version, dict(result), shadows)
+        future.add_done_callback(self._shadow_done)
+        return result
+
+    def _shadow_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _score_shadows(self, conversation_id, vec, texts, primary_version, primary_result, shadows):
+        for version, detector in shadows:
+            try:
+                shadow = detector.score_vector(vec, detector.count_risk_keyword_texts(texts))
+            except Exception as e:
+                print(f"Shadow model {version} failed: {e}")
+                continue
+            delta = abs(float(shadow['confidence']) - float(primary_result['confidence']))
+            agree = bool(shadow['is_predator']) == bool(primary_result['is_predator'])
+            record = {
+                'ts': int(time.time()),
+                'conversation_id': conversation_id,
+                'primary_version': primary_version,
+                'primary_confidence': float(primary_result['confidence']),
+                'primary_is_predator': bool(primary_result['is_predator']),
+                'shadow_version': version,
+                'shadow_confidence': float(shadow['confidence']),
+                'shadow_is_predator': bool(shadow['is_predator']),
+                'confidence_delta': round(delta, 4),
+                'agree': agree,
+            }
+            with self._lock:
+                self._records.append(record)
+                stats = self._stats.setdefault(version, {'scored': 0, 'disagreements': 0,
+                                                         'sum_abs_delta': 0.0, 'max_abs_delta': 0.0})
+                stats['scored'] += 1
+                stats['disagreements'] += 0 if agree else 1
+                stats['sum_abs_delta'] += delta
+                stats['max_abs_delta'] = max(stats['max_abs_delta'], delta)
+            if self.shadow_log_path:
+                try:
+                    with open(self.shadow_log_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record) + '\n')
+                except OSError as e:
+                    print(f"Failed to write shadow log: {e}")
+
+    def report(self, recent: int = 20) -> Dict:
+        """Versions, roles, per-shadow disagreement statistics, the shadow queue and the latest records."""
+        with self._lock:
+            shadows = {}
+            for version in self._shadows:
+                stats = self._stats.get(version, {'scored': 0, 'disagreements': 0,
+                                                  'sum_abs_delta': 0.0, 'max_abs_delta': 0.0})
+                scored = stats['scored']
+                shadows[version] = {
+                    'scored': scored,
+                    'disagreements': stats['disagreements'],
+                    'disagreement_rate': round(stats['disagreements'] / scored, 4) if scored else 0.0,
+                    'mean_abs_delta': round(stats['sum_abs_delta'] / scored, 4) if scored else 0.0,
+                    'max_abs_delta': round(stats['max_abs_delta'], 4),
+                }
+            return {
+                'primary': self._primary,
+                'versions': sorted(self._models.keys()),
+                'shadows': shadows,
+                'shadow_queue': {'pending': self._pending, 'dropped': self._dropped,
+                                 'max_pending': self.max_pending},
+                'recent': list(self._records)[-recent:] if recent else [],
+            }
@@ -0,0 +1,102 @@
+import os
+import json
+import numpy as np
+from typing import List, Dict
+from dotenv import load_dotenv
+
+from feature_extraction import PredatorDetector
+from graph_embedding import MessageEmbedder, Conversation, GraphBuilder
+
+load_dotenv()
+API_KEY = os.getenv("COHERE_API_KEY")
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mini_predator_model.pt')
+
+
+def _score(conversation_dict: Dict, embeddings: np.ndarray, detector: PredatorDetector,
+           graph_builder: GraphBuilder):
+    conversation = Conversation(conversation_dict, embeddings)
+    graph_builder.build_graph(conversation)
+    result = detector.predict_new(conversation)
+    n_bytes = conversation.get_embeddings().nbytes + conversation.get_similarity_matrix().nbytes
+    return result, n_bytes
+
+
+def float32_verification_report(conversations: List[Dict], embeddings: List[np.ndarray],
+                                model_path: str = MODEL_PATH, tolerance: float = 0.5,
+                                graph_builder: GraphBuilder = None) -> Dict:
+    """
+    Score the same conversations through the float64 and float32 paths.
+
+    Args:
+        conversations: Conversation dicts ('conversation_id', 'user_ids', 'messages').
+        embeddings: float64 message embeddings, one array per conversation.
+        model_path: Saved PredatorDetector state.
+        tolerance: Largest accepted confidence difference, in percentage points.
+
+    Returns:
+        Dict with one row per conversation and a 'summary' of the deltas,
+        label flips and the embedding + similarity bytes of each path.
+    """
+    graph_builder = graph_builder or GraphBuilder()
+    detector_64 = PredatorDetector("dummy.txt", dtype=np.float64)
+    detector_32 = PredatorDetector("dummy.txt", dtype=np.float32)
+    detector_64.load_model(model_path)
+    detector_32.load_model(model_path)
+
+    rows = []
+    bytes_64 = bytes_32 = 0
+    for conversation_dict, emb in zip(conversations, embeddings):
+        emb = np.asarray(emb, dtype=np.float64)
+        result_64, n_64 = _score(conversation_dict, emb, detector_64, graph_builder)
+        result_32, n_32 = _score(conversation_dict, emb.astype(np.float32), detector_32, graph_builder)
+        bytes_64 += n_64
+        bytes_32 += n_32
+        rows.append({
+            'conversation_id': conversation_dict.get('conversation_id'),
+            'confidence_64': result_64['confidence'],
+            'confidence_32': result_32['confidence'],
+            'delta': round(abs(result_64['confidence'] - result_32['confidence']), 4),
+            'label_match': result_64['is_predator'] == result_32['is_predator'],
+        })
+
+    deltas = [row['delta'] for row in rows]
+    max_delta = max(deltas) if deltas else 0.0
+    return {
+        'conversations': rows,
+        'summary': {
+            'n_conversations': len(rows),
+            'tolerance': tolerance,
+            'max_abs_delta': max_delta,
+            'mean_abs_delta': round(float(np.mean(deltas)), 4) if deltas else 0.0,
+            'label_flips': sum(1 for row in rows if not row['label_match']),
+            'within_tolerance': max_delta <= tolerance,
+            'bytes_float64': int(bytes_64),
+            'bytes_float32': int(bytes_32),
+        },
+    }
+
+
+if __name__ == "__main__":
+    sample_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample_sus_data.json')
+    with open(sample_path, 'r', encoding='utf-8') as f:
+        messages = json.load(f)
+
+    # Grow the sample conversation one message at a time to get several cases
+    conversations = [
+        {
+            'conversation_id': f'SAMPLE_{i}',
+            'user_ids': list(set(m['author'] for m in messages[:i])),
+            'messages': messages[:i],
+        }
+        for i in range(2, len(messages) + 1)
+    ]
+
+    if API_KEY:
+        all_embeddings = MessageEmbedder(API_KEY, dtype=np.float64).embed_messages(messages)
+    else:
+        print("WARNING: No API Key found. Using random embeddings.")
+        all_embeddings = np.random.default_rng(42).standard_normal((len(messages), 1536))
+    embeddings = [all_embeddings[:len(c['messages'])] for c in conversations]
+
+    report = float32_verification_report(conversations, embeddings)
+    print(json.dumps(report, indent=2))
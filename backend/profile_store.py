@@ -0,0 +1,121 @@
+import os
+import shelve
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+PROFILE_PATH = os.getenv("APEX_PROFILE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_profiles.db'))
+
+
+class RiskProfileStore:
+    """
+    Persistent per-author risk profiles.
+
+    Each scored conversation folds into the running aggregates of its
+    authors (decayed mean of weighted embeddings, decayed mean / max
+    confidence, keyword totals, conversation count), so a user's current
+    risk is a dict lookup instead of re-scoring their history.
+    Profiles are scoped (e.g. by API key) because author names are not
+    globally unique.
+    """
+
+    def __init__(self, path: str = PROFILE_PATH, decay: float = 0.9):
+        self.path = path
+        self.decay = decay
+        self._lock = threading.Lock()
+        self._db = shelve.open(path)
+        self._profiles: Dict[str, Dict] = dict(self._db.items())
+
+    @staticmethod
+    def _key(scope: str, author: str) -> str:
+        return f"{scope}\x1f{author}"
+
+    def _new_profile(self, scope: str, author: str) -> Dict:
+        return {
+            'scope': scope,
+            'user_id': author,
+            'conversation_count': 0,
+            'decay_weight': 0.0,
+            'mean_vector': None,
+            'mean_confidence': 0.0,
+            'max_confidence': 0.0,
+            'last_confidence': 0.0,
+            'keyword_total': 0,
+            'profile_confidence': 0.0,
+            'profile_is_predator': False,
+            'last_conversation_id': None,
+            'last_seen': None,
+        }
+
+    def update(self, scope: str, conversation, result: Dict, detector, skip_authors=()) -> List[Dict]:
+        """
+        Fold one scored conversation into the profiles of its authors.
+
+        Args:
+            scope: Namespace for the author ids (the API key in the server).
+            conversation: The scored Conversation object.
+            result: The dict returned by PredatorDetector.predict_new.
+            detector: Used for per-author keyword counts and to score the
+                      profile's mean vector.
+            skip_authors: Names that are not real identities (placeholders)
+                          and must not get a profile.
+
+        Returns:
+            The public view of every updated profile.
+        """
+        vec = np.asarray(conversation.get_weighted_embedding(), dtype=np.float32)
+        confidence = float(result.get('confidence', 0.0))
+        now = int(time.time())
+
+        by_author: Dict[str, List[str]] = {}
+        names = conversation.author_names
+        for code, text in zip(conversation.author_codes.tolist(), conversation.texts):
+            if names[code] not in skip_authors:
+                by_author.setdefault(names[code], []).append(text)
+
+        updated = []
+        with self._lock:
+            for author, author_texts in by_author.items():
+                key = self._key(scope, author)
+                profile = self._profiles.get(key) or self._new_profile(scope, author)
+
+                # Exponentially decayed means, bias-corrected by the decayed weight
+                profile['decay_weight'] = self.decay * profile['decay_weight'] + 1.0
+                step = 1.0 / profile['decay_weight']
+                if profile['mean_vector'] is None:
+                    profile['mean_vector'] = vec.copy()
+                else:
+                    profile['mean_vector'] += (vec - profile['mean_vector']) * step
+                profile['mean_confidence'] += (confidence - profile['mean_confidence']) * step
+
+                profile['conversation_count'] += 1
+                profile['max_confidence'] = max(profile['max_confidence'], confidence)
+                profile['last_confidence'] = confidence
+                profile['keyword_total'] += detector.count_risk_keyword_texts(author_texts)
+                profile['last_conversation_id'] = conversation.conversation_id
+                profile['last_seen'] = now
+
+                # Semantic risk of the profile itself (keywords are reported separately)
+                profile_score = detector.score_vector(profile['mean_vector'])
+                profile['profile_confidence'] = float(profile_score['confidence'])
+                profile['profile_is_predator'] = bool(profile_score['is_predator'])
+
+                self._profiles[key] = profile
+                self._db[key] = profile
+                updated.append(self._public(profile))
+            self._db.sync()
+        return updated
+
+    def get(self, scope: str, author: str) -> Optional[Dict]:
+        """Current risk of one author, without recomputation."""
+        profile = self._profiles.get(self._key(scope, author))
+        return None if profile is None else self._public(profile)
+
+    @staticmethod
+    def _public(profile: Dict) -> Dict:
+        return {k: v for k, v in profile.items() if k not in ('mean_vector', 'decay_weight', 'scope')}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
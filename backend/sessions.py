@@ -0,0 +1,312 @@
+import os
+import pickle
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+
+from batch_graph import BatchGraphEngine
+from budgets import EMBED_CHUNK_TIMEOUT, EmbeddingUnavailable
+from graph_embedding import Conversation, GraphBuilder, IncrementalGraph, symmetric_csr
+
+SESSION_TTL_SECONDS = float(os.getenv("APEX_SESSION_TTL", "1800"))
+SESSION_MAX_BYTES = int(os.getenv("APEX_SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+SESSION_SPILL_DIR = os.getenv("APEX_SESSION_SPILL_DIR") or None
+
+
+class LiveSession:
+    """
+    Incrementally scored live conversation.
+
+    Keeps the embeddings, author codes, times, forward top-k graph rows and
+    the last PageRank vector, so each update embeds only the new messages and
+    compares them only with messages inside the edge time horizon. The score
+    matches running the full pipeline on the whole history.
+
+    An update still re-solves PageRank over the whole history, so callers
+    cap the session's total length (InferenceBudget.check_session).
+    """
+
+    def __init__(self, session_id: str, owner: str, graph_builder: GraphBuilder = None):
+        self.session_id = session_id
+        self.owner = owner
+        self.created = time.time()
+        self.last_access = self.created
+        self.graph_builder = graph_builder or GraphBuilder()
+        self.graph = IncrementalGraph(self.graph_builder.max_edges_per_node)
+
+        self.n = 0
+        self.texts: List[str] = []
+        self.raw_times: List[str] = []
+        self.author_index: Dict[str, int] = {}
+        self.author_names: List[str] = []
+        self.text_bytes = 0
+        self.keyword_count = 0
+        self.pagerank = None
+        self.last_result = None
+
+        # Growable column buffers (capacity doubles), allocated on first append
+        self._embeddings = None
+        self._norms = None
+        self._times = np.zeros(0, dtype=np.float64)
+        self._codes = np.zeros(0, dtype=np.int32)
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'text_bytes' not in state:
+            self.text_bytes = sum(len(t.encode('utf-8')) for t in self.texts)
+        self.lock = threading.Lock()
+
+    def _reserve(self, size: int, dim: int, dtype):
+        capacity = len(self._times)
+        if self._embeddings is None:
+            self._embeddings = np.zeros((0, dim), dtype=dtype)
+            self._norms = np.zeros(0, dtype=dtype)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        grow = capacity - len(self._times)
+        self._embeddings = np.vstack([self._embeddings, np.zeros((grow, dim), dtype=self._embeddings.dtype)])
+        self._norms = np.concatenate([self._norms, np.zeros(grow, dtype=self._norms.dtype)])
+        self._times = np.concatenate([self._times, np.zeros(grow)])
+        self._codes = np.concatenate([self._codes, np.zeros(grow, dtype=np.int32)])
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the session (used for the store's budget)."""
+        arrays = [self._times, self._codes, self.graph.top_j, self.graph.top_w, self.graph.counts]
+        if self._embeddings is not None:
+            arrays += [self._embeddings, self._norms]
+        if self.pagerank is not None:
+            arrays.append(self.pagerank)
+        return int(sum(a.nbytes for a in arrays) + sum(len(t) for t in self.texts) + 64 * self.n)
+
+    def append(self, messages: List[Dict], embedder, detector) -> Dict:
+        """
+        Add new messages and return the updated risk score.
+
+        Args:
+            messages: Only the new messages ({'author', 'time', 'text'}).
+            embedder: MessageEmbedder (called once, for the new messages only).
+            detector: Loaded PredatorDetector.
+
+        Raises EmbeddingUnavailable, leaving the session unchanged, unless
+        every new message was embedded: the client can then resend the same
+        delta without duplicating messages.
+        """
+        self.last_access = time.time()
+        if not messages:
+            return self.last_result
+
+        new_embeddings, embedded = embedder.embed_within(messages, chunk_timeout=EMBED_CHUNK_TIMEOUT)
+        if not embedded.all():
+            raise EmbeddingUnavailable(f"{int((~embedded).sum())} of {len(messages)} new messages "
+                                       f"could not be embedded; nothing was added")
+        start = self.n
+        self._reserve(start + len(messages), new_embeddings.shape[1], new_embeddings.dtype)
+        end = start + len(messages)
+
+        self._embeddings[start:end] = new_embeddings
+        self._norms[start:end] = np.linalg.norm(new_embeddings, axis=1)
+        self._times[start:end] = Conversation.parse_times([m['time'] for m in messages])
+        for offset, msg in enumerate(messages):
+            code = self.author_index.get(msg['author'])
+            if code is None:
+                code = self.author_index[msg['author']] = len(self.author_names)
+                self.author_names.append(msg['author'])
+            self._codes[start + offset] = code
+            self.texts.append(msg['text'])
+            self.text_bytes += len(msg['text'].encode('utf-8'))
+            self.raw_times.append(msg['time'])
+            self.keyword_count += detector.count_risk_keywords([msg])
+        self.n = end
+
+        self._extend_graph(start, end)
+        self.pagerank = self._update_pagerank(start)
+
+        vec = (self.pagerank.astype(self._embeddings.dtype) @ self._embeddings[:end]) / self._embeddings.dtype.type(self.pagerank.sum())
+        result = detector.score_vector(vec, self.keyword_count)
+        result['session_id'] = self.session_id
+        result['n_messages'] = self.n
+        self.last_result = result
+        return result
+
+    def _extend_graph(self, start: int, end: int):
+        horizon = self.graph_builder.edge_horizon_seconds() * (1 + 1e-6)
+        for j in range(start, end):
+            if j == 0:
+                self.graph.add_node([], [])
+                continue
+            # Only messages close enough in time (or the one just before) can link to j
+            in_window = np.abs(self._times[:j] - self._times[j]) <= horizon
+            in_window[j - 1] = True
+            candidates = np.nonzero(in_window)[0]
+
+            dots = self._embeddings[candidates] @ self._embeddings[j]
+            denom = self._norms[candidates] * self._norms[j]
+            sims = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+            weights = self.graph_builder.column_weights(sims, self._times, self._codes, candidates, j)
+            self.graph.add_node(candidates, weights)
+
+    def _update_pagerank(self, previous_n: int) -> np.ndarray:
+        src, dst, weights = self.graph.edges()
+        indptr, indices, weights, _ = symmetric_csr(self.n, src, dst, weights, np.zeros(len(src), dtype=bool))
+        start = None
+        if self.pagerank is not None and previous_n > 0:
+            # Warm start: old scores rescaled, new messages at the uniform share
+            start = np.full(self.n, 1.0 / self.n)
+            start[:previous_n] = self.pagerank * (previous_n / self.n)
+        return BatchGraphEngine().pagerank_csr(indptr, indices, weights, start=start)
+
+    def summary(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'n_messages': self.n,
+            'created': int(self.created),
+            'last_access': int(self.last_access),
+            'result': self.last_result,
+        }
+
+
+class SessionStore:
+    """
+    Memory-bounded LRU of live sessions with TTL expiry.
+
+    When the byte budget is exceeded the least recently used sessions are
+    spilled to `spill_dir` (pickled) if one is configured, otherwise dropped.
+    Spilled sessions are loaded back on their next access. Sessions checked
+    out with acquire() are pinned and never spilled, dropped or expired
+    until they are released.
+    """
+
+    def __init__(self, max_bytes: int = SESSION_MAX_BYTES, ttl_seconds: float = SESSION_TTL_SECONDS,
+                 spill_dir: Optional[str] = SESSION_SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._sessions: "OrderedDict[str, LiveSession]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.pkl")
+
+    def _expired(self, session: LiveSession, now: float) -> bool:
+        return now - session.last_access > self.ttl_seconds
+
+    def create(self, owner: str, graph_builder: GraphBuilder = None) -> LiveSession:
+        session = LiveSession(secrets.token_urlsafe(16), owner, graph_builder)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sizes[session.session_id] = session.nbytes()
+            self._evict()
+        return session
+
+    def _lookup(self, session_id: str) -> Optional[LiveSession]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._load_spilled(session_id)
+            if session is None:
+                return None
+            self._sessions[session_id] = session
+            self._sizes[session_id] = session.nbytes()
+        if self._expired(session, time.time()) and not self._pins.get(session_id):
+            self._remove(session_id)
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        """A session for reading; it may be spilled again right after this returns."""
+        with self._lock:
+            session = self._lookup(session_id)
+            self._evict()
+            return session
+
+    @contextmanager
+    def acquire(self, session_id: str):
+        """
+        Check a session out for an update: yields it (or None) pinned in the
+        store and with its lock held, then re-accounts its size on release.
+        """
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is not None:
+                self._pins[session_id] = self._pins.get(session_id, 0) + 1
+        if session is None:
+            yield None
+            return
+        try:
+            with session.lock:
+                yield session
+        finally:
+            with self._lock:
+                pins = self._pins.pop(session_id) - 1
+                if pins:
+                    self._pins[session_id] = pins
+                # Not in the store any more only if it was deleted meanwhile
+                if session_id in self._sessions:
+                    self._sessions.move_to_end(session_id)
+                    self._sizes[session_id] = session.nbytes()
+                self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = session_id in self._sessions
+            self._remove(session_id)
+            if self.spill_dir and os.path.exists(self._spill_path(session_id)):
+                os.remove(self._spill_path(session_id))
+                found = True
+            return found
+
+    def _remove(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._sizes.pop(session_id, None)
+
+    def _load_spilled(self, session_id: str) -> Optional[LiveSession]:
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(session_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                session = pickle.load(f)
+        except Exception:
+            return None
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        return session
+
+    def _evict(self):
+        now = time.time()
+        for session_id in [sid for sid, s in self._sessions.items()
+                           if self._expired(s, now) and not self._pins.get(sid)]:
+            self._remove(session_id)
+
+        total = sum(self._sizes.values())
+        for session_id in list(self._sessions.keys()):
+            if total <= self.max_bytes:
+                break
+            # Never spill a session that is checked out for an update
+            if self._pins.get(session_id):
+                continue
+            if self.spill_dir:
+                tmp = self._spill_path(session_id) + '.tmp'
+                with open(tmp, 'wb') as f:
+                    pickle.dump(self._sessions[session_id], f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self._spill_path(session_id))
+            total -= self._sizes.get(session_id, 0)
+            self._remove(session_id)
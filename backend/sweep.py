@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+import numpy as np
+from dotenv import load_dotenv
+
+from batch_graph import BatchGraphEngine
+from corpus_snapshot import CorpusSnapshot
+from feature_extraction import PredatorDetector
+from graph_embedding import MessageEmbedder, Conversation, GraphBuilder
+from parser import ConversationParser
+
+load_dotenv()
+API_KEY = os.getenv("COHERE_API_KEY")
+
+# GraphBuilder settings that change the graph (min_semantic_score is unused by build_graph)
+GRAPH_PARAMS = ('half_life_seconds', 'max_edges_per_node', 'w_reply', 'w_speaker')
+MODEL_PARAMS = ('n_clusters', 'keyword_weight')
+DEFAULT_GRID = {
+    'half_life_seconds': [120.0, 300.0, 900.0],
+    'max_edges_per_node': [2, 3, 5],
+    'w_reply': [0.2, 0.4],
+    'w_speaker': [0.05, 0.1],
+    'n_clusters': [3, 5, 8],
+    'keyword_weight': [0.0, 0.15, 0.25],
+}
+
+
+def load_embeddings(conversations: List[Dict], embedder, cache_path: str) -> Dict[str, np.ndarray]:
+    """
+    Embeddings per conversation id, embedding only conversations missing
+    from the .npz cache (which is rewritten when anything was added).
+
+    Cached entries whose row count differs from the conversation's or that
+    hold zero-filled rows (failed embed chunks) are embedded again. Raises
+    ValueError if the embeddings do not all share one dimension.
+    """
+    cached: Dict[str, np.ndarray] = {}
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            offsets = data['offsets']
+            all_embeddings = data['embeddings']
+            for i, conv_id in enumerate(data['ids'].tolist()):
+                cached[conv_id] = all_embeddings[offsets[i]:offsets[i + 1]]
+
+    def usable(conv):
+        vectors = cached.get(conv['conversation_id'])
+        return (vectors is not None and len(vectors) == len(conv['messages'])
+                and not np.any(~vectors.any(axis=1)))
+
+    missing = [c for c in conversations if c['messages'] and not usable(c)]
+    for n, conv in enumerate(missing, 1):
+        cached[conv['conversation_id']] = embedder.embed_messages(conv['messages'])
+        if n % 100 == 0:
+            print(f"Embedded {n}/{len(missing)} conversations")
+
+    dims = {np.shape(v)[1] for v in cached.values() if len(v)}
+    if len(dims) > 1:
+        raise ValueError(f"Embedding dimensions differ across conversations ({sorted(dims)}); "
+                         f"delete {cache_path} or embed with the model that wrote it")
+
+    if missing and cache_path:
+        ids = list(cached.keys())
+        dim = dims.pop() if dims else 0
+        arrays = [np.asarray(cached[i]).reshape(len(cached[i]), dim) for i in ids]
+        offsets = np.concatenate([[0], np.cumsum([len(a) for a in arrays])]).astype(np.int64)
+        tmp = cache_path + '.tmp.npz'
+        np.savez(tmp, ids=np.array(ids), offsets=offsets, embeddings=np.concatenate(arrays) if arrays else np.zeros((0, dim)))
+        os.replace(tmp, cache_path)
+    return cached
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """Split the grid into graph configurations, each with its list of cluster settings."""
+    unknown = [k for k in grid if k not in GRAPH_PARAMS and k not in MODEL_PARAMS]
+    if unknown:
+        raise ValueError(f"Unknown grid parameters: {unknown} (graph: {GRAPH_PARAMS}, model: {MODEL_PARAMS})")
+    graph_keys = [k for k in grid if k in GRAPH_PARAMS]
+    model_keys = [k for k in grid if k not in GRAPH_PARAMS]
+    model_settings = [dict(zip(model_keys, values)) for values in itertools.product(*[grid[k] for k in model_keys])]
+    return [
+        {'graph': dict(zip(graph_keys, values)), 'models': model_settings}
+        for values in itertools.product(*[grid[k] for k in graph_keys])
+    ]
+
+
+def _f1_report(predicted: np.ndarray, actual: np.ndarray) -> Dict:
+    tp = int(np.sum(predicted & actual))
+    fp = int(np.sum(predicted & ~actual))
+    fn = int(np.sum(~predicted & actual))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4),
+            'tp': tp, 'fp': fp, 'fn': fn}
+
+
+# Per-worker corpus, set once by _init_worker so configurations don't re-ship it
+_CORPUS = None
+
+
+def _init_worker(corpus):
+    global _CORPUS
+    _CORPUS = corpus
+
+
+def _evaluate_graph_config(config: Dict) -> List[Dict]:
+    """Build graphs with one GraphBuilder setting, then train/score every cluster setting."""
+    conversations, labels, keyword_counts, train_mask = _CORPUS
+    builder = GraphBuilder(**config['graph'])
+
+    start = time.perf_counter()
+    for conv in conversations:
+        builder.build_graph(conv)
+    vectors = BatchGraphEngine().weighted_embeddings(conversations, use_cache=False)
+    graph_seconds = time.perf_counter() - start
+
+    test_idx = np.nonzero(~train_mask)[0]
+    rows = []
+    for model in config['models']:
+        detector = PredatorDetector("dummy.txt",
+                                    n_clusters=model.get('n_clusters', 5),
+                                    keyword_weight=model.get('keyword_weight', 0.15))
+        detector.fit_vectors(vectors[train_mask], labels[train_mask])
+
+        start = time.perf_counter()
+        predicted = np.array([
+            bool(detector.score_vector(vectors[i], int(keyword_counts[i]))['is_predator'])
+            for i in test_idx
+        ], dtype=bool)
+        score_seconds = time.perf_counter() - start
+
+        # Graph + PageRank time is shared by every model, so charge the test share of it
+        per_conv = graph_seconds / max(len(conversations), 1) + score_seconds / max(len(test_idx), 1)
+        row = dict(config['graph'])
+        row.update(model)
+        row.update(_f1_report(predicted, labels[test_idx]))
+        row['conversations_per_second'] = round(1.0 / per_conv, 2) if per_conv > 0 else None
+        rows.append(row)
+    return rows
+
+
+def run_sweep(conversations: List[Dict], embeddings: Dict[str, np.ndarray], predator_ids,
+              grid: Dict[str, List] = None, test_fraction: float = 0.3, workers: int = None,
+              seed: int = 42) -> List[Dict]:
+    """
+    Evaluate every grid point on a fixed train/test split of a labeled corpus.
+
+    Embeddings and similarity matrices are computed once here and shared by
+    every configuration; graph configurations run in parallel processes.
+
+    Returns:
+        One row per configuration with precision/recall/F1 and scoring throughput,
+        sorted by F1.
+    """
+    probe = PredatorDetector("dummy.txt")
+    probe.predator_ids = set(predator_ids)
+
+    convs, labels, keyword_counts = [], [], []
+    for conv_dict in conversations:
+        if not conv_dict['messages']:
+            continue
+        convs.append(Conversation(conv_dict, embeddings[conv_dict['conversation_id']]))
+        labels.append(probe.is_predatory_conversation(conv_dict['user_ids']))
+        keyword_counts.append(probe.count_risk_keywords(conv_dict['messages']))
+    return sweep_conversations(convs, np.array(labels, dtype=bool), np.array(keyword_counts),
+                               grid=grid, test_fraction=test_fraction, workers=workers, seed=seed)
+
+
+def run_snapshot_sweep(snapshot: CorpusSnapshot, grid: Dict[str, List] = None, test_fraction: float = 0.3,
+                       workers: int = None, seed: int = 42) -> List[Dict]:
+    """run_sweep over a corpus snapshot (labels and embeddings already stored)."""
+    convs = list(snapshot.iter_conversations())
+    keyword_counts = snapshot.keyword_counts(PredatorDetector("dummy.txt"))
+    return sweep_conversations(convs, snapshot.labels, keyword_counts,
+                               grid=grid, test_fraction=test_fraction, workers=workers, seed=seed)
+
+
+def sweep_conversations(convs: List[Conversation], labels: np.ndarray, keyword_counts: np.ndarray,
+                        grid: Dict[str, List] = None, test_fraction: float = 0.3, workers: int = None,
+                        seed: int = 42) -> List[Dict]:
+    """The sweep itself, over already built Conversation objects and their labels."""
+    grid = grid or DEFAULT_GRID
+    for conv in convs:
+        conv.get_similarity_matrix()  # cached on the object, reused by every config
+    labels = np.asarray(labels, dtype=bool)
+    train_mask = np.random.default_rng(seed).random(len(convs)) >= test_fraction
+
+    configs = expand_grid(grid)
+    corpus = (convs, labels, np.asarray(keyword_counts), train_mask)
+    print(f"Sweeping {len(configs)} graph configs x {len(configs[0]['models']) if configs else 0} model configs "
+          f"over {len(convs)} conversations ({int(labels.sum())} predatory)")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(corpus,)) as pool:
+        for config_rows in pool.map(_evaluate_graph_config, configs):
+            rows.extend(config_rows)
+    return sorted(rows, key=lambda r: r['f1'], reverse=True)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Hyperparameter sweep over graph and cluster settings")
+    arg_parser.add_argument('--xml', help="PAN12 conversation XML")
+    arg_parser.add_argument('--ground-truth', help="Predator user id list")
+    arg_parser.add_argument('--snapshot', help="Corpus snapshot directory (replaces --xml/--ground-truth/--cache)")
+    arg_parser.add_argument('--cache', default='embedding_cache.npz', help="Embedding cache (.npz)")
+    arg_parser.add_argument('--grid', help="JSON file mapping parameter -> list of values")
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--test-fraction', type=float, default=0.3)
+    arg_parser.add_argument('--output', help="Write the report as JSON")
+    args = arg_parser.parse_args()
+
+    grid = None
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid = json.load(f)
+
+    if args.snapshot:
+        report = run_snapshot_sweep(CorpusSnapshot(args.snapshot), grid=grid,
+                                    test_fraction=args.test_fraction, workers=args.workers)
+    else:
+        if not (args.xml and args.ground_truth):
+            arg_parser.error("--xml and --ground-truth are required without --snapshot")
+        parsed = ConversationParser(args.xml).parse_all_conversations()
+        embeddings = load_embeddings(parsed, MessageEmbedder(API_KEY), args.cache)
+        predator_ids = PredatorDetector(args.ground_truth).predator_ids
+
+        report = run_sweep(parsed, embeddings, predator_ids, grid=grid,
+                           test_fraction=args.test_fraction, workers=args.workers)
+    for row in report[:10]:
+        print(row)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
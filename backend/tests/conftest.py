@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Backend modules import each other flat (e.g. `from graph_embedding import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph_embedding import Conversation  # noqa: E402
+
+
+def make_messages(n, seed=0, authors=('alice', 'bob')):
+    rng = np.random.default_rng(seed)
+    minute = 600
+    messages = []
+    for i in range(n):
+        minute += int(rng.integers(0, 4))
+        messages.append({'author': authors[int(rng.integers(0, len(authors)))],
+                         'time': f'{minute // 60:02d}:{minute % 60:02d}',
+                         'text': f'message {i}'})
+    return messages
+
+
+def make_embeddings(n, dim=16, seed=0, dtype=np.float64):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((4, dim))
+    embeddings = topics[rng.integers(0, 4, n)] + 0.3 * rng.standard_normal((n, dim))
+    if n > 3:
+        embeddings[3] = embeddings[1]  # exact duplicates give tied edge weights
+    return embeddings.astype(dtype)
+
+
+@pytest.fixture
+def make_conversation():
+    def _make(n, dim=16, seed=0, dtype=np.float64):
+        messages = make_messages(n, seed)
+        data = {'conversation_id': f'conv-{seed}', 'user_ids': sorted({m['author'] for m in messages}),
+                'messages': messages}
+        return Conversation(data, make_embeddings(n, dim, seed, dtype))
+    return _make
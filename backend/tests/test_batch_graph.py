@@ -0,0 +1,41 @@
+import networkx as nx
+import numpy as np
+
+from batch_graph import BatchGraphEngine
+from graph_embedding import GraphBuilder
+
+
+def test_batched_pagerank_matches_networkx(make_conversation):
+    conversations = [make_conversation(n, seed=s) for s, n in enumerate((1, 2, 17, 45, 80))]
+    for conversation in conversations:
+        GraphBuilder().build_graph(conversation)
+
+    for conversation, scores in zip(conversations, BatchGraphEngine().pagerank(conversations)):
+        expected = nx.pagerank(conversation.to_networkx(), weight='weight', alpha=0.85)
+        np.testing.assert_allclose(scores, [expected[i] for i in range(conversation.n_messages)], atol=1e-5)
+
+
+def test_batched_vectors_match_get_weighted_embedding(make_conversation):
+    conversations = [make_conversation(n, seed=s) for s, n in enumerate((3, 30, 64))]
+    for conversation in conversations:
+        GraphBuilder().build_graph(conversation)
+    expected = [c.get_weighted_embedding().copy() for c in conversations]
+    vectors = BatchGraphEngine(batch_size=2).weighted_embeddings(conversations, use_cache=False)
+    np.testing.assert_allclose(vectors, np.vstack(expected), atol=1e-5)
+
+
+def test_prefix_vectors_match_rebuilt_prefixes(make_conversation):
+    from trajectory import prefix_conversations
+
+    conversation = make_conversation(40, seed=3)
+    graph_builder = GraphBuilder()
+    expected = []
+    for p in range(1, conversation.n_messages + 1):
+        prefix = conversation.prefix(p)
+        graph_builder.build_graph(prefix)
+        expected.append(prefix.get_weighted_embedding().copy())
+
+    vectors = BatchGraphEngine().prefix_weighted_embeddings(
+        prefix_conversations(conversation, graph_builder), conversation.embeddings, max_nodes=50)
+    assert vectors.shape == conversation.embeddings.shape
+    np.testing.assert_allclose(vectors, np.vstack(expected), atol=1e-5)
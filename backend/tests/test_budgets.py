@@ -0,0 +1,68 @@
+from budgets import InferenceBudget, estimate_graph_bytes
+
+
+def _messages(n, text='hello'):
+    return [{'author': 'a', 'time': '10:00', 'text': f'{text} {i}'} for i in range(n)]
+
+
+def test_small_conversation_is_scored_in_full():
+    messages = _messages(10)
+    kept, execution = InferenceBudget().plan(messages)
+    assert kept is messages
+    assert execution['strategy'] == 'full' and execution['window'] is None
+    assert execution['messages_scored'] == execution['messages_received'] == 10
+
+
+def test_truncate_keeps_most_recent_messages_within_both_budgets():
+    messages = _messages(50)
+    kept, execution = InferenceBudget(max_messages=20).plan(messages)
+    assert kept == messages[-20:] and execution['strategy'] == 'truncated'
+
+    size = len('hello 10'.encode('utf-8'))
+    kept, _ = InferenceBudget(max_text_bytes=5 * size).plan(messages)
+    assert kept == messages[-5:]
+
+    # The latest message is kept even if it alone is over the byte budget
+    kept, _ = InferenceBudget(max_text_bytes=1).plan(messages)
+    assert kept == messages[-1:]
+
+
+def test_sample_is_evenly_spaced_and_keeps_first_and_last():
+    messages = _messages(101)
+    kept, execution = InferenceBudget(max_messages=11, reduce_strategy='sample').plan(messages)
+    assert execution['strategy'] == 'sampled'
+    assert [int(m['text'].split()[1]) for m in kept] == list(range(0, 101, 10))
+
+    # Text over budget lowers the sample size in proportion
+    total = sum(len(m['text'].encode('utf-8')) for m in messages)
+    kept, _ = InferenceBudget(max_text_bytes=total // 4, reduce_strategy='sample').plan(messages)
+    assert kept[0] is messages[0] and kept[-1] is messages[-1]
+    assert sum(len(m['text'].encode('utf-8')) for m in kept) <= total // 4
+    assert 20 <= len(kept) <= 26
+
+
+def test_oversized_matrices_are_windowed():
+    per_pair = estimate_graph_bytes(1)
+    budget = InferenceBudget(max_messages=10_000, max_matrix_bytes=2 * 50 * 50 * per_pair, window=256)
+    kept, execution = budget.plan(_messages(400))
+    assert len(kept) == 400 and execution['strategy'] == 'windowed'
+    assert execution['window'] == 50
+    assert execution['estimated_matrix_bytes'] <= budget.max_matrix_bytes
+
+    kept, execution = InferenceBudget(max_messages=100, max_matrix_bytes=50 * 50 * per_pair).plan(_messages(400))
+    assert len(kept) == 100 and execution['strategy'] == 'truncated+windowed'
+
+
+def test_hard_limits_reject_requests():
+    budget = InferenceBudget(hard_max_messages=5, hard_max_text_bytes=100)
+    assert budget.check_hard_limits(_messages(5)) is None
+    assert 'Too many messages' in budget.check_hard_limits(_messages(6))
+    assert 'too large' in budget.check_hard_limits([{'text': 'x' * 101}])
+
+
+def test_session_limits_count_the_whole_history():
+    budget = InferenceBudget(max_messages=10, max_text_bytes=100)
+    assert budget.check_session(8, 50, _messages(2)) is None
+    assert 'Session too long: 11' in budget.check_session(8, 50, _messages(3))
+    assert 'Session text too large' in budget.check_session(2, 95, _messages(1))
+    assert 'Too many messages' in InferenceBudget(hard_max_messages=1).check_session(0, 0, _messages(2))
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import make_embeddings, make_messages
+from corpus_snapshot import CorpusSnapshot, build_snapshot
+
+
+def _write_corpus(tmp_path, sizes):
+    conversations = {f'c{i}': make_messages(n, seed=i, authors=(f'a{i}', f'b{i}')) for i, n in enumerate(sizes)}
+    parts = ['<conversations>']
+    for conv_id, messages in conversations.items():
+        parts.append(f'<conversation id="{conv_id}">')
+        for line, msg in enumerate(messages, 1):
+            parts.append(f'<message line="{line}"><author>{msg["author"]}</author>'
+                         f'<time>{msg["time"]}</time><text>{msg["text"]} é</text></message>')
+        parts.append('</conversation>')
+    parts.append('</conversations>')
+    xml = tmp_path / 'corpus.xml'
+    xml.write_text(''.join(parts), encoding='utf-8')
+    truth = tmp_path / 'predators.txt'
+    truth.write_text('a1\n')
+    return str(xml), str(truth), conversations
+
+
+def _write_cache(path, embeddings):
+    ids = list(embeddings)
+    offsets = np.concatenate([[0], np.cumsum([len(embeddings[i]) for i in ids])])
+    np.savez(path, ids=np.array(ids), offsets=offsets, embeddings=np.concatenate([embeddings[i] for i in ids]))
+
+
+def test_snapshot_round_trip(tmp_path):
+    xml, truth, conversations = _write_corpus(tmp_path, (4, 7, 3))
+    embeddings = {conv_id: make_embeddings(len(m), seed=i) for i, (conv_id, m) in enumerate(conversations.items())}
+    cache = str(tmp_path / 'cache.npz')
+    _write_cache(cache, embeddings)
+
+    header = build_snapshot(xml, truth, str(tmp_path / 'snap'), embeddings_cache=cache)
+    assert header['n_conversations'] == 3 and header['n_messages'] == 14 and header['has_embeddings']
+
+    snapshot = CorpusSnapshot(str(tmp_path / 'snap'))
+    assert snapshot.labels.tolist() == [False, True, False]
+    for i, conv in enumerate(snapshot.iter_conversations(dtype=np.float64)):
+        messages = conversations[conv.conversation_id]
+        assert conv.texts == [f'{m["text"]} é' for m in messages]
+        assert sorted(conv.user_ids) == sorted({m['author'] for m in messages})
+        np.testing.assert_allclose(conv.embeddings, embeddings[conv.conversation_id], rtol=1e-6)
+
+
+def test_failed_rebuild_keeps_previous_snapshot(tmp_path):
+    xml, truth, conversations = _write_corpus(tmp_path, (4, 7))
+    cache = str(tmp_path / 'cache.npz')
+    _write_cache(cache, {conv_id: make_embeddings(len(m), seed=i)
+                         for i, (conv_id, m) in enumerate(conversations.items())})
+    build_snapshot(xml, truth, str(tmp_path / 'snap'), embeddings_cache=cache)
+    before = json.loads((tmp_path / 'snap' / 'header.json').read_text())
+
+    xml, truth, _ = _write_corpus(tmp_path, (4, 7, 5))  # c2 is not in the cache
+    with pytest.raises(ValueError, match='c2'):
+        build_snapshot(xml, truth, str(tmp_path / 'snap'), embeddings_cache=cache)
+
+    assert json.loads((tmp_path / 'snap' / 'header.json').read_text()) == before
+    assert len(CorpusSnapshot(str(tmp_path / 'snap'))) == 2
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.startswith('.snapshot')) == []
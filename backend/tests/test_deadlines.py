@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+import algorithm
+from budgets import Deadline
+from embed_stub import StubEmbedClient
+from graph_embedding import GraphBuilder, MessageEmbedder
+
+
+CHAT = [
+    {"author": "a", "time": "10:00", "text": "hey, how old are you?"},
+    {"author": "b", "time": "10:01", "text": "why"},
+    {"author": "a", "time": "10:02", "text": "send a pic, keep it secret"},
+]
+
+
+class RecordingClient(StubEmbedClient):
+    def __init__(self, **kwargs):
+        super().__init__(latency_ms=0, jitter_ms=0, seed=0, **kwargs)
+        self.request_options = []
+
+    def embed(self, inputs, model=None, input_type=None, embedding_types=None, request_options=None):
+        self.request_options.append(request_options)
+        return super().embed(inputs, model, input_type, embedding_types, request_options)
+
+
+@pytest.fixture
+def use_client(monkeypatch):
+    def _use(client):
+        monkeypatch.setattr(algorithm, 'get_embedder', lambda: MessageEmbedder(None, client=client))
+    return _use
+
+
+def test_chunk_timeout_applies_without_deadline():
+    client = RecordingClient(dim=8)
+    embedder = MessageEmbedder(None, client=client)
+    embedder.embed_within(CHAT, deadline=Deadline(None), chunk_timeout=2.5)
+    embedder.embed_within(CHAT, chunk_timeout=2.5)
+    assert client.request_options == [{'timeout_in_seconds': 2.5}, {'timeout_in_seconds': 2.5}]
+
+
+def test_no_embeddings_gives_undetermined_result(use_client):
+    use_client(StubEmbedClient(latency_ms=0, jitter_ms=0, error_rate=1.0, seed=0))
+
+    class Store:
+        def update(self, *args, **kwargs):
+            raise AssertionError("profiles must not be updated")
+
+        add = update
+
+    result = algorithm.runInference(list(CHAT), profile_store=Store(), scope='key', vector_store=Store(),
+                                    deadline=Deadline(5.0))
+    assert result['is_predator'] is None and result['undetermined']
+    assert result['confidence'] is None and result['risk_keywords'] == 2
+    assert result['execution']['path'] == 'keywords_only'
+    assert result['execution']['skipped'] == ['profiles', 'vector_store']
+
+
+def test_deadline_shorter_than_reserve_still_embeds(use_client):
+    use_client(StubEmbedClient(latency_ms=0, jitter_ms=0, seed=0))
+    result = algorithm.runInference(list(CHAT), deadline=Deadline(0.05))
+    assert result['execution']['path'] == 'full'
+    assert isinstance(result['is_predator'], bool)
+
+
+def test_deadline_graph_blocks_match_build_graph(make_conversation):
+    full, blocked = make_conversation(70, seed=2), make_conversation(70, seed=2)
+    GraphBuilder().build_graph(full)
+    assert GraphBuilder().build_graph_windowed(blocked, blocked.n_messages, Deadline(60.0), block_rows=16)
+    for name in ('indptr', 'indices', 'edge_weights', 'edge_is_reply'):
+        np.testing.assert_allclose(getattr(blocked, name), getattr(full, name), atol=1e-6)
+
+
+def test_expired_deadline_keeps_latest_graph_blocks(make_conversation):
+    conversation = make_conversation(70, seed=2)
+
+    class OneBlock:
+        calls = 0
+
+        def expired(self):
+            self.calls += 1
+            return self.calls > 1
+
+    assert not GraphBuilder().build_graph_windowed(conversation, conversation.n_messages, OneBlock(), block_rows=16)
+    src = np.repeat(np.arange(conversation.n_messages), np.diff(conversation.indptr))
+    assert len(src) and min(src.min(), conversation.indices.min()) >= 64
+
+
+def test_short_deadline_is_enforced_against_slow_embeddings(use_client):
+    use_client(StubEmbedClient(latency_ms=800, jitter_ms=0, seed=0))
+    deadline = Deadline.from_ms(150)
+    result = algorithm.runInference(list(CHAT), deadline=deadline)
+    assert deadline.elapsed_ms() < 500
+    assert result['execution']['path'] == 'keywords_only'
+    assert result['execution']['deadline_exceeded'] is False
+
+
+def test_online_paths_reject_unembeddable_conversations(use_client):
+    from budgets import EmbeddingUnavailable
+
+    use_client(StubEmbedClient(latency_ms=0, jitter_ms=0, error_rate=1.0, seed=0))
+    with pytest.raises(EmbeddingUnavailable):
+        algorithm.runSimilar(list(CHAT), vector_store=None, scope='key')
+
+
+def test_trajectory_reports_partial_embeddings(use_client):
+    class FirstChunkFails(StubEmbedClient):
+        def embed(self, inputs, **kwargs):
+            if len(inputs) == 96:
+                raise RuntimeError("Stub embed error")
+            return super().embed(inputs, **kwargs)
+
+    use_client(FirstChunkFails(latency_ms=0, jitter_ms=0, seed=0))
+    chat = [dict(CHAT[i % 3], time=f'10:{i % 60:02d}') for i in range(100)]
+    result = algorithm.runTrajectory(chat)
+    assert result['execution']['path'] == 'partial_embeddings'
+    assert result['execution']['messages_embedded'] == 4 and len(result['steps']) == 4
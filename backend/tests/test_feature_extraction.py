@@ -0,0 +1,28 @@
+import numpy as np
+
+from feature_extraction import PredatorDetector
+
+
+def fitted_detector(dtype):
+    rng = np.random.default_rng(0)
+    predator = rng.standard_normal(32) * 3
+    vectors = np.vstack([predator + rng.standard_normal((40, 32)), rng.standard_normal((60, 32))])
+    labels = np.arange(100) < 40
+    detector = PredatorDetector("missing.txt", n_clusters=3, dtype=dtype)
+    detector.fit_vectors(vectors, labels)
+    return detector, vectors
+
+
+def test_float32_scores_match_float64():
+    detector64, vectors = fitted_detector(np.float64)
+    detector32, _ = fitted_detector(np.float32)
+    for vec, risk in zip(vectors[::7], range(15)):
+        r64 = detector64.score_vector(vec, risk % 3)
+        r32 = detector32.score_vector(vec.astype(np.float32), risk % 3)
+        assert r32['is_predator'] == r64['is_predator']
+        assert abs(r32['confidence'] - r64['confidence']) < 0.05
+
+
+def test_keyword_count_ignores_substrings():
+    detector = PredatorDetector("missing.txt")
+    assert detector.count_risk_keyword_texts(["see this page", "send a pic", "what is your AGE?"]) == 2
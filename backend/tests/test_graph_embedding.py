@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from graph_embedding import Conversation, GraphBuilder, top_k_per_row
+
+
+def dense_reference_graph(builder, conversation):
+    """The original dict-of-lists build_graph loop, edge by edge."""
+    n = conversation.n_messages
+    times = conversation.message_times
+    graph = {i: [] for i in range(n)}
+    for i in range(n):
+        potential = []
+        for j in range(i + 1, n):
+            weight, attrs = builder.calculate_edge_weight(conversation, i, j, times)
+            if weight > 0.2:
+                potential.append((j, weight, attrs))
+        potential.sort(key=lambda x: x[1], reverse=True)
+        for j, weight, attrs in potential[:builder.max_edges_per_node]:
+            graph[i].append((j, weight, attrs))
+            graph[j].append((i, weight, attrs))
+    return graph
+
+
+def assert_same_graph(actual, expected):
+    assert actual.keys() == expected.keys()
+    for i in expected:
+        assert [j for j, _, _ in actual[i]] == [j for j, _, _ in expected[i]], i
+        np.testing.assert_allclose([w for _, w, _ in actual[i]], [w for _, w, _ in expected[i]])
+        assert [a['is_reply'] for _, _, a in actual[i]] == [bool(a['is_reply']) for _, _, a in expected[i]]
+
+
+@pytest.mark.parametrize('n,k', [(1, 3), (2, 3), (40, 3), (120, 5)])
+def test_csr_graph_matches_dense_reference(make_conversation, n, k):
+    conversation = make_conversation(n)
+    builder = GraphBuilder(max_edges_per_node=k)
+    builder.build_graph(conversation)
+    assert_same_graph(conversation.graph, dense_reference_graph(builder, conversation))
+
+
+def test_windowed_graph_matches_full_when_window_covers_conversation(make_conversation):
+    full, windowed = make_conversation(60), make_conversation(60)
+    builder = GraphBuilder()
+    builder.build_graph(full)
+    assert builder.build_graph_windowed(windowed, window=60)
+    assert_same_graph(windowed.graph, full.graph)
+
+
+def test_top_k_per_row_matches_stable_argsort():
+    rng = np.random.default_rng(1)
+    values = rng.integers(0, 5, (300, 37)).astype(np.float64)  # many ties
+    values[rng.random(values.shape) < 0.3] = -np.inf
+    for k in (1, 3, 37, 50):
+        expected = np.argsort(-values, axis=1, kind='stable')[:, :k]
+        np.testing.assert_array_equal(top_k_per_row(values, k, block_rows=64), expected)
+
+
+def test_parse_times_matches_parse_time():
+    times = ['10:30', '23:59:59', '-1:30', '+1:30', ' 2:05:07 ', '--1:30', '1:-5',
+             'a:b', '', '1:2:3:4', '7', '12:00:x', '1: 3', None]
+    expected = [Conversation.parse_time(t) if isinstance(t, str) else 0.0 for t in times]
+    np.testing.assert_array_equal(Conversation.parse_times(times), expected)
+
+
+def test_columnar_accessors_round_trip(make_conversation):
+    conversation = make_conversation(30)
+    GraphBuilder().build_graph(conversation)
+    rebuilt = Conversation(conversation.data, conversation.embeddings)
+    rebuilt.graph = conversation.graph
+    np.testing.assert_array_equal(rebuilt.indptr, conversation.indptr)
+    np.testing.assert_array_equal(rebuilt.indices, conversation.indices)
+    report = conversation.memory_report()
+    assert report['n_messages'] == 30 and report['columnar_bytes'] < report['legacy_bytes']
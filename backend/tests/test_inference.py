@@ -0,0 +1,38 @@
+import pytest
+
+import algorithm
+from embed_stub import StubEmbedClient
+from graph_embedding import MessageEmbedder
+from profile_store import RiskProfileStore
+
+
+@pytest.fixture(autouse=True)
+def stub_embedder(monkeypatch):
+    monkeypatch.setattr(algorithm, 'get_embedder',
+                        lambda: MessageEmbedder(None, client=StubEmbedClient(latency_ms=0, jitter_ms=0, seed=0)))
+
+
+CHAT = [
+    {"author": "SuspiciousPerson", "time": "23:30", "text": "Hey there, how are you?"},
+    {"author": "TeenUser", "time": "23:32", "text": "Who is this?"},
+    {"author": "user_2", "time": "23:33", "text": "Just a friend. How old are you?", "author_synthesized": True},
+    {"author": "TeenUser", "time": "23:34", "text": "Thanks, I guess?"},
+]
+
+
+def test_profiles_skip_placeholder_authors(tmp_path):
+    store = RiskProfileStore(str(tmp_path / 'profiles.db'))
+    result = algorithm.runInference(list(CHAT), profile_store=store, scope='key')
+    assert sorted(p['user_id'] for p in result['profiles']) == ['SuspiciousPerson', 'TeenUser']
+    assert store.get('key', 'user_2') is None
+    store.close()
+
+
+def test_profile_store_failure_does_not_fail_inference():
+    class BrokenStore:
+        def update(self, *args, **kwargs):
+            raise OSError("disk full")
+
+    result = algorithm.runInference(list(CHAT), profile_store=BrokenStore(), scope='key')
+    assert 'confidence' in result and result['profiles'] == []
+    assert result['profiles_error'] == 'disk full'
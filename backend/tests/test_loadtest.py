@@ -0,0 +1,40 @@
+import threading
+import time
+
+from loadtest import LoadTest, synthetic_conversations
+
+
+class ColdStartTransport:
+    """Fake API whose first inference in the process is slow, like a model load."""
+    lock = threading.Lock()
+
+    def __init__(self, state):
+        self.state = state
+
+    def request(self, method, path, body=None, headers=None):
+        if path == '/api/generate_key':
+            return 200, {'key': 'k'}
+        if path == '/api/run_inference':
+            with self.lock:
+                cold, self.state['loaded'] = not self.state['loaded'], True
+            time.sleep(0.2 if cold else 0.001)
+            return 201, {'entry': {'result': {'execution': {'path': 'full'}}}}
+        return 200, {'results': []}
+
+
+def test_warmup_requests_are_not_sampled():
+    state = {'loaded': False}
+    test = LoadTest(lambda: ColdStartTransport(state), synthetic_conversations(3), concurrency=2,
+                    requests=10, results_every=0, warmup=1)
+    report = test.run()
+    inference = report['endpoints']['run_inference']
+    assert inference['requests'] == 10
+    assert inference['max_ms'] < 100
+    assert report['inference_paths'] == {'full': 10}
+
+
+def test_without_warmup_cold_start_is_sampled():
+    state = {'loaded': False}
+    report = LoadTest(lambda: ColdStartTransport(state), synthetic_conversations(3), concurrency=1,
+                      requests=5, results_every=0, warmup=0).run()
+    assert report['endpoints']['run_inference']['max_ms'] >= 150
@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+
+from feature_extraction import PredatorDetector
+from graph_embedding import GraphBuilder
+from model_registry import ModelRegistry
+
+
+def _detector(seed):
+    rng = np.random.default_rng(seed)
+    detector = PredatorDetector('missing_ground_truth.txt', n_clusters=2)
+    detector.fit_vectors(rng.standard_normal((12, 16)), [True] * 4 + [False] * 8)
+    return detector
+
+
+def _wait_for_shadows(registry):
+    # The shadow executor has one thread, so this runs after every queued job
+    registry._executor.submit(lambda: None).result()
+
+
+def test_shadow_scores_are_recorded_with_disagreement_stats(make_conversation, tmp_path):
+    registry = ModelRegistry(shadow_log_path=str(tmp_path / 'shadow.jsonl'))
+    registry.register('v1', _detector(0), primary=True)
+    shadow = registry.register('v2', _detector(1), shadow=True)
+
+    conversations = [make_conversation(12, seed=s) for s in range(3)]
+    results = []
+    for conversation in conversations:
+        GraphBuilder().build_graph(conversation)
+        results.append(registry.score(conversation))
+    _wait_for_shadows(registry)
+
+    assert all(r['model_version'] == 'v1' for r in results)
+    report = registry.report()
+    stats = report['shadows']['v2']
+    expected = [shadow.predict_new(c) for c in conversations]
+    disagreements = sum(bool(e['is_predator']) != bool(r['is_predator']) for e, r in zip(expected, results))
+    assert stats['scored'] == 3 and stats['disagreements'] == disagreements
+    assert [r['shadow_confidence'] for r in report['recent']] == [e['confidence'] for e in expected]
+    assert report['shadow_queue'] == {'pending': 0, 'dropped': 0, 'max_pending': registry.max_pending}
+    assert len((tmp_path / 'shadow.jsonl').read_text().splitlines()) == 3
+
+
+def test_shadow_jobs_past_the_limit_are_dropped(make_conversation):
+    registry = ModelRegistry(shadow_log_path=None, max_pending=1)
+    registry.register('v1', _detector(0), primary=True)
+    registry.register('v2', _detector(1), shadow=True)
+    conversation = make_conversation(12)
+    GraphBuilder().build_graph(conversation)
+
+    release = threading.Event()
+    registry._executor.submit(release.wait)  # keep the shadow thread busy
+    for _ in range(3):
+        registry.score(conversation)
+    assert registry.report()['shadow_queue']['dropped'] == 2
+    release.set()
+    _wait_for_shadows(registry)
+    assert registry.report()['shadows']['v2']['scored'] == 1
+    assert registry.report()['shadow_queue']['pending'] == 0
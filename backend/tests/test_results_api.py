@@ -0,0 +1,65 @@
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, 'STORE_PATH', str(tmp_path / 'data_store.json'))
+    monkeypatch.setattr(app_module, 'DATA_STORE', {})
+    monkeypatch.setattr(app_module, 'UNSORTED_KEYS', set())
+    return app_module.app.test_client()
+
+
+def _page(client, key, **query):
+    resp = client.get('/api/results', query_string=query, headers={'Authorization': f'Bearer {key}'})
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_cursor_pages_cover_every_result_and_resume_after_appends(client):
+    app_module.DATA_STORE['key'] = [{'result': i, 'ts': 100 + i // 3} for i in range(25)]
+
+    seen, cursor = [], None
+    while True:
+        page = _page(client, 'key', limit=10, **({} if cursor is None else {'cursor': cursor}))
+        seen += [e['result'] for e in page['results']]
+        cursor = page['next_cursor']
+        if not page['has_more']:
+            break
+    assert seen == list(range(25)) and cursor == '25'
+
+    app_module.DATA_STORE['key'].append({'result': 25, 'ts': 200})
+    assert [e['result'] for e in _page(client, 'key', cursor=cursor)['results']] == [25]
+
+
+def test_since_until_on_sorted_results(client):
+    app_module.DATA_STORE['key'] = [{'result': i, 'ts': 100 + i // 3} for i in range(25)]
+    page = _page(client, 'key', since=102, until=104)
+    assert [e['result'] for e in page['results']] == list(range(6, 15))
+    assert not page['has_more']
+
+
+def test_unsorted_legacy_results_are_scanned(client):
+    entries = [{'result': 0}, {'result': 1, 'ts': 300}, {'result': 2, 'ts': 100},
+               {'result': 3, 'ts': 200}, {'result': 4, 'ts': 150}]
+    app_module.DATA_STORE['key'] = entries
+    app_module.UNSORTED_KEYS.add('key')
+    assert not app_module._ts_sorted(entries)
+
+    page = _page(client, 'key', since=120, until=250)
+    assert [e['result'] for e in page['results']] == [3, 4]
+    assert [e['result'] for e in _page(client, 'key', until=150)['results']] == [0, 2, 4]
+
+
+def test_results_are_stamped_in_append_order(client, monkeypatch):
+    import algorithm
+
+    app_module.DATA_STORE['key'] = [{'result': 'later', 'ts': 2_000_000_000}]
+    monkeypatch.setattr(algorithm, 'runInference', lambda *args, **kwargs: {'confidence': 1.0})
+    monkeypatch.setattr(app_module, 'get_profile_store', lambda: None)
+    monkeypatch.setattr(app_module, 'get_vector_store', lambda: None)
+    resp = client.post('/api/run_inference', json={'messages': [{'author': 'a', 'text': 'hi'}]},
+                       headers={'Authorization': 'Bearer key'})
+    assert resp.status_code == 201
+    assert app_module._ts_sorted(app_module.DATA_STORE['key'])
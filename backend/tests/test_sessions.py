@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+
+from conftest import make_messages
+from embed_stub import StubEmbedClient
+from feature_extraction import PredatorDetector
+from graph_embedding import Conversation, GraphBuilder, MessageEmbedder
+from sessions import LiveSession, SessionStore
+
+
+def _detector():
+    rng = np.random.default_rng(0)
+    detector = PredatorDetector('missing_ground_truth.txt', n_clusters=2)
+    detector.fit_vectors(rng.standard_normal((12, 32)), [True] * 4 + [False] * 8)
+    return detector
+
+
+def _embedder():
+    return MessageEmbedder(None, dtype=np.float64,
+                           client=StubEmbedClient(latency_ms=0, jitter_ms=0, dim=32, seed=0))
+
+
+def test_session_appends_match_full_rerun():
+    detector, embedder = _detector(), _embedder()
+    messages = make_messages(30, seed=4)
+    session = LiveSession('s', 'key')
+    for start, end in ((0, 1), (1, 12), (12, 13), (13, 30)):
+        result = session.append(messages[start:end], embedder, detector)
+
+    conversation = Conversation({'conversation_id': 'full', 'user_ids': ['alice', 'bob'], 'messages': messages},
+                                embedder.embed_messages(messages))
+    GraphBuilder().build_graph(conversation)
+    expected = detector.predict_new(conversation)
+    assert result['n_messages'] == 30
+    assert result['confidence'] == expected['confidence']
+    assert result['risk_keywords'] == expected['risk_keywords']
+
+
+def test_acquired_session_is_not_evicted_and_keeps_updates(tmp_path):
+    store = SessionStore(max_bytes=1, spill_dir=str(tmp_path))
+    session_id = store.create('key').session_id
+    detector, embedder = _detector(), _embedder()
+
+    with store.acquire(session_id) as held:
+        assert held.lock.locked()
+        store.create('other')  # over budget: only unpinned sessions may be spilled
+        held.append(make_messages(5), embedder, detector)
+        assert session_id in store._sessions
+
+    # Released over budget: even the only session left is spilled, with its update
+    assert session_id not in store._sessions
+    with store.acquire(session_id) as reloaded:
+        assert reloaded is not held and reloaded.n == 5
+
+
+def test_concurrent_appends_number_messages_consecutively():
+    store = SessionStore()
+    session = store.create('key')
+    detector, embedder = _detector(), _embedder()
+    messages = make_messages(40, seed=1)
+
+    def worker(chunk):
+        with store.acquire(session.session_id) as held:
+            held.append(chunk, embedder, detector)
+
+    threads = [threading.Thread(target=worker, args=(messages[i:i + 5],)) for i in range(0, 40, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.get(session.session_id).n == 40
+
+
+def test_failed_embeddings_leave_the_session_unchanged():
+    import pytest
+    from budgets import EmbeddingUnavailable
+
+    detector, messages = _detector(), make_messages(8, seed=5)
+    session = LiveSession('s', 'key')
+    first = session.append(messages[:4], _embedder(), detector)
+
+    failing = MessageEmbedder(None, dtype=np.float64,
+                              client=StubEmbedClient(latency_ms=0, jitter_ms=0, error_rate=1.0, dim=32, seed=0))
+    with pytest.raises(EmbeddingUnavailable):
+        session.append(messages[4:], failing, detector)
+    assert session.n == 4 and len(session.texts) == 4 and session.last_result is first
+
+    # The same delta can be resent; the result matches a session that never failed
+    retried = session.append(messages[4:], _embedder(), detector)
+    clean = LiveSession('c', 'key')
+    clean.append(messages[:4], _embedder(), detector)
+    assert retried['confidence'] == clean.append(messages[4:], _embedder(), detector)['confidence']
+    assert session._embeddings[:8].any(axis=1).all()
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from conftest import make_messages
+from sweep import DEFAULT_GRID, expand_grid, load_embeddings
+
+
+class CountingEmbedder:
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def embed_messages(self, messages):
+        self.calls.append(len(messages))
+        return np.ones((len(messages), self.dim))
+
+
+def _conversations():
+    return [{'conversation_id': f'c{i}', 'messages': make_messages(n, seed=i)} for i, n in enumerate((3, 4, 5))]
+
+
+def test_cache_reused_and_bad_entries_reembedded(tmp_path):
+    cache = str(tmp_path / 'emb.npz')
+    conversations = _conversations()
+    load_embeddings(conversations, CountingEmbedder(), cache)
+
+    embedder = CountingEmbedder()
+    assert [len(v) for v in load_embeddings(conversations, embedder, cache).values()] == [3, 4, 5]
+    assert embedder.calls == []
+
+    # One conversation grew, another has a zero-filled (failed) row
+    with np.load(cache) as data:
+        ids, offsets, embeddings = data['ids'], data['offsets'], data['embeddings'].copy()
+    embeddings[offsets[2]] = 0
+    np.savez(cache, ids=ids, offsets=offsets, embeddings=embeddings)
+    conversations[0]['messages'] = make_messages(6, seed=0)
+    embedder = CountingEmbedder()
+    loaded = load_embeddings(conversations, embedder, cache)
+    assert sorted(embedder.calls) == [5, 6]
+    assert all(v.all() for v in loaded.values())
+
+
+def test_dimension_mismatch_raises(tmp_path):
+    cache = str(tmp_path / 'emb.npz')
+    conversations = _conversations()
+    load_embeddings(conversations[:2], CountingEmbedder(dim=8), cache)
+    with pytest.raises(ValueError, match='dimensions differ'):
+        load_embeddings(conversations, CountingEmbedder(dim=16), cache)
+
+
+def test_grid_rejects_parameters_the_sweep_ignores():
+    assert len(expand_grid(DEFAULT_GRID)) == 3 * 3 * 2 * 2
+    with pytest.raises(ValueError, match='min_semantic_score'):
+        expand_grid(dict(DEFAULT_GRID, min_semantic_score=[0.5, 0.6]))
@@ -0,0 +1,33 @@
+import numpy as np
+
+from vector_store import VectorStore
+
+
+def _clustered(n, dim, seed=0, noise=0.8):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((40, dim))
+    return centers[rng.integers(0, 40, n)] + noise * rng.standard_normal((n, dim))
+
+
+def test_exact_search_finds_stored_vectors_by_scope(tmp_path):
+    store = VectorStore(str(tmp_path))
+    vectors = _clustered(50, 32)
+    for i, vec in enumerate(vectors):
+        store.add(vec, 'a' if i % 2 else 'b', ts=i, confidence=0.5, metadata={'conversation_id': f'c{i}'})
+
+    hits = store.search(vectors[7], k=3, scope='a')
+    assert hits[0]['id'] == 7 and abs(hits[0]['similarity'] - 1.0) < 1e-5
+    assert all(hit['id'] % 2 for hit in hits)
+    assert store.search(vectors[7], k=3, scope='a', exclude=7)[0]['id'] != 7
+    assert store.search(vectors[7], scope='unknown') == []
+
+
+def test_sketch_recall_against_exact_search(tmp_path):
+    vectors = _clustered(4000, 1536, seed=1)
+    store = VectorStore(str(tmp_path), sketch_dim=128, exact_threshold=0)
+    for i, vec in enumerate(vectors):
+        store.add(vec, 'key', ts=i, confidence=0.5)
+
+    rng = np.random.default_rng(2)
+    queries = vectors[rng.integers(0, len(vectors), 40)] + 0.8 * rng.standard_normal((40, 1536))
+    assert store.sketch_recall(queries, k=10, candidates=256) >= 0.95
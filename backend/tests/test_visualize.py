@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from embed_stub import StubEmbedClient
+from graph_embedding import MessageEmbedder
+
+visualize = pytest.importorskip('visualize')
+
+CHAT = [
+    {"author": "SuspiciousPerson", "time": "23:30", "text": "Hey there, how are you?"},
+    {"author": "TeenUser", "time": "23:32", "text": "Who is this?"},
+    {"author": "SuspiciousPerson", "time": "23:33", "text": "Just a friend. Send a pic?"},
+    {"author": "TeenUser", "time": "23:34", "text": "Thanks, I guess?"},
+]
+
+
+def test_visualize_does_not_load_the_server_stack():
+    # Fresh interpreter: other tests in this session import algorithm themselves
+    code = "import sys, visualize; assert 'algorithm' not in sys.modules; print(visualize.MODEL_PATH)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(visualize.__file__)),
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip().endswith('.pt')
+
+
+def test_headless_render_of_a_few_frames(tmp_path):
+    viz = visualize.ModelVisualizer(headless=True)
+    viz.embedder = MessageEmbedder(None, client=StubEmbedClient(latency_ms=0, jitter_ms=0, seed=0))
+    frames = viz.build_frames(CHAT)
+    assert len(frames) == 4
+    assert [len(f['history']) for f in frames] == [1, 2, 3, 4]
+    assert len(frames[-1]['authors']) == 4 and frames[-1]['title'].startswith('Interaction Graph (message 4/4')
+
+    frame_dir = tmp_path / 'frames'
+    visualize.render_frames(frames, str(frame_dir), workers=1, dpi=20)
+    assert sorted(p.name for p in frame_dir.iterdir()) == [f'frame_{i:05d}.png' for i in range(4)]
+
+    gif = visualize.render_frames(frames[:2], str(tmp_path / 'chat.gif'), workers=1, dpi=20)
+    assert (tmp_path / 'chat.gif').stat().st_size > 0 and gif.endswith('.gif')
+
+
+def test_headless_without_model_fails(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        visualize.ModelVisualizer(model_path=str(tmp_path / 'missing.pt'), headless=True)
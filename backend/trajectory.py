@@ -0,0 +1,99 @@
+import numpy as np
+from typing import Dict, Iterator, List
+from sklearn.decomposition import PCA
+from batch_graph import BatchGraphEngine
+from graph_embedding import IncrementalGraph
+
+
+class TrajectoryProjector:
+    """
+    2-D semantic map of the model, fitted once on its centroids.
+
+    Uses the same PCA as visualize.py, so coordinates returned by the API
+    line up with the matplotlib view.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.pca = None
+        self.pred_coords = None
+        self.norm_coords = None
+        if detector.predator_centroids is not None and detector.normal_centroids is not None:
+            all_centroids = np.vstack([detector.predator_centroids, detector.normal_centroids]).astype(np.float64)
+            self.pca = PCA(n_components=2).fit(all_centroids)
+            self.pred_coords = self.project(detector.predator_centroids)
+            self.norm_coords = self.project(detector.normal_centroids)
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Project (n, d) vectors to (n, 2) map coordinates."""
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, self.pca.mean_.shape[0])
+        return (vectors - self.pca.mean_) @ self.pca.components_.T
+
+    def archetypes(self) -> Dict:
+        if self.pca is None:
+            return {'predator': [], 'normal': []}
+        return {'predator': self.pred_coords.tolist(), 'normal': self.norm_coords.tolist()}
+
+    def trajectory(self, conversation, graph_builder) -> List[Dict]:
+        """
+        One step per message prefix: 2-D position, confidence and nearest archetype.
+
+        The conversation is embedded once; every prefix graph comes from
+        incremental top-k updates over a single edge-weight matrix, and the
+        prefix PageRanks are solved in batches by BatchGraphEngine, whose
+        scores weight the one (n, d) embedding matrix directly.
+        """
+        if self.pca is None:
+            raise ValueError("Model not trained")
+        if conversation.n_messages == 0:
+            return []
+        vectors = BatchGraphEngine().prefix_weighted_embeddings(
+            prefix_conversations(conversation, graph_builder), conversation.embeddings)
+        coords = self.project(vectors)
+
+        # Keyword count of every prefix from per-message flags
+        flags = [self.detector.count_risk_keyword_texts([text]) for text in conversation.texts]
+        keyword_counts = np.cumsum(flags)
+
+        steps = []
+        for i, vec in enumerate(vectors):
+            result = self.detector.score_vector(vec, int(keyword_counts[i]))
+            steps.append({
+                'index': i,
+                'x': float(coords[i, 0]),
+                'y': float(coords[i, 1]),
+                'confidence': result['confidence'],
+                'is_predator': bool(result['is_predator']),
+                'risk_keywords': int(keyword_counts[i]),
+                'nearest_archetype': self.detector.nearest_archetype(vec),
+            })
+        return steps
+
+
+def prefix_conversations(conversation, graph_builder) -> Iterator:
+    """
+    Conversation objects for every prefix of `conversation`, shortest first,
+    each with the graph GraphBuilder.build_graph would give it, built incrementally.
+
+    Rows are grown with IncrementalGraph and the edge weights are read from
+    one full-conversation matrix instead of being recomputed per prefix.
+    Prefixes are yielded one at a time so callers never hold all n graphs.
+    """
+    n = conversation.n_messages
+    weights = graph_builder.edge_weight_matrix(conversation) if n > 1 else None
+    codes = conversation.author_codes
+    graph = IncrementalGraph(graph_builder.max_edges_per_node, capacity=max(n, 1))
+
+    for p in range(1, n + 1):
+        new = p - 1
+        if new > 0:
+            graph.add_node(np.arange(new), weights[:new, new])
+        else:
+            graph.add_node([], [])
+
+        src, dst, edge_weights = graph.edges()
+        is_reply = (dst == src + 1) & (codes[src] != codes[dst])
+
+        prefix = conversation.prefix(p)
+        prefix.set_edges(src, dst, edge_weights, is_reply)
+        yield prefix
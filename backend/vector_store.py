@@ -0,0 +1,236 @@
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+from graph_embedding import unit_rows
+
+VECTOR_STORE_DIR = os.getenv("APEX_VECTOR_STORE_DIR",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vector_store'))
+
+# Column files: name -> (dtype, width or None for 'dim'/'sketch_dim')
+_COLUMNS = {
+    'vectors': (np.float32, 'dim'),
+    'sketch': (np.float32, 'sketch_dim'),
+    'ts': (np.int64, 1),
+    'confidence': (np.float32, 1),
+    'scope': (np.int32, 1),
+    'meta_offsets': (np.int64, 1),
+}
+
+
+class VectorStore:
+    """
+    Append-only, memory-mapped store of scored conversation vectors.
+
+    Unit-normalized float32 vectors, a low-dimensional random-projection
+    sketch of each, and the metadata columns live in flat files that are
+    memory-mapped for search; full metadata records are JSON lines read only
+    for the returned hits. Search scans the sketches (exactly, for small
+    stores, over the full vectors), keeps the best candidates and re-ranks
+    them exactly, which keeps queries well under 100ms at millions of rows.
+
+    Rows are never rewritten, so a search only holds the lock to read the
+    row count and map the columns; the scan itself runs alongside add().
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_DIR, sketch_dim: int = 128, seed: int = 0,
+                 exact_threshold: int = 20_000, chunk_rows: int = 262_144):
+        self.path = path
+        self.exact_threshold = exact_threshold
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        header_path = os.path.join(path, 'header.json')
+        if os.path.exists(header_path):
+            with open(header_path, 'r', encoding='utf-8') as f:
+                self.header = json.load(f)
+        else:
+            self.header = {'dim': None, 'sketch_dim': sketch_dim, 'seed': seed, 'scopes': []}
+        self._scope_codes = {s: i for i, s in enumerate(self.header['scopes'])}
+        self._projection = None
+        self._maps: Dict[str, np.ndarray] = {}
+        self._mapped_count = -1
+        self.count = self._recover()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f'{name}.bin' if name != 'meta' else 'meta.jsonl')
+
+    def _width(self, spec) -> int:
+        return self.header[spec] if isinstance(spec, str) else spec
+
+    def _save_header(self):
+        tmp = os.path.join(self.path, 'header.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.header, f)
+        os.replace(tmp, os.path.join(self.path, 'header.json'))
+
+    def _recover(self) -> int:
+        """Row count all column files agree on; a partially written tail row is cut off."""
+        if self.header['dim'] is None:
+            return 0
+        counts = []
+        for name, (dtype, spec) in _COLUMNS.items():
+            path = self._file(name)
+            row_bytes = np.dtype(dtype).itemsize * self._width(spec)
+            counts.append(os.path.getsize(path) // row_bytes if os.path.exists(path) else 0)
+        count = min(counts)
+        for name, (dtype, spec) in _COLUMNS.items():
+            path = self._file(name)
+            if os.path.exists(path):
+                os.truncate(path, count * np.dtype(dtype).itemsize * self._width(spec))
+        if count:
+            offsets = np.fromfile(self._file('meta_offsets'), dtype=np.int64)
+            with open(self._file('meta'), 'rb') as f:
+                f.seek(int(offsets[count - 1]))
+                end = len(f.readline()) + int(offsets[count - 1])
+            os.truncate(self._file('meta'), end)
+        elif os.path.exists(self._file('meta')):
+            os.truncate(self._file('meta'), 0)
+        return count
+
+    def projection(self) -> np.ndarray:
+        if self._projection is None:
+            rng = np.random.default_rng(self.header['seed'])
+            self._projection = (rng.standard_normal((self.header['dim'], self.header['sketch_dim']))
+                                / np.sqrt(self.header['sketch_dim'])).astype(np.float32)
+        return self._projection
+
+    def add(self, vector: np.ndarray, scope: str, ts: int, confidence: float, metadata: Dict = None) -> int:
+        """Append one conversation vector with its metadata; returns its id."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if self.header['dim'] is None:
+                self.header['dim'] = int(vector.shape[1])
+                self._save_header()
+            if vector.shape[1] != self.header['dim']:
+                raise ValueError(f"Vector has {vector.shape[1]} dims, store expects {self.header['dim']}")
+            code = self._scope_codes.get(scope)
+            if code is None:
+                code = self._scope_codes[scope] = len(self.header['scopes'])
+                self.header['scopes'].append(scope)
+                self._save_header()
+
+            unit = unit_rows(vector).astype(np.float32)
+            sketch = unit_rows(unit @ self.projection()).astype(np.float32)
+            vector_id = self.count
+            record = dict(metadata or {}, id=vector_id, ts=int(ts), confidence=float(confidence))
+
+            meta_path = self._file('meta')
+            offset = os.path.getsize(meta_path) if os.path.exists(meta_path) else 0
+            with open(meta_path, 'ab') as f:
+                f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            columns = {
+                'vectors': unit, 'sketch': sketch,
+                'ts': np.array([ts], dtype=np.int64), 'confidence': np.array([confidence], dtype=np.float32),
+                'scope': np.array([code], dtype=np.int32), 'meta_offsets': np.array([offset], dtype=np.int64),
+            }
+            for name, values in columns.items():
+                with open(self._file(name), 'ab') as f:
+                    f.write(values.tobytes())
+            self.count += 1
+            return vector_id
+
+    def _mapped(self, name: str) -> np.ndarray:
+        """Read-only memmap of a column covering the current row count (call under the lock)."""
+        if self._mapped_count != self.count:
+            self._maps = {}
+            self._mapped_count = self.count
+        if name not in self._maps:
+            dtype, spec = _COLUMNS[name]
+            width = self._width(spec)
+            self._maps[name] = np.memmap(self._file(name), dtype=dtype, mode='r', shape=(self.count, width))
+        return self._maps[name]
+
+    def get_vector(self, vector_id: int) -> np.ndarray:
+        with self._lock:
+            if not 0 <= vector_id < self.count:
+                raise KeyError(vector_id)
+            return np.array(self._mapped('vectors')[vector_id])
+
+    def metadata(self, vector_id: int) -> Dict:
+        with self._lock:
+            offset = int(self._mapped('meta_offsets')[vector_id, 0])
+        with open(self._file('meta'), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def scope_of(self, vector_id: int) -> str:
+        with self._lock:
+            return self.header['scopes'][int(self._mapped('scope')[vector_id, 0])]
+
+    def search(self, query: np.ndarray, k: int = 10, scope: Optional[str] = None,
+               exclude: Optional[int] = None, candidates: int = None, exact: bool = None) -> List[Dict]:
+        """
+        Top-k stored conversations by cosine similarity to `query`.
+
+        Args:
+            scope: Only search vectors stored under this scope (API key).
+            exclude: A vector id to leave out (the query's own entry).
+            candidates: Sketch candidates re-ranked exactly (default max(20k, 256)).
+            exact: Scan the full vectors (True) or the sketches (False); by
+                default only stores up to exact_threshold rows are scanned exactly.
+        """
+        with self._lock:
+            n = self.count
+            if n == 0:
+                return []
+            if scope is not None and scope not in self._scope_codes:
+                return []
+            code = None if scope is None else self._scope_codes[scope]
+            exact = n <= self.exact_threshold if exact is None else exact
+            # Maps of the first n rows stay valid while add() appends past them
+            vectors = self._mapped('vectors')
+            table = vectors if exact else self._mapped('sketch')
+            scopes = self._mapped('scope')[:, 0]
+            projection = None if exact else self.projection()
+
+        q = unit_rows(np.asarray(query, dtype=np.float32).reshape(-1))
+        probe = q if exact else unit_rows(q @ projection)
+
+        # Chunked scan keeps the working set bounded on huge stores
+        n_keep = k if exact else max(candidates or 20 * k, 256)
+        best_ids = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, n, self.chunk_rows):
+            stop = min(start + self.chunk_rows, n)
+            scores = np.asarray(table[start:stop]) @ probe
+            if code is not None:
+                scores[np.asarray(scopes[start:stop]) != code] = -np.inf
+            if exclude is not None and start <= exclude < stop:
+                scores[exclude - start] = -np.inf
+            ids = np.arange(start, stop)
+            if len(scores) > n_keep:
+                top = np.argpartition(-scores, n_keep)[:n_keep]
+                ids, scores = ids[top], scores[top]
+            best_ids = np.concatenate([best_ids, ids])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > n_keep:
+                top = np.argpartition(-best_scores, n_keep)[:n_keep]
+                best_ids, best_scores = best_ids[top], best_scores[top]
+
+        valid = np.isfinite(best_scores)
+        best_ids, best_scores = best_ids[valid], best_scores[valid]
+        if not exact and len(best_ids):
+            # Exact re-rank of the sketch candidates (sorted ids read the memmap in order)
+            best_ids = np.sort(best_ids)
+            best_scores = np.asarray(vectors[best_ids]) @ q
+        order = np.argsort(-best_scores, kind='stable')[:k]
+        hits = [(int(best_ids[i]), float(best_scores[i])) for i in order]
+
+        return [dict(self.metadata(vector_id), similarity=round(score, 6)) for vector_id, score in hits]
+
+    def sketch_recall(self, queries: np.ndarray, k: int = 10, candidates: int = None) -> float:
+        """
+        Mean fraction of the exact top-k that the sketch search returns, over
+        the rows of `queries` (e.g. a sample of stored vectors).
+        """
+        found = []
+        for query in np.asarray(queries).reshape(len(queries), -1):
+            expected = {hit['id'] for hit in self.search(query, k, exact=True)}
+            if expected:
+                approx = {hit['id'] for hit in self.search(query, k, candidates=candidates, exact=False)}
+                found.append(len(approx & expected) / len(expected))
+        return float(np.mean(found)) if found else 1.0
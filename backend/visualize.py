@@ -1,5 +1,11 @@
 import os
 import time
+import shutil
+import argparse
+import json
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
 import networkx as nx
@@ -15,16 +21,188 @@ from graph_embedding import MessageEmbedder, Conversation, GraphBuilder
 # Load environment variables
 load_dotenv()
 API_KEY = os.getenv("COHERE_API_KEY")
+# Same default as algorithm.MODEL_PATH, resolved here so render workers don't import the server stack
+MODEL_PATH = os.getenv("APEX_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mini_predator_model.pt"))
+
+
+def draw_frame(ax_scatter, ax_graph, frame):
+    """
+    Draw one trajectory frame onto the two axes.
+
+    `frame` is plain data (see ModelVisualizer.make_frame) so it can be
+    drawn in the live window or shipped to a render worker process.
+    """
+    result_dict = frame['result']
+
+    # --- PLOT 1: THE RADAR (Semantic Space) ---
+    if frame['pred_coords'] is not None:
+        pred_coords, norm_coords = frame['pred_coords'], frame['norm_coords']
+        # 1. Plot Background Archetypes (The Map)
+        ax_scatter.scatter(pred_coords[:, 0], pred_coords[:, 1], 
+                           c='red', marker='x', s=100, alpha=0.4, label='Predator Zones')
+        ax_scatter.scatter(norm_coords[:, 0], norm_coords[:, 1], 
+                           c='green', marker='o', s=100, alpha=0.4, label='Normal Zones')
+        
+        # 2. Current Position is the last point of the history
+        history_array = np.array(frame['history'])
+        current_coord = history_array[-1]
+        
+        # 3. Draw the Trajectory Trail (The Snake)
+        if len(history_array) > 1:
+            # Plot the path line
+            ax_scatter.plot(history_array[:, 0], history_array[:, 1], 
+                            c='gray', linestyle='--', alpha=0.5, linewidth=2, label='Chat Trajectory')
+            # Plot previous points as small dots
+            ax_scatter.scatter(history_array[:-1, 0], history_array[:-1, 1], 
+                               c='gray', s=30, alpha=0.5)
+
+        # 4. Plot CURRENT Star (Head of the snake)
+        # Color turns red if flagged
+        curr_color = 'red' if result_dict['is_predator'] else 'blue'
+        marker_type = '*' if result_dict['is_predator'] else 'o'
+        
+        ax_scatter.scatter(current_coord[0], current_coord[1], 
+                           c=curr_color, marker=marker_type, s=400, edgecolors='black', label='Current State')
+        
+        # 5. Keywords Label
+        if result_dict.get('risk_keywords', 0) > 0:
+            ax_scatter.text(current_coord[0], current_coord[1] + 0.08, 
+                            f"⚠️ KEYWORDS: {result_dict['risk_keywords']}", 
+                            color='red', fontweight='bold', ha='center')
+
+        ax_scatter.set_title("Semantic Trajectory Analysis (PCA)")
+        ax_scatter.legend(loc='lower right')
+        ax_scatter.grid(True, alpha=0.3)
+        ax_scatter.set_xlabel("Principal Component 1")
+        ax_scatter.set_ylabel("Principal Component 2")
+
+    # --- PLOT 2: THE NETWORK (Connectivity) ---
+    authors, edges, pos = frame['authors'], frame['edges'], frame['pos']
+    if authors:
+        G = nx.Graph()
+        for i, author in enumerate(authors):
+            G.add_node(i, author=author)
+        for i, j, weight in edges:
+            G.add_edge(i, j, weight=weight)
+        
+        colors = []
+        sizes = []
+        for node in G.nodes():
+            author = G.nodes[node]['author']
+            if 'Suspicious' in author: 
+                colors.append('#ff9999') # Light red
+                sizes.append(600)
+            elif 'Teen' in author: 
+                colors.append('#99ff99') # Light green
+                sizes.append(600)
+            else: 
+                colors.append('lightblue')
+                sizes.append(400)
+            
+        nx.draw_networkx_nodes(G, pos, ax=ax_graph, node_color=colors, node_size=sizes, edgecolors='gray')
+        
+        if G.number_of_edges() > 0:
+            weights = [G[u][v]['weight'] * 4 for u,v in G.edges()]
+            nx.draw_networkx_edges(G, pos, ax=ax_graph, width=weights, alpha=0.6)
+        
+        # Draw labels (Author names or indices)
+        # Shortening labels for clarity
+        labels = {n: f"{G.nodes[n]['author'][:4]}.." for n in G.nodes()}
+        nx.draw_networkx_labels(G, pos, labels, ax=ax_graph, font_size=8)
+        
+    ax_graph.set_title(frame.get('title') or "Interaction Graph")
+
+
+def _init_render_worker():
+    plt.switch_backend('Agg')
+
+
+def _render_frame_file(job):
+    """Process-pool entry point: draw one frame and save it as a PNG."""
+    frame, path, dpi = job
+    fig, (ax_scatter, ax_graph) = plt.subplots(1, 2, figsize=(16, 7))
+    try:
+        draw_frame(ax_scatter, ax_graph, frame)
+        fig.tight_layout()
+        fig.savefig(path, dpi=dpi)
+    finally:
+        plt.close(fig)
+    return path
+
+
+def _assemble(frame_paths, output, fps):
+    """Turn rendered PNG frames into a GIF (Pillow) or MP4 (ffmpeg)."""
+    ext = os.path.splitext(output)[1].lower()
+    if ext == '.gif':
+        from PIL import Image
+        images = [Image.open(p) for p in frame_paths]
+        images[0].save(output, save_all=True, append_images=images[1:],
+                       duration=int(1000 / fps), loop=0)
+    elif ext == '.mp4':
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg not found on PATH; render to a .gif or a frame directory instead")
+        pattern = os.path.join(os.path.dirname(frame_paths[0]), 'frame_%05d.png')
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', pattern,
+                        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', output],
+                       check=True)
+    else:
+        raise ValueError(f"Unsupported output format: {output}")
+    return output
+
+
+def render_frames(frames, output, workers=None, fps=1, dpi=80, pool=None):
+    """
+    Render frames headlessly (Agg) across a process pool.
+
+    Args:
+        frames: Frame dicts from ModelVisualizer.build_frames.
+        output: A .mp4 / .gif path, or a directory to keep the PNG frames in.
+        workers: Pool size when no pool is given (defaults to CPU count).
+        pool: An existing ProcessPoolExecutor to share across many chats.
+
+    Returns:
+        The output path.
+    """
+    if not frames:
+        raise ValueError("No frames to render")
+    is_video = os.path.splitext(output)[1].lower() in ('.mp4', '.gif')
+    tmp = tempfile.TemporaryDirectory() if is_video else None
+    frame_dir = tmp.name if is_video else output
+    os.makedirs(frame_dir, exist_ok=True)
+    jobs = [(frame, os.path.join(frame_dir, f'frame_{i:05d}.png'), dpi) for i, frame in enumerate(frames)]
+    try:
+        if pool is not None:
+            paths = list(pool.map(_render_frame_file, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as own_pool:
+                paths = list(own_pool.map(_render_frame_file, jobs))
+        if is_video:
+            _assemble(paths, output, fps)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    return output
+
 
 class ModelVisualizer:
-    def __init__(self, model_path=r"apex-demo\backend\mini_predator_model.pt"):
+    def __init__(self, model_path=MODEL_PATH, headless=False,
+                 warm_start_iterations=15, pause=2.0):
         print("Initializing System...")
+        self.headless = headless
+        self.warm_start_iterations = warm_start_iterations
+        self.pause = pause
+        if headless:
+            plt.switch_backend('Agg')
         
         # 1. Load the "Brain" (The Detector)
         # Using dummy.txt as placeholder for ground truth file, handled safely by class
         self.detector = PredatorDetector("dummy.txt") 
         if os.path.exists(model_path):
             self.detector.load_model(model_path)
+        elif headless:
+            # Batch renders without archetypes would silently lose the semantic panel
+            raise FileNotFoundError(f"Model {model_path} not found (set --model or APEX_MODEL_PATH)")
         else:
             print(f"Warning: {model_path} not found. Visualization will be limited.")
 
@@ -38,8 +216,9 @@ class ModelVisualizer:
             
         self.graph_builder = GraphBuilder()
         
-        # 3. Trajectory History Storage
+        # 3. Trajectory History Storage (and last layout, to warm-start the next one)
         self.history_coords = []
+        self._layout_pos = None
 
         # 4. Prepare Visualization (PCA)
         self.pca = PCA(n_components=2)
@@ -57,7 +236,8 @@ class ModelVisualizer:
             self.norm_coords = self.pca.transform(self.detector.normal_centroids)
         
         # Setup Plotting Window
-        plt.ion() # Interactive mode on
+        if not headless:
+            plt.ion() # Interactive mode on
         self.fig, (self.ax_scatter, self.ax_graph) = plt.subplots(1, 2, figsize=(16, 7))
 
     class MockEmbedder:
@@ -65,93 +245,93 @@ class ModelVisualizer:
         def embed_messages(self, messages):
             return np.random.rand(len(messages), 1536)
 
-    def update_plots(self, conversation_obj, result_dict):
-        """Updates the live dashboard visuals with Trajectory Trails."""
-        self.ax_scatter.clear()
-        self.ax_graph.clear()
-        
-        # --- PLOT 1: THE RADAR (Semantic Space) ---
+    def make_frame(self, conversation_obj, result_dict):
+        """
+        Advance the trajectory by one step and return the frame as plain data.
+
+        The graph layout is warm-started from the previous frame's positions,
+        so only the new node has to settle.
+        """
+        frame = {'result': result_dict, 'pred_coords': None, 'norm_coords': None, 'history': None}
         if hasattr(self, 'pred_coords'):
-            # 1. Plot Background Archetypes (The Map)
-            self.ax_scatter.scatter(self.pred_coords[:, 0], self.pred_coords[:, 1], 
-                                   c='red', marker='x', s=100, alpha=0.4, label='Predator Zones')
-            self.ax_scatter.scatter(self.norm_coords[:, 0], self.norm_coords[:, 1], 
-                                   c='green', marker='o', s=100, alpha=0.4, label='Normal Zones')
-            
-            # 2. Calculate Current Position
             current_vec = conversation_obj.get_weighted_embedding().reshape(1, -1)
             current_coord = self.pca.transform(current_vec)[0] # Get x,y pair
-            
-            # 3. Store in History for the "Trail"
             self.history_coords.append(current_coord)
-            
-            # 4. Draw the Trajectory Trail (The Snake)
-            history_array = np.array(self.history_coords)
-            if len(history_array) > 1:
-                # Plot the path line
-                self.ax_scatter.plot(history_array[:, 0], history_array[:, 1], 
-                                    c='gray', linestyle='--', alpha=0.5, linewidth=2, label='Chat Trajectory')
-                # Plot previous points as small dots
-                self.ax_scatter.scatter(history_array[:-1, 0], history_array[:-1, 1], 
-                                       c='gray', s=30, alpha=0.5)
-
-            # 5. Plot CURRENT Star (Head of the snake)
-            # Color turns red if flagged
-            curr_color = 'red' if result_dict['is_predator'] else 'blue'
-            marker_type = '*' if result_dict['is_predator'] else 'o'
-            
-            self.ax_scatter.scatter(current_coord[0], current_coord[1], 
-                                   c=curr_color, marker=marker_type, s=400, edgecolors='black', label='Current State')
-            
-            # 6. Keywords Label
-            if result_dict['risk_keywords'] > 0:
-                self.ax_scatter.text(current_coord[0], current_coord[1] + 0.08, 
-                                     f"⚠️ KEYWORDS: {result_dict['risk_keywords']}", 
-                                     color='red', fontweight='bold', ha='center')
-
-            self.ax_scatter.set_title("Semantic Trajectory Analysis (PCA)")
-            self.ax_scatter.legend(loc='lower right')
-            self.ax_scatter.grid(True, alpha=0.3)
-            self.ax_scatter.set_xlabel("Principal Component 1")
-            self.ax_scatter.set_ylabel("Principal Component 2")
-
-        # --- PLOT 2: THE NETWORK (Connectivity) ---
+            frame.update(pred_coords=self.pred_coords, norm_coords=self.norm_coords,
+                         history=list(self.history_coords))
+
         G = conversation_obj.to_networkx()
+        pos = {}
         if G.number_of_nodes() > 0:
             # Use spring layout but fix seed for stability
-            pos = nx.spring_layout(G, seed=42)
-            
-            colors = []
-            sizes = []
-            for node in G.nodes():
-                author = G.nodes[node]['author']
-                if 'Suspicious' in author: 
-                    colors.append('#ff9999') # Light red
-                    sizes.append(600)
-                elif 'Teen' in author: 
-                    colors.append('#99ff99') # Light green
-                    sizes.append(600)
-                else: 
-                    colors.append('lightblue')
-                    sizes.append(400)
-                
-            nx.draw_networkx_nodes(G, pos, ax=self.ax_graph, node_color=colors, node_size=sizes, edgecolors='gray')
-            
-            if G.number_of_edges() > 0:
-                weights = [G[u][v]['weight'] * 4 for u,v in G.edges()]
-                nx.draw_networkx_edges(G, pos, ax=self.ax_graph, width=weights, alpha=0.6)
-            
-            # Draw labels (Author names or indices)
-            # Shortening labels for clarity
-            labels = {n: f"{G.nodes[n]['author'][:4]}.." for n in G.nodes()}
-            nx.draw_networkx_labels(G, pos, labels, ax=self.ax_graph, font_size=8)
-            
-        self.ax_graph.set_title("Interaction Graph")
+            prev = {n: p for n, p in (self._layout_pos or {}).items() if n in G}
+            if prev:
+                pos = nx.spring_layout(G, pos=prev, seed=42, iterations=self.warm_start_iterations)
+            else:
+                pos = nx.spring_layout(G, seed=42)
+        self._layout_pos = pos
+
+        frame['authors'] = [G.nodes[n]['author'] for n in G.nodes()]
+        frame['edges'] = [(u, v, G[u][v]['weight']) for u, v in G.edges()]
+        frame['pos'] = pos
+        return frame
+
+    def update_plots(self, conversation_obj, result_dict):
+        """Updates the live dashboard visuals with Trajectory Trails."""
+        self.ax_scatter.clear()
+        self.ax_graph.clear()
+        draw_frame(self.ax_scatter, self.ax_graph, self.make_frame(conversation_obj, result_dict))
 
         # Refresh
         plt.tight_layout()
         plt.draw()
-        plt.pause(2.0) # Pause to let the viewer absorb the frame
+        plt.pause(self.pause) # Pause to let the viewer absorb the frame
+
+    def build_frames(self, chat_data):
+        """
+        Score every prefix of a chat and collect its frames without drawing.
+        Messages are embedded once; prefix i reuses the first i embeddings.
+        """
+        self.history_coords = []
+        self._layout_pos = None
+        embeddings = self.embedder.embed_messages(chat_data)
+
+        frames = []
+        for i in range(len(chat_data)):
+            current_messages = chat_data[:i + 1]
+            conv_data = {
+                'conversation_id': 'SIMULATION',
+                'user_ids': list(set(m['author'] for m in current_messages)),
+                'messages': current_messages
+            }
+            conversation = Conversation(conv_data, embeddings[:i + 1])
+            self.graph_builder.build_graph(conversation)
+            result = self.detector.predict_new(conversation)
+            frame = self.make_frame(conversation, result)
+            frame['title'] = f"Interaction Graph (message {i + 1}/{len(chat_data)}, risk {result['confidence']}%)"
+            frames.append(frame)
+        return frames
+
+    def render_offline(self, chat_data, output, workers=None, fps=1, dpi=80, pool=None):
+        """Render a whole chat to an MP4/GIF or a frame directory, headlessly."""
+        return render_frames(self.build_frames(chat_data), output, workers=workers, fps=fps, dpi=dpi, pool=pool)
+
+    def render_batch(self, chats, out_dir, fmt='mp4', workers=None, fps=1, dpi=80):
+        """
+        Render trajectory videos for many chats with one shared process pool.
+
+        Args:
+            chats: Mapping of name -> list of message dicts.
+            out_dir: Directory for the outputs (<name>.<fmt>, or <name>/ for fmt='frames').
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        outputs = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+            for name, chat_data in chats.items():
+                target = os.path.join(out_dir, name if fmt == 'frames' else f"{name}.{fmt}")
+                outputs[name] = self.render_offline(chat_data, target, fps=fps, dpi=dpi, pool=pool)
+                print(f"Rendered {name} -> {outputs[name]}")
+        return outputs
 
     def run_simulation(self, chat_data):
         """Simulates the chat message by message to show the arc."""
@@ -224,5 +404,28 @@ if __name__ == "__main__":
         {"author": "SuspiciousPerson", "time": "20:27", "text": "Come on. I want to see you naked."} 
     ]
 
-    viz = ModelVisualizer()
-    viz.run_simulation(optimized_chat)
+    arg_parser = argparse.ArgumentParser(description="Semantic trajectory visualizer")
+    arg_parser.add_argument('--render', metavar='OUTPUT',
+                            help="Render headlessly to an .mp4/.gif file, or a directory (one video per chat when --input holds several)")
+    arg_parser.add_argument('--input', help="JSON file: a list of messages, or an object of name -> messages")
+    arg_parser.add_argument('--format', default='mp4', choices=['mp4', 'gif', 'frames'], help="Output format for batch renders")
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--fps', type=float, default=1)
+    arg_parser.add_argument('--model', default=MODEL_PATH, help="Detector state to load (default: APEX_MODEL_PATH)")
+    args = arg_parser.parse_args()
+
+    chats = {'optimized_chat': optimized_chat}
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        chats = loaded if isinstance(loaded, dict) else {os.path.splitext(os.path.basename(args.input))[0]: loaded}
+
+    if args.render:
+        viz = ModelVisualizer(model_path=args.model, headless=True)
+        if len(chats) == 1 and os.path.splitext(args.render)[1]:
+            viz.render_offline(next(iter(chats.values())), args.render, workers=args.workers, fps=args.fps)
+        else:
+            viz.render_batch(chats, args.render, fmt=args.format, workers=args.workers, fps=args.fps)
+    else:
+        viz = ModelVisualizer(model_path=args.model)
+        viz.run_simulation(next(iter(chats.values())))
@@ -502,7 +502,7 @@ const Documentation = () => (
             </div>
             
             <p className="text-sm text-stone-500 italic border-l-4 border-stone-300 pl-4">
-                Note: This returns the in-memory data store for the specific key provided in the Authorization header.
+                Note: Results are paginated. Pass <code>limit</code>, <code>since</code>/<code>until</code> (unix seconds) and the returned <code>next_cursor</code> as <code>cursor</code>; add <code>format=ndjson</code> to stream an export.
             </p>
         </div>
     </div>
@@ -653,13 +653,22 @@ const Dashboard = ({ user, handleLogin }) => {
         if (!apiKey) return;
         setLoadingResults(true);
         try {
-            const res = await fetch('http://localhost:5000/api/results', {
-                method: 'GET',
-                headers: { 'Authorization': `Bearer ${apiKey}` }
-            });
-            if (!res.ok) throw new Error('failed to fetch');
-            const data = await res.json();
-            setResults(data.results || []);
+            // Results are paginated: follow next_cursor until the last page
+            let all = [];
+            let cursor = '';
+            let hasMore = true;
+            while (hasMore) {
+                const res = await fetch(`http://localhost:5000/api/results?limit=1000&cursor=${cursor}`, {
+                    method: 'GET',
+                    headers: { 'Authorization': `Bearer ${apiKey}` }
+                });
+                if (!res.ok) throw new Error('failed to fetch');
+                const data = await res.json();
+                all = all.concat(data.results || []);
+                cursor = data.next_cursor;
+                hasMore = Boolean(data.has_more);
+            }
+            setResults(all);
         } catch (err) {
             console.error('Failed to load results', err);
         } finally {